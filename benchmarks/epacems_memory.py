@@ -0,0 +1,56 @@
+"""Measure the memory used per row of EPA CEMS data under each dtype profile.
+
+Writes a synthetic year of hourly data for a state (see :mod:`benchmarks.synthetic`)
+to a temporary Parquet file, reads it back with
+:class:`pudl_catalog.sources.EpaCemsSource` using each dtype profile, and reports the
+number of bytes used by each column per row.
+
+Usage:
+
+    python -m benchmarks.epacems_memory [--plants 200] [--columns col1 col2 ...]
+"""
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_epacems
+from pudl_catalog.dtypes import DTYPE_PROFILES, memory_per_row
+from pudl_catalog.sources import EpaCemsSource
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Report bytes per row of the EPA CEMS data under each dtype profile."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plants", type=int, default=200)
+    parser.add_argument("--columns", nargs="+", default=None)
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "epacems-2020-TX.parquet"
+        synthetic_epacems(2020, "TX", args.plants).to_parquet(
+            path, index=False, row_group_size=500_000
+        )
+        results = {}
+        for profile in DTYPE_PROFILES:
+            df = EpaCemsSource(
+                urlpath=str(path),
+                columns=args.columns,
+                dtype_profile=profile,
+                engine="pyarrow",
+                split_row_groups=True,
+                index=False,
+            ).read()
+            results[profile] = memory_per_row(df)
+    table = pd.DataFrame(results).round(1)
+    table["ratio"] = (table["default"] / table["compact"]).round(1)
+    print(f"Bytes per row ({len(df)} rows):")
+    print(table.to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+"""Benchmark the catalog end to end against synthetic data, without network access.
+
+Synthetic stand-ins for the published data are written with
+:mod:`benchmarks.synthetic`, and the catalog is pointed at them by setting
+``PUDL_INTAKE_PATH`` to a ``file://`` URL. Each benchmark case then runs in a fresh
+Python process, so that import costs, in-memory caches and peak memory usage are
+measured the way a user would experience them. Cases that read data are run twice: once
+with an empty ``PUDL_INTAKE_CACHE`` (cold) and once more with the cache left behind by
+the first run (warm).
+
+For each case the wall clock time and the peak resident memory of the process are
+recorded. Results can be saved as JSON and compared against an earlier run, in which
+case any case that got slower or used more memory than allowed by the tolerance is
+reported, and the command exits with a nonzero status.
+
+Usage:
+
+    python -m benchmarks.run [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks import synthetic
+
+YEAR = synthetic.DEFAULT_YEARS[-1]
+STATE = synthetic.DEFAULT_STATES[0]
+
+
+def _open_catalog() -> Any:
+    import pudl_catalog
+
+    return pudl_catalog.pudl_cat
+
+
+def _epacems(name: str) -> Any:
+    """Open an EPA CEMS source selecting a single year and state."""
+    kwargs: Dict[str, Any] = {"years": [YEAR], "states": [STATE]}
+    if name.endswith("_partitioned"):
+        kwargs["partition_manifest"] = os.environ["PUDL_BENCHMARK_MANIFEST"]
+    return _open_catalog()[name](**kwargs)
+
+
+def case_open_catalog() -> None:
+    """Import the package and open the catalog."""
+    list(_open_catalog())
+
+
+def case_epacems_graph() -> None:
+    """Build the dask graph for a year and state of the partitioned EPA CEMS data."""
+    _epacems("hourly_emissions_epacems_partitioned").to_dask()
+
+
+def case_epacems_partitioned_compute() -> None:
+    """Read a year and state of the partitioned EPA CEMS data."""
+    _epacems("hourly_emissions_epacems_partitioned").to_dask().compute()
+
+
+def case_epacems_monolithic_compute() -> None:
+    """Read a year and state of the monolithic EPA CEMS data."""
+    _epacems("hourly_emissions_epacems").to_dask().compute()
+
+
+def case_epacems_narrow_read() -> None:
+    """Read a few columns of a year of partitioned EPA CEMS data for every state."""
+    _open_catalog().hourly_emissions_epacems_partitioned(
+        years=[YEAR],
+        columns=["plant_id_eia", "operating_datetime_utc", "gross_load_mw"],
+        partition_manifest=os.environ["PUDL_BENCHMARK_MANIFEST"],
+    ).read()
+
+
+def case_epacems_time_window() -> None:
+    """Read a month of a year and state of partitioned EPA CEMS data."""
+    _open_catalog().hourly_emissions_epacems_partitioned(
+        states=[STATE],
+        start=f"{YEAR}-07-01",
+        end=f"{YEAR}-08-01",
+        partition_manifest=os.environ["PUDL_BENCHMARK_MANIFEST"],
+    ).read()
+
+
+def case_epacems_monthly_rollup() -> None:
+    """Read monthly totals for every unit in a year of EPA CEMS data for every state."""
+    _open_catalog().monthly_emissions_epacems(
+        years=[YEAR], partition_manifest=os.environ["PUDL_BENCHMARK_MANIFEST"]
+    ).read()
+
+
+def case_sqlite_table() -> None:
+    """Read a whole table from the PUDL database."""
+    _open_catalog().pudl.fuel_receipts_costs_eia923.read()
+
+
+CASES: Dict[str, Callable[[], None]] = {
+    "open_catalog": case_open_catalog,
+    "epacems_graph": case_epacems_graph,
+    "epacems_partitioned_compute": case_epacems_partitioned_compute,
+    "epacems_monolithic_compute": case_epacems_monolithic_compute,
+    "epacems_narrow_read": case_epacems_narrow_read,
+    "epacems_time_window": case_epacems_time_window,
+    "epacems_monthly_rollup": case_epacems_monthly_rollup,
+    "sqlite_table": case_sqlite_table,
+}
+"""Benchmark cases, by name."""
+
+CACHED_CASES = (
+    "epacems_partitioned_compute",
+    "epacems_monolithic_compute",
+    "epacems_narrow_read",
+    "epacems_time_window",
+    "epacems_monthly_rollup",
+    "sqlite_table",
+)
+"""Cases which read data through the local cache, and are run both cold and warm."""
+
+
+def _peak_rss_bytes() -> int:
+    """Peak resident memory of this process.
+
+    On Linux ``ru_maxrss`` survives ``exec()``, so it would include the memory used
+    by the parent process that generated the data. ``VmHWM`` doesn't.
+    """
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    # Linux reports KiB and macOS bytes.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+def _run_case_in_process(name: str) -> Dict[str, float]:
+    """Time a single case in the current process."""
+    start = time.perf_counter()
+    CASES[name]()
+    return {"seconds": time.perf_counter() - start, "peak_rss_bytes": _peak_rss_bytes()}
+
+
+def run_case(name: str, data_dir: Path, cache_dir: Path) -> Dict[str, float]:
+    """Run a single case in a fresh Python process."""
+    env = {
+        **os.environ,
+        "PUDL_INTAKE_PATH": f"file://{data_dir.resolve()}",
+        "PUDL_INTAKE_CACHE": str(cache_dir),
+        "PUDL_BENCHMARK_MANIFEST": str(data_dir / synthetic.MANIFEST_NAME),
+    }
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", "--case", name],
+        env=env,
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(proc.stdout.splitlines()[-1])
+
+
+def run_all(
+    data_dir: Path, cases: Optional[List[str]] = None, repeat: int = 1
+) -> Dict[str, Dict[str, float]]:
+    """Run benchmark cases against a directory of synthetic data.
+
+    Args:
+        data_dir: Directory written by :func:`benchmarks.synthetic.write_fixture`.
+        cases: Names of the cases to run. By default all cases are run.
+        repeat: Number of times to run each case. The fastest time and the smallest
+            peak memory usage are reported, to reduce noise.
+
+    Returns:
+        Measurements for each case. Cases which read through the local cache are
+        reported as ``<case>[cold]`` and ``<case>[warm]``.
+    """
+    results: Dict[str, Dict[str, float]] = {}
+    for name in cases or list(CASES):
+        runs: Dict[str, List[Dict[str, float]]] = {}
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as cache:
+                if name in CACHED_CASES:
+                    runs.setdefault(f"{name}[cold]", []).append(
+                        run_case(name, data_dir, Path(cache))
+                    )
+                    name_ = f"{name}[warm]"
+                else:
+                    name_ = name
+                runs.setdefault(name_, []).append(run_case(name, data_dir, Path(cache)))
+        for key, measurements in runs.items():
+            results[key] = {
+                metric: min(m[metric] for m in measurements)
+                for metric in ("seconds", "peak_rss_bytes")
+            }
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float = 0.25,
+) -> List[str]:
+    """Find measurements which regressed relative to a baseline.
+
+    Args:
+        results: Measurements from the current run.
+        baseline: Measurements from an earlier run.
+        tolerance: Allowed relative increase of any measurement.
+
+    Returns:
+        A description of each regression.
+    """
+    regressions = []
+    for name, measurements in results.items():
+        for metric, value in measurements.items():
+            before = baseline.get(name, {}).get(metric)
+            if before and value > before * (1 + tolerance):
+                regressions.append(
+                    f"{name} {metric}: {value:.3g} vs. {before:.3g} "
+                    f"(+{value / before - 1:.0%})"
+                )
+    return regressions
+
+
+def _format(results: Dict[str, Dict[str, float]]) -> str:
+    """Format results as a table."""
+    width = max(len(name) for name in results)
+    lines = [f"{'case':<{width}}  {'seconds':>8}  {'peak MiB':>8}"]
+    for name, m in results.items():
+        lines.append(
+            f"{name:<{width}}  {m['seconds']:>8.3f}  "
+            f"{m['peak_rss_bytes'] / 2**20:>8.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmarks, optionally checking for regressions against a baseline."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--case", choices=list(CASES), help=argparse.SUPPRESS)
+    parser.add_argument(
+        "--cases", nargs="+", choices=list(CASES), help="Only run these cases."
+    )
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        help="Reuse synthetic data written by benchmarks.synthetic.",
+    )
+    parser.add_argument("--plants", type=int, default=20, help="Plants per state.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, help="Save the results as JSON.")
+    parser.add_argument("--compare", type=Path, help="Results of an earlier run.")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    if args.case:
+        # Running a single case in a child process. See run_case().
+        print(json.dumps(_run_case_in_process(args.case)))
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir
+        if data_dir is None:
+            data_dir = Path(tmp)
+            synthetic.write_fixture(data_dir, n_plants=args.plants)
+        results = run_all(data_dir, cases=args.cases, repeat=args.repeat)
+    print(_format(results))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2, sort_keys=True))
+    if args.compare:
+        regressions = compare(
+            results, json.loads(args.compare.read_text()), args.tolerance
+        )
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+"""Generate synthetic stand-ins for the data distributed by the PUDL catalog.
+
+The generated files have the same names, layout and schemas as the published data,
+so that the catalog can be pointed at them by setting ``PUDL_INTAKE_PATH`` to a
+``file://`` URL, and exercised end to end without any network access:
+
+* ``hourly_emissions_epacems.parquet``: the monolithic EPA CEMS file, with one row
+  group per year and state.
+* ``hourly_emissions_epacems/epacems-YYYY-ST.parquet``: the partitioned EPA CEMS data.
+* ``pudl.sqlite``, ``ferc1.sqlite`` and ``censusdp1tract.sqlite``: small databases
+  containing a few representative tables.
+
+A partition manifest describing the partitioned files is also written, since the one
+distributed with the catalog describes the published data.
+
+Usage:
+
+    python -m benchmarks.synthetic OUTPUT_DIR [--years 2019 2020] [--states CO ID]
+"""
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pudl_catalog import BASE_URLS, CATALOG_VERSION
+from pudl_catalog.manifest import PARTITION_TEMPLATE, build_partition_manifest
+from pudl_catalog.sessions import url_to_fs
+
+DEFAULT_YEARS = [2019, 2020]
+DEFAULT_STATES = ["CO", "ID", "TX"]
+MANIFEST_NAME = "epacems_partitions.yaml"
+MEASUREMENT_CODES = [
+    "Calculated",
+    "LME",
+    "Measured",
+    "Measured and Substitute",
+    "Other",
+    "Substitute",
+    "Undetermined",
+    "Unknown Code",
+]
+"""Values of the EPA CEMS ``*_measurement_code`` columns."""
+
+PUBLISHED_EPACEMS_URL = f"{BASE_URLS['s3']}/hourly_emissions_epacems.parquet"
+"""The published EPA CEMS data, whose schema the synthetic data should match."""
+
+_ENUM = pa.dictionary(pa.int32(), pa.string())
+"""PUDL stores string columns with a fixed set of values as dictionaries."""
+
+EPACEMS_SCHEMA = pa.schema(
+    [
+        ("plant_id_eia", pa.int32()),
+        ("plant_id_epa", pa.int32()),
+        ("emissions_unit_id_epa", pa.string()),
+        ("operating_datetime_utc", pa.timestamp("ms", tz="UTC")),
+        ("year", pa.int32()),
+        ("state", _ENUM),
+        ("operating_time_hours", pa.float32()),
+        ("gross_load_mw", pa.float32()),
+        ("heat_content_mmbtu", pa.float32()),
+        ("steam_load_1000_lbs", pa.float32()),
+        ("so2_mass_lbs", pa.float32()),
+        ("so2_mass_measurement_code", _ENUM),
+        ("nox_mass_lbs", pa.float32()),
+        ("nox_mass_measurement_code", _ENUM),
+        ("co2_mass_tons", pa.float32()),
+        ("co2_mass_measurement_code", _ENUM),
+    ]
+)
+"""Schema of the published EPA CEMS hourly emissions data.
+
+A copy of the Arrow schema PUDL publishes the data with, so the synthetic data can be
+written without network access. Use :func:`published_epacems_schema` to read the schema
+of the published data itself.
+"""
+
+
+def published_epacems_schema(
+    urlpath: str = PUBLISHED_EPACEMS_URL,
+    storage_options: Optional[Dict[str, Any]] = None,
+) -> pa.Schema:
+    """Read the Arrow schema of the published EPA CEMS data from its Parquet footer."""
+    if storage_options is None:
+        storage_options = {"anon": True} if urlpath.startswith("s3://") else {}
+    fs, path = url_to_fs(urlpath, storage_options)
+    with fs.open(path, mode="rb") as f:
+        return pq.read_schema(f).remove_metadata()
+
+
+def synthetic_epacems(
+    year: int, state: str, n_plants: int = 20, schema: pa.Schema = EPACEMS_SCHEMA
+) -> pd.DataFrame:
+    """A year of hourly EPA CEMS data for a state, with two units per plant."""
+    rng = np.random.default_rng(seed=year * 100 + sum(map(ord, state)))
+    hours = pd.date_range(f"{year}-01-01", f"{year + 1}-01-01", freq="H", tz="UTC")[:-1]
+    n_units = n_plants * 2
+    n_rows = n_units * len(hours)
+    unit = np.repeat(np.arange(n_units), len(hours))
+    # Give each state its own range of plant IDs, like the real data.
+    plant_id = (unit // 2 + 1000 * (1 + sum(map(ord, state)) % 50)).astype("int32")
+    df = pd.DataFrame(
+        {
+            "plant_id_eia": plant_id,
+            "plant_id_epa": (plant_id + 50_000).astype("int32"),
+            "emissions_unit_id_epa": pd.Series(
+                np.array([f"{u % 2 + 1}" for u in range(n_units)], dtype=object)[unit]
+            ),
+            "operating_datetime_utc": np.tile(hours, n_units),
+            "year": np.full(n_rows, year, dtype="int32"),
+            "state": state,
+        }
+    )
+    for field in schema:
+        if field.name in df:
+            continue
+        if pa.types.is_floating(field.type):
+            df[field.name] = rng.random(n_rows, dtype="float32") * 100
+        elif pa.types.is_integer(field.type):
+            df[field.name] = rng.integers(100, size=n_rows, dtype="int32")
+        elif field.name.endswith("_measurement_code"):
+            df[field.name] = pd.Series(
+                np.array(MEASUREMENT_CODES, dtype=object)[
+                    rng.integers(len(MEASUREMENT_CODES), size=n_rows)
+                ]
+            )
+        else:
+            df[field.name] = None
+    return df[schema.names]
+
+
+def write_epacems(
+    output_dir: Path,
+    years: Sequence[int] = DEFAULT_YEARS,
+    states: Sequence[str] = DEFAULT_STATES,
+    n_plants: int = 20,
+    schema: pa.Schema = EPACEMS_SCHEMA,
+) -> None:
+    """Write both the monolithic and the partitioned EPA CEMS data."""
+    partitioned_dir = output_dir / "hourly_emissions_epacems"
+    partitioned_dir.mkdir(parents=True, exist_ok=True)
+    with pq.ParquetWriter(
+        output_dir / "hourly_emissions_epacems.parquet", schema
+    ) as writer:
+        for year in years:
+            for state in states:
+                table = pa.Table.from_pandas(
+                    synthetic_epacems(year, state, n_plants, schema=schema),
+                    schema=schema,
+                    preserve_index=False,
+                )
+                writer.write_table(table, row_group_size=table.num_rows)
+                pq.write_table(
+                    table,
+                    partitioned_dir / PARTITION_TEMPLATE.format(year=year, state=state),
+                    row_group_size=table.num_rows,
+                )
+    build_partition_manifest(str(partitioned_dir), CATALOG_VERSION).to_yaml(
+        output_dir / MANIFEST_NAME
+    )
+
+
+def _write_tables(path: Path, tables: dict) -> None:
+    """Write dataframes to a new SQLite database, replacing any existing one."""
+    path.unlink(missing_ok=True)
+    conn = sqlite3.connect(path)
+    try:
+        for name, (ddl, df) in tables.items():
+            conn.execute(ddl)
+            df.to_sql(name, conn, if_exists="append", index=False)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def write_pudl_sqlite(path: Path, n_plants: int = 2_000, n_months: int = 60) -> None:
+    """Write a small stand-in for ``pudl.sqlite``."""
+    rng = np.random.default_rng(seed=0)
+    plants = pd.DataFrame(
+        {
+            "plant_id_eia": np.arange(n_plants),
+            "plant_name_eia": [f"Plant {i}" for i in range(n_plants)],
+            "state": rng.choice(DEFAULT_STATES, n_plants),
+        }
+    )
+    n_receipts = n_plants * n_months
+    receipts = pd.DataFrame(
+        {
+            "plant_id_eia": np.repeat(plants.plant_id_eia, n_months),
+            "report_date": np.tile(
+                pd.date_range("2016-01-01", periods=n_months, freq="MS").strftime(
+                    "%Y-%m-%d"
+                ),
+                n_plants,
+            ),
+            "energy_source_code": rng.choice(["BIT", "SUB", "NG", "DFO"], n_receipts),
+            "fuel_received_units": rng.random(n_receipts) * 1e4,
+            "fuel_cost_per_mmbtu": rng.random(n_receipts) * 10,
+            "primary_transportation_mode_code": rng.choice(
+                ["RR", "PL", "TR"], n_receipts
+            ),
+        }
+    )
+    _write_tables(
+        path,
+        {
+            "plants_entity_eia": (
+                "CREATE TABLE plants_entity_eia (plant_id_eia INTEGER PRIMARY KEY, "
+                "plant_name_eia TEXT, state TEXT)",
+                plants,
+            ),
+            "fuel_receipts_costs_eia923": (
+                "CREATE TABLE fuel_receipts_costs_eia923 (plant_id_eia INTEGER, "
+                "report_date DATE, energy_source_code TEXT, fuel_received_units REAL, "
+                "fuel_cost_per_mmbtu REAL, primary_transportation_mode_code TEXT)",
+                receipts,
+            ),
+        },
+    )
+
+
+def write_ferc1_sqlite(path: Path, n_respondents: int = 200, n_years: int = 10) -> None:
+    """Write a small stand-in for ``ferc1.sqlite``."""
+    rng = np.random.default_rng(seed=1)
+    n_rows = n_respondents * n_years
+    steam = pd.DataFrame(
+        {
+            "respondent_id": np.repeat(np.arange(n_respondents), n_years),
+            "report_year": np.tile(np.arange(2011, 2011 + n_years), n_respondents),
+            "plant_name": [f"Steam plant {i % n_respondents}" for i in range(n_rows)],
+            "tot_capacity": rng.random(n_rows) * 1000,
+            "net_generation": rng.random(n_rows) * 1e6,
+        }
+    )
+    _write_tables(
+        path,
+        {
+            "f1_steam": (
+                "CREATE TABLE f1_steam (respondent_id INTEGER, report_year INTEGER, "
+                "plant_name TEXT, tot_capacity REAL, net_generation REAL)",
+                steam,
+            ),
+        },
+    )
+
+
+def write_censusdp1tract_sqlite(path: Path) -> None:
+    """Write a tiny stand-in for ``censusdp1tract.sqlite``."""
+    _write_tables(
+        path,
+        {
+            "county_2010census_dp1": (
+                "CREATE TABLE county_2010census_dp1 (geoid10 TEXT, dp0010001 INTEGER)",
+                pd.DataFrame({"geoid10": ["08001", "16001"], "dp0010001": [1, 2]}),
+            ),
+        },
+    )
+
+
+def write_fixture(
+    output_dir: Path,
+    years: Sequence[int] = DEFAULT_YEARS,
+    states: Sequence[str] = DEFAULT_STATES,
+    n_plants: int = 20,
+    schema: pa.Schema = EPACEMS_SCHEMA,
+) -> Path:
+    """Write synthetic versions of everything in the catalog to a directory.
+
+    Args:
+        output_dir: Where to write the data.
+        years: Years of EPA CEMS data to write.
+        states: States of EPA CEMS data to write.
+        n_plants: Number of plants in each state.
+        schema: Arrow schema of the EPA CEMS data. Defaults to a copy of the published
+            schema. See :func:`published_epacems_schema`.
+
+    Returns:
+        The path to the partition manifest describing the partitioned EPA CEMS data.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    write_epacems(
+        output_dir, years=years, states=states, n_plants=n_plants, schema=schema
+    )
+    write_pudl_sqlite(output_dir / "pudl.sqlite")
+    write_ferc1_sqlite(output_dir / "ferc1.sqlite")
+    write_censusdp1tract_sqlite(output_dir / "censusdp1tract.sqlite")
+    return output_dir / MANIFEST_NAME
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Write synthetic catalog data to a directory."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("--years", nargs="+", type=int, default=DEFAULT_YEARS)
+    parser.add_argument("--states", nargs="+", default=DEFAULT_STATES)
+    parser.add_argument("--plants", type=int, default=20, help="Plants per state.")
+    parser.add_argument(
+        "--published-schema",
+        action="store_true",
+        help="Read the EPA CEMS schema from the published data instead of using the "
+        "copy distributed with the benchmarks. Requires network access.",
+    )
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    schema = published_epacems_schema() if args.published_schema else EPACEMS_SCHEMA
+    write_fixture(args.output_dir, args.years, args.states, args.plants, schema)
+    print(f"Set PUDL_INTAKE_PATH=file://{args.output_dir.resolve()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
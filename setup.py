@@ -56,6 +56,12 @@ setup(
         "sqlalchemy>=1.3,<2",
     ],
     extras_require={
+        "apsw": [
+            "apsw>=3.40",  # Custom SQLite VFS for reading remote databases in place
+        ],
+        "duckdb": [
+            "duckdb>=0.9",  # Embedded SQL engine for querying the cached data
+        ],
         "dev": [
             "black>=22,<23",  # A deterministic code formatter
             "isort>=5,<6",  # Standardized import sorting
@@ -92,8 +98,11 @@ setup(
     },
     setup_requires=["setuptools_scm"],
     entry_points={
+        "console_scripts": [
+            "pudl_catalog = pudl_catalog.cli:main",
+        ],
         "intake.catalogs": [
             "pudl_cat = pudl_catalog:pudl_cat",
-        ]
+        ],
     },
 )
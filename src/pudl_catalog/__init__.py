@@ -1,10 +1,14 @@
-"""An installable catalog of open data related to the US energy system."""
+"""An installable catalog of open data related to the US energy system.
+
+Importing this package is cheap and has no side effects. The Intake catalog
+(``pudl_cat``), the package version, and the default values of the environment
+variables used by the catalog are all resolved the first time they are accessed.
+"""
 import logging
 import os
+import threading
 from pathlib import Path
-
-import intake
-import pkg_resources
+from typing import Any, List
 
 import pudl_catalog.helpers  # noqa: F401
 
@@ -22,32 +26,68 @@ BASE_URLS = {
     "https": f"https://storage.googleapis.com/{INTAKE_BUCKET}/{CATALOG_VERSION}",
 }
 
-# Ensure that the user has set the relevant environment variables
-if os.getenv("PUDL_INTAKE_PATH") is None:
-    logger.info(
-        "Environment variable PUDL_INTAKE_PATH is not set. "
-        f"Defaulting to {BASE_URLS['s3']}"
-    )
-    os.environ["PUDL_INTAKE_PATH"] = BASE_URLS["s3"]
-
-if os.getenv("PUDL_INTAKE_CACHE") is None:
-    logger.info(
-        "Environment variable PUDL_INTAKE_CACHE is not set. "
-        f"Defaulting to {os.getenv('HOME')}/.intake/cache"
-    )
-    os.environ["PUDL_INTAKE_CACHE"] = str(Path.home() / ".intake/cache")
-
 # The catalog is a YAML file in the same directory as this init file
 _pudl_catalog_path = Path(__file__).parent.resolve() / "pudl_catalog.yaml"
-# After installation the catalog intake.cat.pudl_cat should be available
-pudl_cat = intake.open_catalog(_pudl_catalog_path)
+_lazy_lock = threading.Lock()
+
+
+def set_default_environment() -> None:
+    """Ensure that the environment variables the catalog refers to have been set.
+
+    Called automatically the first time ``pudl_cat`` is accessed. Values which have
+    already been set by the user are left alone.
+    """
+    if os.getenv("PUDL_INTAKE_PATH") is None:
+        logger.info(
+            "Environment variable PUDL_INTAKE_PATH is not set. "
+            f"Defaulting to {BASE_URLS['s3']}"
+        )
+        os.environ["PUDL_INTAKE_PATH"] = BASE_URLS["s3"]
+
+    if os.getenv("PUDL_INTAKE_CACHE") is None:
+        logger.info(
+            "Environment variable PUDL_INTAKE_CACHE is not set. "
+            f"Defaulting to {os.getenv('HOME')}/.intake/cache"
+        )
+        os.environ["PUDL_INTAKE_CACHE"] = str(Path.home() / ".intake/cache")
+
+
+def _open_catalog() -> Any:
+    """Open the Intake catalog describing the PUDL data."""
+    import intake
+
+    set_default_environment()
+    return intake.open_catalog(_pudl_catalog_path)
+
+
+def __getattr__(name: str) -> Any:
+    """Resolve expensive module attributes the first time they're accessed."""
+    if name not in ("pudl_cat", "__version__"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _lazy_lock:
+        if name in globals():
+            return globals()[name]
+        if name == "pudl_cat":
+            # After installation the catalog intake.cat.pudl_cat should be available
+            value = _open_catalog()
+        else:
+            from importlib.metadata import version
+
+            value = version("catalystcoop.pudl_catalog")
+        globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    """Include the lazily resolved attributes in the module's attributes."""
+    return sorted(list(globals()) + ["pudl_cat", "__version__"])
+
 
 __author__ = "Catalyst Cooperative"
 __contact__ = "pudl@catalyst.coop"
 __license__ = "MIT License"
 __maintainer__ = "Zane Selvans"
 __maintainer_email__ = "zane.selvans@catalyst.coop"
-__version__ = pkg_resources.get_distribution("catalystcoop.pudl_catalog").version
 __docformat__ = "restructuredtext en"
 __description__ = "An catalog of open data related to the US energy system."
 __projecturl__ = "https://github.com/catalyst-cooperative/pudl-catalog"
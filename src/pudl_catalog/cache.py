@@ -0,0 +1,816 @@
+"""Tools for working with the local cache of remote catalog data."""
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import fsspec
+from fsspec.implementations.cached import hash_name
+
+import pudl_catalog
+from pudl_catalog.integrity import checksum_chunk_size, file_checksum
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "simplecache::"
+"""Prefix of URLs which are transparently cached locally by :mod:`fsspec`."""
+
+SIDECAR_PREFIX = "pudl_catalog_"
+"""Prefix of the files the catalog keeps alongside the cached data."""
+
+CACHE_DB_NAME = f"{SIDECAR_PREFIX}cache.sqlite"
+"""Name of the registry of cached objects, stored in the cache directory."""
+
+FOOTER_DB_NAME = f"{SIDECAR_PREFIX}footers.sqlite"
+"""Name of the Parquet footer database, stored in the cache directory."""
+
+PLANT_INDEX_DB_NAME = f"{SIDECAR_PREFIX}plant_index.sqlite"
+"""Name of the EPA CEMS plant index database, stored in the cache directory."""
+
+TABLES_DIR_NAME = f"{SIDECAR_PREFIX}tables"
+"""Directory within the cache where SQLite tables converted to Parquet are kept."""
+
+SORTED_DIR_NAME = f"{SIDECAR_PREFIX}sorted"
+"""Directory within the cache where EPA CEMS files sorted by time are kept."""
+
+ROLLUPS_DIR_NAME = f"{SIDECAR_PREFIX}rollups"
+"""Directory within the cache where daily, monthly and annual EPA CEMS totals are kept."""
+
+SQLITE_INDEXES_DIR_NAME = f"{SIDECAR_PREFIX}sqlite_indexes"
+"""Directory within the cache where extra indexes of SQLite tables are kept."""
+
+RESULTS_DIR_NAME = f"{SIDECAR_PREFIX}results"
+"""Directory within the cache where the results of EPA CEMS reads are kept."""
+
+QUARANTINE_DIR_NAME = f"{SIDECAR_PREFIX}quarantine"
+"""Directory within the cache where corrupted objects are moved."""
+
+PAGE_CACHE_DIR_NAME = f"{SIDECAR_PREFIX}pages"
+"""Directory within the cache where blocks of remote databases are kept."""
+
+PARTIAL_DIR_NAME = f"{SIDECAR_PREFIX}downloads"
+"""Directory within the cache where incomplete downloads are kept."""
+
+LOCAL_PROTOCOLS = ("file", "local")
+"""Protocols of URLs that refer to the local filesystem."""
+
+
+class NotCachedError(FileNotFoundError):
+    """Raised in offline mode when remote data that isn't in the local cache is needed."""
+
+
+def is_offline() -> bool:
+    """Whether the catalog should only use data that's already in the local cache.
+
+    Offline mode is enabled by setting the ``PUDL_INTAKE_OFFLINE`` environment variable
+    to ``1``, ``true`` or ``yes``. In offline mode no remote filesystems are ever set
+    up. Globs are expanded using the registry of cached objects kept by
+    :class:`CacheManager` rather than by listing the remote files, and anything that
+    would require a remote request raises :class:`NotCachedError` immediately, rather
+    than waiting for the network to time out.
+    """
+    return os.environ.get("PUDL_INTAKE_OFFLINE", "").strip().lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+
+
+def split_cached_url(
+    urlpath: str, storage_options: Optional[Dict[str, Any]] = None
+) -> Tuple[str, Dict[str, Any]]:
+    """Separate a (possibly) cached URL into the remote URL and its storage options.
+
+    Catalog sources refer to their data using chained URLs like
+    ``simplecache::s3://bucket/path``, with storage options for every filesystem in
+    the chain nested under the name of its protocol. Sometimes we need to talk to the
+    remote filesystem directly (e.g. to read only a small part of a file without
+    caching the whole thing), which requires the un-chained URL and the options that
+    apply to its protocol.
+
+    Args:
+        urlpath: URL of the data, optionally prefixed with ``simplecache::``.
+        storage_options: Storage options associated with the URL.
+
+    Returns:
+        The remote URL and the storage options that apply to its filesystem.
+    """
+    storage_options = storage_options or {}
+    remote_url = urlpath[len(CACHE_PREFIX) :] if is_cached_url(urlpath) else urlpath
+    protocol = remote_url.split("://")[0] if "://" in remote_url else "file"
+    # As in fsspec's handling of chained URLs, top level options only apply to the
+    # outermost filesystem, which is the remote one only if the URL isn't cached.
+    remote_options = {}
+    if not is_cached_url(urlpath):
+        remote_options = {
+            key: value
+            for key, value in storage_options.items()
+            if not isinstance(value, dict)
+        }
+    remote_options.update(storage_options.get(protocol, {}))
+    return remote_url, remote_options
+
+
+def is_cached_url(urlpath: str) -> bool:
+    """Whether the URL refers to data that's cached locally by :mod:`fsspec`."""
+    return urlpath.startswith(CACHE_PREFIX)
+
+
+def cache_dir(storage_options: Optional[Dict[str, Any]] = None) -> Path:
+    """Identify the local directory where remote data is cached.
+
+    Uses the ``cache_storage`` set in the ``simplecache`` storage options if present,
+    and falls back to the ``PUDL_INTAKE_CACHE`` environment variable.
+    """
+    storage_options = storage_options or {}
+    path = storage_options.get("simplecache", {}).get("cache_storage")
+    if path is None:
+        path = os.environ.get(
+            "PUDL_INTAKE_CACHE", str(Path.home() / ".intake" / "cache")
+        )
+    return Path(path)
+
+
+def cached_filename(
+    urlpath: str, storage_options: Optional[Dict[str, Any]] = None
+) -> str:
+    """The name of the file :mod:`fsspec` uses to cache a remote object locally.
+
+    ``simplecache`` names each cached file using the SHA-256 hash of the remote path,
+    with its protocol removed.
+    """
+    url, _ = split_cached_url(urlpath, storage_options)
+    protocol = url.split("://")[0] if "://" in url else "file"
+    try:
+        path = fsspec.get_filesystem_class(protocol)._strip_protocol(url)
+    except ImportError:
+        # The filesystem implementation isn't installed, but we can still work out
+        # what the path would be.
+        path = url.split("://", 1)[-1]
+    return hash_name(path, same_name=False)
+
+
+def local_copy(urlpath: str, storage_options: Optional[Dict[str, Any]] = None) -> Path:
+    """Find the local copy of some data, without contacting the remote store.
+
+    Args:
+        urlpath: URL of the data, optionally prefixed with ``simplecache::``.
+        storage_options: Storage options associated with the URL.
+
+    Returns:
+        The cached copy of data accessed via the cache, or the path of a local file.
+
+    Raises:
+        NotCachedError: If the data is accessed via the cache but hasn't been cached,
+            or it's remote and isn't accessed via the cache at all.
+    """
+    url, _ = split_cached_url(urlpath, storage_options)
+    if is_cached_url(urlpath):
+        path = cache_dir(storage_options) / cached_filename(urlpath, storage_options)
+        if not path.is_file():
+            raise NotCachedError(f"{url} has not been cached in {path.parent}.")
+        return path
+    protocol = url.split("://")[0] if "://" in url else "file"
+    if protocol not in LOCAL_PROTOCOLS:
+        raise NotCachedError(
+            f"{url} is remote and isn't accessed via the local cache. Prefix it with "
+            f"{CACHE_PREFIX} to use a cached copy."
+        )
+    return Path(url.split("://", 1)[-1])
+
+
+def parse_size(size: Union[int, str]) -> int:
+    """Convert a human readable size like ``"50GB"`` into a number of bytes."""
+    if isinstance(size, int):
+        return size
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?I?B?)\s*", size.upper())
+    if match is None:
+        raise ValueError(f"Couldn't interpret {size!r} as a size in bytes.")
+    number, unit = match.groups()
+    power = "BKMGT".index(unit[0]) if unit else 0
+    base = 1024 if "I" in unit else 1000
+    return int(float(number) * base**power)
+
+
+_intact: Dict[Path, Tuple[int, int]] = {}
+"""Size and modification time of the cached files known to be intact."""
+
+
+class CacheEntry(NamedTuple):
+    """A file in the local cache of remote catalog data."""
+
+    path: Path
+    size: int
+    last_access: float
+    url: Optional[str]
+    catalog_version: Optional[str]
+    pinned: bool
+
+
+class CacheManager:
+    """Inspect and trim the local cache of remote catalog data.
+
+    The cache is populated by :mod:`fsspec` ``simplecache``, which never removes
+    anything. This class keeps a small registry of which catalog version and URL each
+    cached file came from, so that it can remove data belonging to versions of the
+    catalog other than the one that's installed, and evict the least recently used
+    data when the cache grows beyond a byte budget. Files can be pinned to protect
+    them from eviction.
+
+    The registry also records a key identifying the content of each object, so that an
+    object that's identical to one that was already downloaded for another catalog
+    version can be hard linked rather than downloaded again. Files linked this way
+    share their storage, so each of them is counted as an equal share of it.
+
+    The checksum, size and modification time of each downloaded object are recorded
+    too. The size and modification time are checked every time the object is used, and
+    :meth:`verify` checks the checksums. Corrupted files are moved into a quarantine
+    directory, so that only they are downloaded again.
+
+    Files in the cache directory that were not put there by the catalog are never
+    removed.
+
+    Args:
+        path: The cache directory. Defaults to ``PUDL_INTAKE_CACHE``.
+        max_bytes: The size the cache should be kept under when it's trimmed. Defaults
+            to the ``PUDL_INTAKE_CACHE_MAX_BYTES`` environment variable, if it's set.
+        catalog_version: The version of the catalog currently in use.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        max_bytes: Optional[Union[int, str]] = None,
+        catalog_version: Optional[str] = None,
+    ):
+        """Initialize the cache manager, creating the registry if needed."""
+        if max_bytes is None:
+            max_bytes = os.environ.get("PUDL_INTAKE_CACHE_MAX_BYTES")
+        self.path = Path(path) if path is not None else cache_dir()
+        self.max_bytes = None if max_bytes is None else parse_size(max_bytes)
+        self.catalog_version = catalog_version or pudl_catalog.CATALOG_VERSION
+        self.path.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS objects ("
+                "filename TEXT PRIMARY KEY, "
+                "url TEXT NOT NULL, "
+                "catalog_version TEXT NOT NULL, "
+                "last_access REAL NOT NULL, "
+                "pinned INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(objects)")}
+            for column, column_type in [
+                ("content_key", "TEXT"),
+                ("size", "INTEGER"),
+                ("mtime_ns", "INTEGER"),
+                ("checksum", "TEXT"),
+                ("etag", "TEXT"),
+            ]:
+                if column in columns:
+                    continue
+                try:
+                    conn.execute(
+                        f"ALTER TABLE objects ADD COLUMN {column} {column_type}"
+                    )
+                except sqlite3.OperationalError as err:
+                    # Another process or thread may have added it in the meantime.
+                    if "duplicate column" not in str(err):
+                        raise
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection to the registry, committing and closing it afterwards."""
+        conn = sqlite3.connect(self.path / CACHE_DB_NAME, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def register(
+        self,
+        urlpaths: Iterable[str],
+        storage_options: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Record that remote objects are being accessed via the cache.
+
+        Args:
+            urlpaths: URLs of the remote objects.
+            storage_options: Storage options associated with the URLs.
+        """
+        now = time.time()
+        rows = [
+            (
+                cached_filename(urlpath, storage_options),
+                split_cached_url(urlpath)[0],
+                self.catalog_version,
+                now,
+            )
+            for urlpath in urlpaths
+        ]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO objects (filename, url, catalog_version, last_access) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT (filename) DO UPDATE SET "
+                "catalog_version = excluded.catalog_version, "
+                "last_access = excluded.last_access",
+                rows,
+            )
+
+    def set_content_key(
+        self,
+        urlpath: str,
+        content_key: str,
+        storage_options: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Record the content of a cached object, so that it can be reused later.
+
+        Args:
+            urlpath: URL of the remote object.
+            content_key: Identifies the content of the object. See
+                :func:`pudl_catalog.download.content_key`.
+            storage_options: Storage options associated with the URL.
+        """
+        self.register([urlpath], storage_options)
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE objects SET content_key = ? WHERE filename = ?",
+                (content_key, cached_filename(urlpath, storage_options)),
+            )
+
+    def find_content(self, content_key: str) -> Optional[Path]:
+        """Find a cached file with the given content, if there is one."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT filename FROM objects WHERE content_key = ?", (content_key,)
+            ).fetchall()
+        for (filename,) in rows:
+            if (self.path / filename).is_file():
+                return self.path / filename
+        return None
+
+    def cached_urls(self, pattern: str) -> List[str]:
+        """List the cached remote objects matching a glob, using only the registry.
+
+        Args:
+            pattern: A remote URL, without the ``simplecache::`` prefix, in which
+                ``*`` matches any characters other than ``/``.
+
+        Returns:
+            The URLs of the matching objects that are in the cache, sorted.
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT url, filename FROM objects").fetchall()
+        depth = pattern.count("/")
+        return sorted(
+            url
+            for url, filename in rows
+            if url.count("/") == depth
+            and fnmatchcase(url, pattern)
+            and (self.path / filename).is_file()
+        )
+
+    def record_checksum(
+        self,
+        urlpath: str,
+        checksum: str,
+        storage_options: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Record the checksum of a newly cached object, along with its size and mtime.
+
+        Args:
+            urlpath: URL of the remote object.
+            checksum: Checksum of the object. See :mod:`pudl_catalog.integrity`.
+            storage_options: Storage options associated with the URL.
+        """
+        filename = cached_filename(urlpath, storage_options)
+        stat = (self.path / filename).stat()
+        self.register([urlpath], storage_options)
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE objects SET size = ?, mtime_ns = ?, checksum = ? "
+                "WHERE filename = ?",
+                (stat.st_size, stat.st_mtime_ns, checksum, filename),
+            )
+        _intact[self.path / filename] = (stat.st_size, stat.st_mtime_ns)
+
+    def checksum(self, path: Path) -> Optional[str]:
+        """The checksum recorded for a cached file, if there is one."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT checksum FROM objects WHERE filename = ?", (Path(path).name,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def record_etag(
+        self,
+        urlpath: str,
+        etag: str,
+        storage_options: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Record the ETag of the remote object a newly cached file was downloaded from.
+
+        Args:
+            urlpath: URL of the remote object.
+            etag: ETag or equivalent version identifier of the object. See
+                :func:`pudl_catalog.footers.object_etag`.
+            storage_options: Storage options associated with the URL.
+        """
+        self.register([urlpath], storage_options)
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE objects SET etag = ? WHERE filename = ?",
+                (etag, cached_filename(urlpath, storage_options)),
+            )
+
+    def etag(self, path: Path) -> Optional[str]:
+        """The ETag recorded for a cached file when it was downloaded, if there is one."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT etag FROM objects WHERE filename = ?", (Path(path).name,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def checksums(self, catalog_version: Optional[str] = None) -> Dict[str, str]:
+        """The checksums of the cached objects of a catalog version, by URL.
+
+        Args:
+            catalog_version: Defaults to the version currently in use.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT url, checksum FROM objects "
+                "WHERE catalog_version = ? AND checksum IS NOT NULL ORDER BY url",
+                (catalog_version or self.catalog_version,),
+            ).fetchall()
+        return dict(rows)
+
+    def is_intact(self, path: Path) -> bool:
+        """Cheaply check that a cached file hasn't changed since it was downloaded.
+
+        The size and modification time of the file are compared to the ones recorded
+        along with its checksum. Files without a checksum can't be checked, and are
+        assumed to be intact.
+        """
+        path = Path(path)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return False
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT size, mtime_ns FROM objects "
+                "WHERE filename = ? AND checksum IS NOT NULL",
+                (path.name,),
+            ).fetchone()
+        return row is None or tuple(row) == (stat.st_size, stat.st_mtime_ns)
+
+    def quarantine(self, paths: Iterable[Path]) -> None:
+        """Move corrupted files out of the cache, so they're downloaded again.
+
+        The files are kept in a separate directory for inspection until the cache is
+        next trimmed.
+        """
+        paths = [Path(path) for path in paths]
+        quarantine = self.path / QUARANTINE_DIR_NAME
+        quarantine.mkdir(exist_ok=True)
+        for path in paths:
+            logger.warning(f"Moving corrupted file {path.name} to {quarantine}")
+            _intact.pop(path, None)
+            try:
+                os.replace(path, quarantine / path.name)
+            except FileNotFoundError:
+                pass
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE objects SET size = NULL, mtime_ns = NULL, checksum = NULL, "
+                "content_key = NULL, etag = NULL WHERE filename = ?",
+                [(path.name,) for path in paths],
+            )
+
+    def verify(self, max_workers: int = 8) -> List[CacheEntry]:
+        """Check every cached file against its checksum, quarantining corrupted files.
+
+        Files are hashed concurrently. Files without a checksum are skipped.
+
+        Args:
+            max_workers: Maximum number of files to hash at the same time.
+
+        Returns:
+            The entries that were corrupted, and have been quarantined.
+        """
+        with self._connect() as conn:
+            checksums = dict(
+                conn.execute(
+                    "SELECT filename, checksum FROM objects WHERE checksum IS NOT NULL"
+                )
+            )
+        entries = [e for e in self.entries() if e.path.name in checksums]
+
+        def corrupted(entry: CacheEntry) -> bool:
+            expected = checksums[entry.path.name]
+            actual = file_checksum(entry.path, checksum_chunk_size(expected))
+            return actual != expected
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            bad = [
+                entry
+                for entry, is_bad in zip(entries, executor.map(corrupted, entries))
+                if is_bad
+            ]
+        logger.info(f"Verified {len(entries)} cached files. {len(bad)} were corrupted.")
+        self.quarantine([entry.path for entry in bad])
+        return bad
+
+    def pin(self, urlpath: str, pinned: bool = True) -> None:
+        """Protect a cached object from eviction, or remove that protection."""
+        self.register([urlpath])
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE objects SET pinned = ? WHERE filename = ?",
+                (int(pinned), cached_filename(urlpath)),
+            )
+
+    def entries(self) -> List[CacheEntry]:
+        """List the files in the cache, least recently used first."""
+        with self._connect() as conn:
+            registry = {
+                row[0]: row[1:]
+                for row in conn.execute(
+                    "SELECT filename, url, catalog_version, last_access, pinned "
+                    "FROM objects"
+                )
+            }
+        entries = []
+        for path in self.path.iterdir():
+            if not path.is_file() or path.name.startswith(SIDECAR_PREFIX):
+                continue
+            stat = path.stat()
+            url, version, last_access, pinned = registry.get(
+                path.name, (None, None, 0.0, 0)
+            )
+            entries.append(
+                CacheEntry(
+                    path=path,
+                    # Hard linked copies of an object share its storage.
+                    size=stat.st_size // max(stat.st_nlink, 1),
+                    last_access=max(last_access, stat.st_atime, stat.st_mtime),
+                    url=url,
+                    catalog_version=version,
+                    pinned=bool(pinned),
+                )
+            )
+        return sorted(entries, key=lambda e: e.last_access)
+
+    def total_bytes(self) -> int:
+        """Total size of the files in the cache."""
+        return sum(entry.size for entry in self.entries())
+
+    def _remove(self, entries: List[CacheEntry]) -> List[CacheEntry]:
+        """Delete cached files and drop them from the registry."""
+        for entry in entries:
+            logger.info(f"Evicting {entry.url or entry.path.name} from the cache.")
+            entry.path.unlink(missing_ok=True)
+        with self._connect() as conn:
+            conn.executemany(
+                "DELETE FROM objects WHERE filename = ?",
+                [(entry.path.name,) for entry in entries],
+            )
+        return entries
+
+    def scratch_entries(self) -> List[CacheEntry]:
+        """List the blocks of remote databases and the incomplete downloads.
+
+        They're counted against the cache budget along with the cached objects. Each
+        remote database's blocks, and each incomplete download, is a single entry,
+        least recently used first.
+        """
+        entries = []
+        for path in self.path.glob(f"{PAGE_CACHE_DIR_NAME}/*/*"):
+            entries.append(_scratch_entry(path, list(path.iterdir())))
+        for path in self.path.glob(f"{PARTIAL_DIR_NAME}/*/*.part"):
+            entries.append(_scratch_entry(path, [path, path.with_suffix(".json")]))
+        return sorted(entries, key=lambda e: e.last_access)
+
+    def _remove_scratch(self, entries: List[CacheEntry]) -> List[CacheEntry]:
+        """Delete blocks of remote databases and incomplete downloads.
+
+        Downloads that are still in progress are left alone.
+        """
+        removed = []
+        for entry in entries:
+            if entry.path.is_dir():
+                logger.info(f"Evicting the cached blocks of {entry.path.name}.")
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                lock = entry.path.with_suffix(".lock")
+                with _unless_locked(lock) as unlocked:
+                    if not unlocked:
+                        continue
+                    logger.info(f"Discarding the incomplete download {entry.path}.")
+                    entry.path.unlink(missing_ok=True)
+                    entry.path.with_suffix(".json").unlink(missing_ok=True)
+                lock.unlink(missing_ok=True)
+            removed.append(entry)
+        return removed
+
+    def purge_superseded(self) -> List[CacheEntry]:
+        """Remove unpinned objects from versions of the catalog not currently in use.
+
+        Returns:
+            The entries that were removed.
+        """
+        removed = self._remove(
+            [
+                entry
+                for entry in self.entries()
+                if entry.catalog_version not in (None, self.catalog_version)
+                and not entry.pinned
+            ]
+        )
+        for db_name, tables in [
+            (FOOTER_DB_NAME, ["footers"]),
+            (PLANT_INDEX_DB_NAME, ["files", "row_groups"]),
+        ]:
+            if not (self.path / db_name).exists():
+                continue
+            with closing(sqlite3.connect(self.path / db_name, timeout=30)) as conn:
+                with conn:
+                    for table in tables:
+                        conn.execute(
+                            f"DELETE FROM {table} WHERE catalog_version != ?",
+                            (self.catalog_version,),
+                        )
+        shutil.rmtree(self.path / QUARANTINE_DIR_NAME, ignore_errors=True)
+        for dir_name in (
+            TABLES_DIR_NAME,
+            SORTED_DIR_NAME,
+            ROLLUPS_DIR_NAME,
+            SQLITE_INDEXES_DIR_NAME,
+            RESULTS_DIR_NAME,
+            PAGE_CACHE_DIR_NAME,
+            PARTIAL_DIR_NAME,
+        ):
+            if not (self.path / dir_name).is_dir():
+                continue
+            for version_dir in (self.path / dir_name).iterdir():
+                if version_dir.name == self.catalog_version:
+                    continue
+                logger.info(
+                    f"Removing {dir_name} of catalog version {version_dir.name}"
+                )
+                if version_dir.is_dir():
+                    shutil.rmtree(version_dir, ignore_errors=True)
+                else:
+                    # Left behind before these directories were split up by version.
+                    version_dir.unlink(missing_ok=True)
+        return removed
+
+    def trim(self, max_bytes: Optional[Union[int, str]] = None) -> List[CacheEntry]:
+        """Remove superseded objects, then evict objects until the cache fits.
+
+        The least recently used unpinned objects that were cached by the catalog, blocks
+        of remote databases and incomplete downloads are evicted first.
+
+        Args:
+            max_bytes: Size to shrink the cache to. Defaults to the budget the manager
+                was created with. If there's no budget, only superseded objects are
+                removed.
+
+        Returns:
+            The entries that were removed.
+        """
+        removed = self.purge_superseded()
+        max_bytes = self.max_bytes if max_bytes is None else parse_size(max_bytes)
+        if max_bytes is None:
+            return removed
+        entries = self.entries()
+        scratch = self.scratch_entries()
+        excess = sum(entry.size for entry in entries + scratch) - max_bytes
+        evict, discard = [], []
+        for entry in sorted(entries + scratch, key=lambda e: e.last_access):
+            if excess <= 0:
+                break
+            if entry in scratch:
+                discard.append(entry)
+            elif entry.pinned or entry.url is None:
+                continue
+            else:
+                evict.append(entry)
+            excess -= entry.size
+        discarded = self._remove_scratch(discard)
+        excess += sum(entry.size for entry in discard if entry not in discarded)
+        if excess > 0:
+            logger.warning(
+                f"Cache at {self.path} is still {excess} bytes over budget after "
+                "evicting everything that's not pinned."
+            )
+        return removed + self._remove(evict) + discarded
+
+
+def _scratch_entry(path: Path, files: List[Path]) -> CacheEntry:
+    """Describe a group of scratch files in the cache as a single entry."""
+    stats = []
+    for file in files:
+        try:
+            stats.append(file.stat())
+        except FileNotFoundError:
+            pass
+    return CacheEntry(
+        path=path,
+        size=sum(stat.st_size for stat in stats),
+        last_access=max((stat.st_mtime for stat in stats), default=0.0),
+        url=None,
+        catalog_version=path.parent.name,
+        pinned=False,
+    )
+
+
+@contextmanager
+def _unless_locked(path: Path) -> Iterator[bool]:
+    """Lock a file if nothing else has, yielding whether it could be locked.
+
+    Only available on POSIX systems. Elsewhere the file is never considered locked.
+    """
+    if fcntl is None or not path.exists():
+        yield True
+        return
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_AUTO_TRIMMED = set()
+
+
+def ensure_intact(path: Path) -> bool:
+    """Check that a cached file is present and intact, quarantining it if it isn't.
+
+    Meant for the hot path: only the size and modification time are checked (see
+    :meth:`CacheManager.is_intact`), and only the first time each version of a file is
+    seen by the current process.
+
+    Returns:
+        Whether the file can be used. If not, it needs to be downloaded again.
+    """
+    path = Path(path)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return False
+    if _intact.get(path) == (stat.st_size, stat.st_mtime_ns):
+        return True
+    manager = CacheManager(path=path.parent)
+    if not manager.is_intact(path):
+        manager.quarantine([path])
+        return False
+    _intact[path] = (stat.st_size, stat.st_mtime_ns)
+    return True
+
+
+def register_cached_urls(
+    urlpaths: Iterable[str], storage_options: Optional[Dict[str, Any]] = None
+) -> None:
+    """Record access to cached remote objects by the catalog's data sources.
+
+    If a cache budget has been set with ``PUDL_INTAKE_CACHE_MAX_BYTES``, the cache is
+    also trimmed the first time a given cache directory is used by the current process.
+    """
+    urlpaths = [url for url in urlpaths if is_cached_url(url)]
+    if not urlpaths:
+        return
+    manager = CacheManager(path=cache_dir(storage_options))
+    manager.register(urlpaths, storage_options)
+    if manager.max_bytes is not None and manager.path not in _AUTO_TRIMMED:
+        _AUTO_TRIMMED.add(manager.path)
+        manager.trim()
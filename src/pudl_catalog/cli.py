@@ -0,0 +1,288 @@
+"""Command line interface for managing the PUDL Data Catalog."""
+import argparse
+import logging
+import sys
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from pudl_catalog.cache import CacheEntry, CacheManager
+
+logger = logging.getLogger(__name__)
+
+
+def _format_size(size: float) -> str:
+    """Format a number of bytes for humans."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1000:
+            return f"{size:.1f} {unit}"
+        size /= 1000
+    return f"{size:.1f} TB"
+
+
+def _print_entries(entries: List[CacheEntry]) -> None:
+    """Print a table describing cached objects."""
+    for entry in entries:
+        last_access = datetime.fromtimestamp(entry.last_access).isoformat(
+            sep=" ", timespec="seconds"
+        )
+        print(
+            f"{_format_size(entry.size):>10}  {last_access}  "
+            f"{entry.catalog_version or '-':<12} {'pinned' if entry.pinned else '':<6} "
+            f"{entry.url or entry.path.name}"
+        )
+
+
+def cache_info(args: argparse.Namespace) -> int:
+    """Describe the contents of the local cache."""
+    manager = CacheManager(path=args.cache, max_bytes=args.max_bytes)
+    entries = manager.entries()
+    _print_entries(entries)
+    scratch = sum(entry.size for entry in manager.scratch_entries())
+    if scratch:
+        print(f"{_format_size(scratch)} of database blocks and incomplete downloads")
+    total = sum(entry.size for entry in entries) + scratch
+    budget = (
+        "" if manager.max_bytes is None else f" of {_format_size(manager.max_bytes)}"
+    )
+    print(f"{len(entries)} files, {_format_size(total)}{budget} in {manager.path}")
+    return 0
+
+
+def cache_trim(args: argparse.Namespace) -> int:
+    """Remove superseded and least recently used objects from the cache."""
+    manager = CacheManager(path=args.cache, max_bytes=args.max_bytes)
+    removed = manager.purge_superseded() if args.superseded_only else manager.trim()
+    _print_entries(removed)
+    print(f"Removed {len(removed)} files, {_format_size(sum(e.size for e in removed))}")
+    return 0
+
+
+def cache_pin(args: argparse.Namespace) -> int:
+    """Protect cached objects from eviction, or remove that protection."""
+    manager = CacheManager(path=args.cache)
+    for url in args.urls:
+        manager.pin(url, pinned=not args.unpin)
+    return 0
+
+
+def cache_verify(args: argparse.Namespace) -> int:
+    """Check cached objects against their checksums, quarantining corrupted ones."""
+    manager = CacheManager(path=args.cache)
+    bad = manager.verify(max_workers=args.max_workers)
+    _print_entries(bad)
+    print(f"Quarantined {len(bad)} corrupted files. They'll be downloaded again.")
+    return 1 if bad else 0
+
+
+def cache_checksums(args: argparse.Namespace) -> int:
+    """Print the checksums of the cached objects of a catalog version."""
+    manager = CacheManager(path=args.cache)
+    for url, checksum in manager.checksums(args.catalog_version).items():
+        print(f"{checksum}  {url}")
+    return 0
+
+
+def manifest(args: argparse.Namespace) -> int:
+    """Generate the EPA CEMS partition manifest by listing the published files."""
+    import pudl_catalog
+    from pudl_catalog.manifest import DEFAULT_MANIFEST_PATH, build_partition_manifest
+
+    urlpath = args.urlpath or f"{pudl_catalog.BASE_URLS['s3']}/hourly_emissions_epacems"
+    storage_options = {"anon": True} if urlpath.startswith("s3://") else {}
+    partitions = build_partition_manifest(
+        urlpath, pudl_catalog.CATALOG_VERSION, storage_options=storage_options
+    )
+    if not partitions.partitions:
+        print(f"No EPA CEMS partitions found in {urlpath}")
+        return 1
+    output = args.output or DEFAULT_MANIFEST_PATH
+    partitions.to_yaml(output)
+    print(f"Wrote {len(partitions)} partitions found in {urlpath} to {output}")
+    return 0
+
+
+def _progress_printer() -> Callable[[str, int, int], None]:
+    """Report the progress of each download when it starts, finishes, and every 10%."""
+    reported: Dict[str, int] = {}
+
+    def progress(urlpath: str, done: int, total: int) -> None:
+        step = int(10 * done / total) if total else 10
+        if reported.get(urlpath) != step:
+            reported[urlpath] = step
+            print(f"{_format_size(done):>10} / {_format_size(total):<10} {urlpath}")
+
+    return progress
+
+
+def _run_interruptibly(func: Callable[[], Any], cancel: threading.Event) -> Any:
+    """Run a function in the background, setting cancel if we're interrupted.
+
+    Raises:
+        KeyboardInterrupt: once the function has returned, if we were interrupted.
+    """
+    outcome: Dict[str, Any] = {}
+
+    def run() -> None:
+        try:
+            outcome["result"] = func()
+        except Exception as err:
+            outcome["error"] = err
+
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(timeout=0.2)
+    except KeyboardInterrupt:
+        cancel.set()
+        worker.join()
+        raise
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+def prefetch(args: argparse.Namespace) -> int:
+    """Download the data read by catalog sources into the local cache."""
+    from pudl_catalog.prefetch import prefetch as prefetch_sources
+
+    catalog = None
+    if args.catalog is not None:
+        import intake
+
+        catalog = intake.open_catalog(args.catalog)
+    cancel = threading.Event()
+    try:
+        results = _run_interruptibly(
+            lambda: prefetch_sources(
+                args.sources,
+                years=args.years,
+                states=args.states,
+                catalog=catalog,
+                max_workers=args.max_workers,
+                progress=None if args.quiet else _progress_printer(),
+                cancel=cancel,
+            ),
+            cancel,
+        )
+    except KeyboardInterrupt:
+        print("Cancelled. Partial downloads will be resumed next time.")
+        return 130
+    failed = [result for result in results if result.error is not None]
+    cached = sum(result.already_cached for result in results)
+    print(
+        f"Prefetched {len(results) - len(failed)} of {len(results)} objects "
+        f"({cached} were already cached)."
+    )
+    for result in failed:
+        print(f"Failed: {result.target.urlpath}: {result.error}")
+    return 1 if failed else 0
+
+
+def parse_command_line(argv: List[str]) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(prog="pudl_catalog", description=__doc__)
+    parser.add_argument(
+        "--loglevel",
+        default="INFO",
+        help="Logging level (DEBUG, INFO, WARNING, ERROR, or CRITICAL).",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    cache = subparsers.add_parser("cache", help="Inspect and manage the local cache.")
+    cache.add_argument(
+        "--cache",
+        default=None,
+        help="Cache directory. Defaults to $PUDL_INTAKE_CACHE.",
+    )
+    cache.add_argument(
+        "--max-bytes",
+        default=None,
+        help="Cache budget, e.g. 50GB. Defaults to $PUDL_INTAKE_CACHE_MAX_BYTES.",
+    )
+    cache_commands = cache.add_subparsers(dest="cache_command", required=True)
+    cache_commands.add_parser("info", help=cache_info.__doc__).set_defaults(
+        func=cache_info
+    )
+    trim = cache_commands.add_parser("trim", help=cache_trim.__doc__)
+    trim.add_argument(
+        "--superseded-only",
+        action="store_true",
+        help="Only remove objects from other versions of the catalog.",
+    )
+    trim.set_defaults(func=cache_trim)
+    pin = cache_commands.add_parser("pin", help=cache_pin.__doc__)
+    pin.add_argument("urls", nargs="+", help="URLs of the cached objects.")
+    pin.add_argument("--unpin", action="store_true", help="Remove the protection.")
+    pin.set_defaults(func=cache_pin)
+    verify = cache_commands.add_parser("verify", help=cache_verify.__doc__)
+    verify.add_argument(
+        "--max-workers",
+        type=int,
+        default=8,
+        help="Maximum number of files to check at the same time.",
+    )
+    verify.set_defaults(func=cache_verify)
+    checksums = cache_commands.add_parser("checksums", help=cache_checksums.__doc__)
+    checksums.add_argument(
+        "--catalog-version",
+        default=None,
+        help="Catalog version. Defaults to the version currently in use.",
+    )
+    checksums.set_defaults(func=cache_checksums)
+
+    prefetch_parser = subparsers.add_parser("prefetch", help=prefetch.__doc__)
+    prefetch_parser.add_argument(
+        "sources",
+        nargs="+",
+        help="Names of the catalog sources, e.g. hourly_emissions_epacems_partitioned.",
+    )
+    prefetch_parser.add_argument(
+        "--years", nargs="+", type=int, help="Years of EPA CEMS data to fetch."
+    )
+    prefetch_parser.add_argument(
+        "--states", nargs="+", help="States of EPA CEMS data to fetch."
+    )
+    prefetch_parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=4,
+        help="Maximum number of objects to download at the same time.",
+    )
+    prefetch_parser.add_argument(
+        "--catalog",
+        default=None,
+        help="Path to an alternative Intake catalog. Defaults to the PUDL catalog.",
+    )
+    prefetch_parser.add_argument(
+        "--quiet", action="store_true", help="Don't report download progress."
+    )
+    prefetch_parser.set_defaults(func=prefetch)
+
+    manifest_parser = subparsers.add_parser("manifest", help=manifest.__doc__)
+    manifest_parser.add_argument(
+        "--urlpath",
+        default=None,
+        help="Directory of partitioned EPA CEMS files. Defaults to the published data.",
+    )
+    manifest_parser.add_argument(
+        "--output",
+        default=None,
+        help="Where to write the manifest. Defaults to the one distributed with the "
+        "catalog.",
+    )
+    manifest_parser.set_defaults(func=manifest)
+
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the PUDL catalog command line interface."""
+    args = parse_command_line(sys.argv[1:] if argv is None else argv)
+    logging.basicConfig(level=args.loglevel.upper())
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
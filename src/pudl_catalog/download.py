@@ -0,0 +1,401 @@
+"""Parallel, resumable downloads of large remote objects into the local cache.
+
+:mod:`fsspec` ``simplecache`` copies a remote object into the cache using a single
+sequential stream, and if the transfer is interrupted it starts over from scratch the
+next time the object is accessed. For multi-gigabyte objects like ``pudl.sqlite`` that
+is a big waste of time. Instead we split the object into byte ranges, fetch them
+concurrently, and record which ranges have been completed in a checkpoint file so that
+an interrupted download can pick up where it left off. Once all of the ranges are
+present the file is moved to the location where ``simplecache`` expects to find it, so
+subsequent reads through the catalog use it transparently.
+
+``simplecache`` names each cached file after the URL of the remote object, and the URLs
+change with every catalog version, even though most of the objects don't. So before
+downloading an object we look up its ETag, and if an object with the same size and
+ETag has already been cached under another URL, we hard link the existing file rather
+than downloading it again.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import fsspec
+
+import pudl_catalog
+from pudl_catalog import instrumentation
+from pudl_catalog.cache import (
+    PARTIAL_DIR_NAME,
+    SIDECAR_PREFIX,
+    CacheManager,
+    NotCachedError,
+    cache_dir,
+    cached_filename,
+    ensure_intact,
+    is_cached_url,
+    is_offline,
+    split_cached_url,
+)
+from pudl_catalog.footers import etag_from_info, object_etag
+from pudl_catalog.integrity import chunk_digest, combine_digests
+from pudl_catalog.sessions import request_slot, url_to_fs
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 32 * 2**20
+"""Size of the byte ranges that are fetched concurrently."""
+
+DEFAULT_MAX_WORKERS = 8
+"""Maximum number of byte ranges to fetch at the same time."""
+
+
+class DownloadCancelled(Exception):
+    """Raised when a download is cancelled before it has finished.
+
+    The ranges that were completed before the download was cancelled have been
+    checkpointed, so the download will resume where it left off next time.
+    """
+
+
+_locks: Dict[Path, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+def _lock_for(path: Path) -> threading.Lock:
+    """Get a lock that prevents concurrent downloads of the same file."""
+    with _locks_lock:
+        return _locks.setdefault(path, threading.Lock())
+
+
+@contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    """Prevent other processes from downloading the same file at the same time.
+
+    Only available on POSIX systems. Elsewhere this does nothing.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class RangeDownloader:
+    """Download a remote object by fetching byte ranges concurrently.
+
+    Args:
+        fs: The filesystem the object is stored in.
+        path: Path to the object within the filesystem.
+        dest: Where the completed download should be written.
+        partial_dir: Directory to keep the incomplete download and its checkpoint in.
+            Must be on the same filesystem as ``dest``.
+        chunk_size: Size of the byte ranges to fetch.
+        max_workers: Maximum number of ranges to fetch at the same time.
+        progress: Called with the number of bytes completed and the total size, each
+            time a range is finished.
+        cancel: If this event is set, ranges that haven't been started yet are
+            skipped and :class:`DownloadCancelled` is raised.
+
+    Each range is hashed as it arrives, and once the download is complete its
+    checksum (see :mod:`pudl_catalog.integrity`) is available as :attr:`checksum`,
+    and the ETag of the object it was downloaded from as :attr:`etag`.
+    When a download is resumed, the ranges completed earlier are checked against
+    their digests, and any that were lost or corrupted, e.g. by a crash, are fetched
+    again.
+    """
+
+    def __init__(
+        self,
+        fs: fsspec.AbstractFileSystem,
+        path: str,
+        dest: Path,
+        partial_dir: Path,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        progress: Optional[Callable[[int, int], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ):
+        """Initialize the downloader."""
+        self.fs = fs
+        self.path = path
+        self.dest = Path(dest)
+        self.partial = Path(partial_dir) / f"{self.dest.name}.part"
+        self.checkpoint = Path(partial_dir) / f"{self.dest.name}.json"
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.progress = progress
+        self.cancel = cancel
+        # Ranges are fetched on other threads, which don't know the current source.
+        self.source = instrumentation.current_source()
+        self.checksum: Optional[str] = None
+        self.etag: Optional[str] = None
+        self._digests: Dict[int, str] = {}
+
+    def _ranges(self, size: int) -> List[Tuple[int, int]]:
+        """Split the object into byte ranges."""
+        return [
+            (start, min(start + self.chunk_size, size))
+            for start in range(0, size, self.chunk_size)
+        ] or [(0, 0)]
+
+    def _load_checkpoint(self, size: int, etag: str) -> List[int]:
+        """Identify previously completed ranges, if they're for the same object."""
+        if not (self.checkpoint.exists() and self.partial.exists()):
+            return []
+        state = json.loads(self.checkpoint.read_text())
+        if (state["size"], state["etag"], state["chunk_size"]) != (
+            size,
+            etag,
+            self.chunk_size,
+        ):
+            logger.info(f"Remote object {self.path} has changed. Starting over.")
+            return []
+        digests = {int(i): digest for i, digest in state.get("digests", {}).items()}
+        ranges = self._ranges(size)
+        done = []
+        with open(self.partial, "rb") as f:
+            for i in state["done"]:
+                start, end = ranges[i]
+                f.seek(start)
+                if digests.get(i) == chunk_digest(f.read(end - start)):
+                    self._digests[i] = digests[i]
+                    done.append(i)
+        if len(done) < len(state["done"]):
+            logger.warning(
+                f"{len(state['done']) - len(done)} previously downloaded ranges of "
+                f"{self.path} were corrupted. Fetching them again."
+            )
+        return done
+
+    def _save_checkpoint(self, size: int, etag: str, done: List[int]) -> None:
+        """Atomically record which ranges have been completed."""
+        tmp = self.checkpoint.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps(
+                {
+                    "size": size,
+                    "etag": etag,
+                    "chunk_size": self.chunk_size,
+                    "done": sorted(done),
+                    "digests": {str(i): self._digests[i] for i in done},
+                }
+            )
+        )
+        os.replace(tmp, self.checkpoint)
+
+    def _fetch(self, index: int, start: int, end: int) -> Tuple[int, str]:
+        """Fetch a single byte range and write it into the partial download.
+
+        Returns:
+            The index of the range, and its digest.
+        """
+        if self.cancel is not None and self.cancel.is_set():
+            raise DownloadCancelled(f"Download of {self.path} was cancelled.")
+        data = b""
+        if end > start:
+            with request_slot(self.fs):
+                data = self.fs.cat_file(self.path, start=start, end=end)
+            instrumentation.record_request(len(data), source=self.source)
+        if len(data) != end - start:
+            raise IOError(
+                f"Expected {end - start} bytes from {self.path} at offset {start} but "
+                f"got {len(data)}."
+            )
+        with open(self.partial, "r+b") as f:
+            f.seek(start)
+            f.write(data)
+        return index, chunk_digest(data)
+
+    def run(self) -> Path:
+        """Download the object, resuming a previous attempt if possible.
+
+        Returns:
+            The path to the completed download.
+        """
+        with _lock_for(self.dest), _file_lock(self.checkpoint.with_suffix(".lock")):
+            if self.dest.exists():
+                return self.dest
+            self.partial.parent.mkdir(parents=True, exist_ok=True)
+            size = self.fs.size(self.path)
+            instrumentation.record_request()
+            etag = object_etag(self.fs, self.path)
+            ranges = self._ranges(size)
+            done = self._load_checkpoint(size, etag)
+            if not done:
+                with open(self.partial, "wb") as f:
+                    f.truncate(size)
+                self._save_checkpoint(size, etag, done)
+            todo = [(i, r) for i, r in enumerate(ranges) if i not in set(done)]
+            logger.info(
+                f"Downloading {len(todo)} of {len(ranges)} ranges of {self.path} "
+                f"({size} bytes) using up to {self.max_workers} threads."
+            )
+            completed = sum(ranges[i][1] - ranges[i][0] for i in done)
+            errors = []
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(self._fetch, i, *r) for i, r in todo]
+                for future in as_completed(futures):
+                    try:
+                        index, digest = future.result()
+                    except Exception as err:
+                        errors.append(err)
+                        continue
+                    self._digests[index] = digest
+                    done.append(index)
+                    self._save_checkpoint(size, etag, done)
+                    completed += ranges[index][1] - ranges[index][0]
+                    if self.progress is not None:
+                        self.progress(completed, size)
+            if errors:
+                # Completed ranges have been checkpointed, so a retry will resume.
+                cancelled = [e for e in errors if isinstance(e, DownloadCancelled)]
+                raise (cancelled or errors)[0]
+            self.etag = etag
+            self.checksum = combine_digests(
+                [self._digests[i] for i in range(len(ranges))], self.chunk_size
+            )
+            os.replace(self.partial, self.dest)
+            self.checkpoint.unlink()
+            return self.dest
+
+
+def content_key(info: Dict[str, Any]) -> str:
+    """Identify the content of a remote object using the info reported for it.
+
+    Object stores derive the ETag or hash from the content of the object. For local
+    files we fall back to the size and modification time.
+    """
+    return f"{info.get('size')}:{etag_from_info(info)}"
+
+
+def _link_or_copy(src: Path, dest: Path) -> None:
+    """Atomically make a file available at another path, sharing storage if possible."""
+    tmp = dest.with_name(
+        f"{SIDECAR_PREFIX}{dest.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+
+
+def _find_intact_content(manager: CacheManager, key: str) -> Optional[Path]:
+    """Find an intact cached file with the given content, if there is one."""
+    existing = manager.find_content(key)
+    if existing is not None and not ensure_intact(existing):
+        existing = None
+    instrumentation.record_cache("content", hit=existing is not None)
+    return existing
+
+
+def download_to_cache(
+    urlpath: str,
+    storage_options: Optional[Dict[str, Any]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    progress: Optional[Callable[[int, int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+    reuse: bool = True,
+) -> Path:
+    """Download a remote object into the local cache used by ``simplecache``.
+
+    Does nothing if the object has already been cached, and its size and modification
+    time match the ones recorded when it was downloaded. If they don't, the file is
+    quarantined and the object is downloaded again. The checksum of each downloaded
+    object is recorded, so the whole cache can be checked with
+    :meth:`pudl_catalog.cache.CacheManager.verify`.
+
+    Args:
+        urlpath: URL of the remote object, optionally prefixed with ``simplecache::``.
+        storage_options: Storage options associated with the URL, including the
+            ``simplecache`` cache storage location.
+        chunk_size: Size of the byte ranges that are fetched concurrently.
+        max_workers: Maximum number of ranges to fetch at the same time.
+        progress: Called with the number of bytes completed and the total size, each
+            time a range is finished.
+        cancel: If this event is set, the download stops as soon as possible and
+            :class:`DownloadCancelled` is raised. It can be resumed later.
+        reuse: If True, and an object with the same content has already been cached
+            under another URL, e.g. for another catalog version, link to the existing
+            file instead of downloading the object again.
+
+    Returns:
+        Path to the cached copy of the object.
+
+    Raises:
+        NotCachedError: If the object hasn't been cached and the catalog is in
+            offline mode. See :func:`pudl_catalog.cache.is_offline`.
+    """
+    cache = cache_dir(storage_options)
+    dest = cache / cached_filename(urlpath, storage_options)
+    intact = ensure_intact(dest)
+    instrumentation.record_cache("data", hit=intact)
+    if intact:
+        return dest
+    url, options = split_cached_url(urlpath, storage_options)
+    if is_offline():
+        raise NotCachedError(
+            f"{url} has not been cached in {cache}, and the catalog is offline."
+        )
+    fs, path = url_to_fs(url, options)
+    manager = CacheManager(path=cache)
+    if reuse:
+        info = fs.info(path)
+        key = content_key(info)
+        instrumentation.record_request()
+        existing = _find_intact_content(manager, key)
+        if existing is not None:
+            logger.info(
+                f"Reusing the identical cached object {existing.name} for {url}"
+            )
+            checksum = manager.checksum(existing)
+            with _lock_for(dest):
+                if not dest.exists():
+                    _link_or_copy(existing, dest)
+            manager.set_content_key(urlpath, key, storage_options)
+            manager.record_etag(urlpath, etag_from_info(info), storage_options)
+            if checksum is not None:
+                manager.record_checksum(urlpath, checksum, storage_options)
+            return dest
+    with instrumentation.phase("transfer"):
+        downloader = RangeDownloader(
+            fs,
+            path,
+            dest=dest,
+            partial_dir=cache / PARTIAL_DIR_NAME / pudl_catalog.CATALOG_VERSION,
+            chunk_size=chunk_size,
+            max_workers=max_workers,
+            progress=progress,
+            cancel=cancel,
+        )
+        dest = downloader.run()
+    if reuse:
+        manager.set_content_key(urlpath, key, storage_options)
+    if downloader.etag is not None:
+        manager.record_etag(urlpath, downloader.etag, storage_options)
+    if downloader.checksum is not None:
+        manager.record_checksum(urlpath, downloader.checksum, storage_options)
+    return dest
+
+
+def ensure_cached(
+    urlpath: str, storage_options: Optional[Dict[str, Any]] = None
+) -> None:
+    """Download an object into the cache in parallel, if it's accessed via the cache."""
+    if is_cached_url(urlpath):
+        download_to_cache(urlpath, storage_options)
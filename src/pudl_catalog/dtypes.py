@@ -0,0 +1,121 @@
+"""Profiles describing the pandas dtypes used to represent the EPA CEMS data.
+
+The ``default`` profile returns the data with the types it's stored with, converted to
+pandas in the usual way, with strings stored as Python objects. That is simple, but the
+hourly data has tens of millions of rows per year, and low-cardinality columns like
+``state`` repeat the same handful of values on every row. The ``compact`` profile
+represents the same data using much less memory:
+
+* Low-cardinality columns are read as categoricals.
+* Integer columns whose range is known to fit in a narrower type are downcast. This is
+  done based on the meaning of the column rather than the values in any particular
+  file, so every partition of a dask dataframe has the same dtypes, and the casts are
+  checked so that they never silently lose information.
+* Any remaining string columns use Arrow-backed strings instead of Python objects.
+"""
+from typing import Any, Dict
+
+import pandas as pd
+
+DTYPE_PROFILES = ("default", "compact")
+"""Names of the available dtype profiles."""
+
+EPACEMS_CATEGORICAL_COLUMNS = (
+    "state",
+    "so2_mass_measurement_code",
+    "nox_mass_measurement_code",
+    "co2_mass_measurement_code",
+)
+"""EPA CEMS columns with only a handful of distinct values."""
+
+EPACEMS_DOWNCAST_COLUMNS = {"year": "int16"}
+"""EPA CEMS integer columns, and the narrowest type that can hold any of their values."""
+
+
+def check_dtype_profile(profile: str) -> str:
+    """Ensure that a dtype profile exists.
+
+    Raises:
+        ValueError: if the profile isn't one of :data:`DTYPE_PROFILES`.
+    """
+    if profile not in DTYPE_PROFILES:
+        raise ValueError(
+            f"Unknown dtype profile {profile!r}. Use one of {', '.join(DTYPE_PROFILES)}."
+        )
+    return profile
+
+
+def compact_arrow_table(table: Any) -> Any:
+    """Convert an Arrow table of EPA CEMS data to the compact types.
+
+    Raises:
+        pyarrow.ArrowInvalid: if a value doesn't fit in its downcast type.
+    """
+    import pyarrow as pa
+
+    for i, field in enumerate(table.schema):
+        column = table.column(i)
+        if field.name in EPACEMS_CATEGORICAL_COLUMNS:
+            if not pa.types.is_dictionary(field.type):
+                column = column.dictionary_encode()
+        elif field.name in EPACEMS_DOWNCAST_COLUMNS and pa.types.is_integer(field.type):
+            column = column.cast(EPACEMS_DOWNCAST_COLUMNS[field.name], safe=True)
+        else:
+            continue
+        table = table.set_column(i, field.name, column)
+    return table
+
+
+def _arrow_string_types_mapper(arrow_type: Any) -> Any:
+    """Map Arrow strings to Arrow-backed pandas strings."""
+    import pyarrow as pa
+
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.StringDtype("pyarrow")
+    return None
+
+
+def arrow_to_pandas(table: Any, profile: str = "default") -> pd.DataFrame:
+    """Convert an Arrow table of EPA CEMS data to pandas using a dtype profile."""
+    if check_dtype_profile(profile) == "default":
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+    return compact_arrow_table(table).to_pandas(
+        types_mapper=_arrow_string_types_mapper, split_blocks=True, self_destruct=True
+    )
+
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert a pandas dataframe of EPA CEMS data to the compact dtypes.
+
+    Used when the data has already been read into pandas by something else, like
+    :func:`dask.dataframe.read_parquet`.
+
+    Raises:
+        ValueError: if a value doesn't fit in its downcast type.
+    """
+    dtypes: Dict[str, Any] = {}
+    for col in df.columns:
+        if col in EPACEMS_CATEGORICAL_COLUMNS:
+            dtypes[col] = "category"
+        elif col in EPACEMS_DOWNCAST_COLUMNS and pd.api.types.is_integer_dtype(df[col]):
+            downcast = df[col].astype(EPACEMS_DOWNCAST_COLUMNS[col])
+            if not (downcast == df[col]).all():
+                raise ValueError(
+                    f"Values of {col} don't fit in {EPACEMS_DOWNCAST_COLUMNS[col]}."
+                )
+            dtypes[col] = EPACEMS_DOWNCAST_COLUMNS[col]
+        elif pd.api.types.infer_dtype(df[col], skipna=True) == "string":
+            dtypes[col] = pd.StringDtype("pyarrow")
+    return df.astype(dtypes)
+
+
+def memory_per_row(df: pd.DataFrame) -> Dict[str, float]:
+    """Report the memory used by each column of a dataframe, in bytes per row.
+
+    Includes the memory used by Python string objects, and a ``total`` entry.
+    """
+    n_rows = max(len(df), 1)
+    usage = df.memory_usage(index=False, deep=True)
+    per_row = {col: usage[col] / n_rows for col in df.columns}
+    per_row["total"] = usage.sum() / n_rows
+    return per_row
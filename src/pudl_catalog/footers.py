@@ -0,0 +1,397 @@
+"""A persistent local store of Parquet file footers and row group statistics.
+
+Building a dask dataframe from a Parquet dataset requires reading and parsing the
+footer of every file, and with ``split_row_groups`` the statistics of every row group
+in them. For remote data this means at least one request per file, every time a
+dataframe is created, even if the data itself has already been cached locally. The
+published catalog data is immutable within a given ``CATALOG_VERSION``, so we store the
+footers in a small SQLite database alongside the cached data, keyed by catalog version,
+URL and ETag, and only go back to the remote file when we don't already have them.
+"""
+import datetime
+import decimal
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import fsspec
+import msgpack
+
+from pudl_catalog import instrumentation
+from pudl_catalog.cache import (
+    CacheManager,
+    cache_dir,
+    cached_filename,
+    ensure_intact,
+    is_cached_url,
+    is_offline,
+    local_copy,
+    split_cached_url,
+)
+from pudl_catalog.sessions import request_slot, url_to_fs
+
+logger = logging.getLogger(__name__)
+
+_TIMESTAMP_EXT_TYPE = 1
+_DATETIME_EXT_TYPE = 2
+_DATE_EXT_TYPE = 3
+_TIME_EXT_TYPE = 4
+_DECIMAL_EXT_TYPE = 5
+
+_ENCODABLE_TYPES = (
+    bool,
+    int,
+    float,
+    str,
+    bytes,
+    datetime.date,
+    datetime.time,
+    decimal.Decimal,
+)
+"""Types of row group statistics that can be stored. Includes pandas timestamps."""
+
+
+def _encode(obj: Any) -> Any:
+    """Serialize the types of statistics msgpack doesn't know about.
+
+    Pyarrow returns the statistics of ``ns`` timestamp columns as pandas timestamps,
+    those of coarser timestamp columns as :class:`datetime.datetime`, and those of
+    ``date32``, ``time`` and ``decimal`` columns as the corresponding Python types.
+    """
+    import pandas as pd
+
+    if isinstance(obj, pd.Timestamp):
+        tz = None if obj.tzinfo is None else str(obj.tz)
+        return msgpack.ExtType(_TIMESTAMP_EXT_TYPE, msgpack.packb([obj.value, tz]))
+    if isinstance(obj, datetime.datetime):
+        return msgpack.ExtType(_DATETIME_EXT_TYPE, obj.isoformat().encode())
+    if isinstance(obj, datetime.date):
+        return msgpack.ExtType(_DATE_EXT_TYPE, obj.isoformat().encode())
+    if isinstance(obj, datetime.time):
+        return msgpack.ExtType(_TIME_EXT_TYPE, obj.isoformat().encode())
+    if isinstance(obj, decimal.Decimal):
+        return msgpack.ExtType(_DECIMAL_EXT_TYPE, str(obj).encode())
+    raise TypeError(f"Can't serialize object of type {type(obj)}")
+
+
+def _decode(code: int, data: bytes) -> Any:
+    """Deserialize the types of statistics encoded by :func:`_encode`."""
+    import pandas as pd
+
+    if code == _TIMESTAMP_EXT_TYPE:
+        value, tz = msgpack.unpackb(data)
+        return pd.Timestamp(value, tz=tz)
+    if code == _DATETIME_EXT_TYPE:
+        return datetime.datetime.fromisoformat(data.decode())
+    if code == _DATE_EXT_TYPE:
+        return datetime.date.fromisoformat(data.decode())
+    if code == _TIME_EXT_TYPE:
+        return datetime.time.fromisoformat(data.decode())
+    if code == _DECIMAL_EXT_TYPE:
+        return decimal.Decimal(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+def object_etag(fs: fsspec.AbstractFileSystem, path: str) -> str:
+    """Identify the version of a remote object.
+
+    Uses the ETag (S3, HTTP) or hash (GCS) reported by the object store if available,
+    and falls back to the size and modification time for local files.
+    """
+    info = fs.info(path)
+    instrumentation.record_request()
+    return etag_from_info(info)
+
+
+def etag_from_info(info: Dict[str, Any]) -> str:
+    """Extract the ETag or an equivalent version identifier from object info."""
+    for key in ("ETag", "etag", "md5Hash"):
+        if info.get(key):
+            return str(info[key]).strip('"')
+    mtime = info.get("mtime", info.get("LastModified", info.get("updated", "")))
+    return f"{info.get('size')}-{mtime}"
+
+
+class ParquetFooter:
+    """The parsed footer of a Parquet file, and the statistics of its row groups.
+
+    Args:
+        metadata: The serialized Parquet footer, as written by
+            :meth:`pyarrow.parquet.FileMetaData.write_metadata_file`.
+        row_groups: For each row group, the number of rows, the total uncompressed size
+            in bytes, and a dictionary of column names to [min, max] pairs for every
+            column with statistics.
+    """
+
+    def __init__(self, metadata: bytes, row_groups: List[Dict[str, Any]]):
+        """Initialize the footer."""
+        self.metadata_bytes = metadata
+        self.row_groups = row_groups
+        self._metadata = None
+
+    @property
+    def metadata(self) -> Any:
+        """The deserialized :class:`pyarrow.parquet.FileMetaData`."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._metadata is None:
+            self._metadata = pq.read_metadata(pa.BufferReader(self.metadata_bytes))
+        return self._metadata
+
+    @property
+    def num_rows(self) -> int:
+        """Total number of rows in the file."""
+        return sum(rg["num_rows"] for rg in self.row_groups)
+
+    @classmethod
+    def from_metadata(cls, metadata: Any) -> "ParquetFooter":
+        """Extract the row group statistics from a parsed Parquet footer."""
+        import pyarrow as pa
+
+        row_groups = []
+        for i in range(metadata.num_row_groups):
+            rg = metadata.row_group(i)
+            stats = {}
+            for j in range(rg.num_columns):
+                col = rg.column(j)
+                if col.statistics is None or not col.statistics.has_min_max:
+                    continue
+                min_max = [col.statistics.min, col.statistics.max]
+                # Statistics we can't store are no use for skipping row groups anyway.
+                if all(isinstance(value, _ENCODABLE_TYPES) for value in min_max):
+                    stats[col.path_in_schema] = min_max
+            row_groups.append(
+                {
+                    "num_rows": rg.num_rows,
+                    "total_byte_size": rg.total_byte_size,
+                    "statistics": stats,
+                }
+            )
+        sink = pa.BufferOutputStream()
+        metadata.write_metadata_file(sink)
+        footer = cls(sink.getvalue().to_pybytes(), row_groups)
+        footer._metadata = metadata
+        return footer
+
+    @classmethod
+    def from_file(cls, fs: fsspec.AbstractFileSystem, path: str) -> "ParquetFooter":
+        """Read the footer of a Parquet file, without reading any of its data."""
+        import pyarrow.parquet as pq
+
+        with fs.open(path, mode="rb") as f:
+            return cls.from_metadata(pq.read_metadata(f))
+
+    def serialize(self) -> bytes:
+        """Pack the row group statistics for storage."""
+        return msgpack.packb(self.row_groups, default=_encode)
+
+    @classmethod
+    def deserialize(cls, metadata: bytes, row_groups: bytes) -> "ParquetFooter":
+        """Unpack a footer stored with :meth:`serialize`."""
+        return cls(metadata, msgpack.unpackb(row_groups, ext_hook=_decode))
+
+
+class FooterCache:
+    """A SQLite database of Parquet footers, keyed by catalog version, URL and ETag.
+
+    Args:
+        path: Location of the SQLite database. Created if it doesn't exist.
+        catalog_version: The version of the catalog whose footers are being cached.
+    """
+
+    def __init__(self, path: Path, catalog_version: str):
+        """Initialize the cache, creating the database if needed."""
+        self.path = Path(path)
+        self.catalog_version = catalog_version
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS footers ("
+                "catalog_version TEXT NOT NULL, "
+                "url TEXT NOT NULL, "
+                "etag TEXT NOT NULL, "
+                "metadata BLOB NOT NULL, "
+                "row_groups BLOB NOT NULL, "
+                "PRIMARY KEY (catalog_version, url))"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection to the database, committing and closing it afterwards."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def lookup(self, url: str, etag: Optional[str] = None) -> Optional[ParquetFooter]:
+        """Retrieve a stored footer, if we have one.
+
+        Args:
+            url: The remote URL of the Parquet file.
+            etag: If given, only return a footer that was stored for this ETag.
+        """
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT etag, metadata, row_groups FROM footers "
+                "WHERE catalog_version = ? AND url = ?",
+                (self.catalog_version, url),
+            ).fetchone()
+        if row is None or (etag is not None and row[0] != etag):
+            return None
+        return ParquetFooter.deserialize(row[1], row[2])
+
+    def store(self, url: str, etag: str, footer: ParquetFooter) -> None:
+        """Save a footer for later use."""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO footers VALUES (?, ?, ?, ?, ?)",
+                (
+                    self.catalog_version,
+                    url,
+                    etag,
+                    footer.metadata_bytes,
+                    footer.serialize(),
+                ),
+            )
+
+    def get(
+        self,
+        urlpath: str,
+        storage_options: Optional[Dict[str, Any]] = None,
+        validate: bool = False,
+    ) -> ParquetFooter:
+        """Get the footer of a Parquet file, reading it from the file only if needed.
+
+        Args:
+            urlpath: URL of the Parquet file. If it's accessed via the cache
+                (prefixed with ``simplecache::``) and has already been downloaded,
+                the footer is read from the local copy. Otherwise it's read directly
+                from the remote file, using a range request, without downloading the
+                whole thing.
+            storage_options: Storage options associated with the URL.
+            validate: If True, check that the ETag of the remote object still matches
+                the stored footer. Otherwise objects within a catalog version are
+                assumed to be immutable, and no remote requests are made at all when
+                the footer has already been stored.
+
+        In offline mode (see :func:`pudl_catalog.cache.is_offline`) the footer is
+        never validated, and if it hasn't been stored it's read from the cached copy
+        of the file.
+        """
+        url, options = split_cached_url(urlpath, storage_options)
+        fs, path, etag = None, None, None
+        if validate and not is_offline():
+            fs, path = url_to_fs(url, options)
+            etag = object_etag(fs, path)
+        footer = self.lookup(url, etag=etag)
+        instrumentation.record_cache("footers", hit=footer is not None)
+        if footer is not None:
+            return footer
+        if is_offline():
+            local = fsspec.filesystem("file")
+            path = str(local_copy(urlpath, storage_options))
+            with instrumentation.phase("footers"):
+                footer = ParquetFooter.from_file(local, path)
+                self.store(url, etag_from_info(local.info(path)), footer)
+            return footer
+        downloaded = _downloaded_copy(urlpath, storage_options, etag=etag)
+        if downloaded is not None:
+            local_path, downloaded_etag = downloaded
+            with instrumentation.phase("footers"):
+                footer = ParquetFooter.from_file(
+                    fsspec.filesystem("file"), str(local_path)
+                )
+                self.store(url, downloaded_etag, footer)
+            return footer
+        if fs is None:
+            fs, path = url_to_fs(url, options)
+        logger.debug(f"Reading Parquet footer from {url}")
+        with instrumentation.phase("footers"), request_slot(fs):
+            footer = ParquetFooter.from_file(fs, path)
+            instrumentation.record_request(len(footer.metadata_bytes))
+            self.store(url, etag or object_etag(fs, path), footer)
+        return footer
+
+
+def _downloaded_copy(
+    urlpath: str,
+    storage_options: Optional[Dict[str, Any]] = None,
+    etag: Optional[str] = None,
+) -> Optional[Tuple[Path, str]]:
+    """Find an intact downloaded copy of a remote file, and the ETag it had.
+
+    Only files downloaded with :func:`pudl_catalog.download.download_to_cache` qualify,
+    since it records the ETag of each object it downloads.
+
+    Args:
+        urlpath: URL of the file, which must be prefixed with ``simplecache::``.
+        storage_options: Storage options associated with the URL.
+        etag: If given, the copy must have been downloaded from this version of the
+            remote object.
+    """
+    if not is_cached_url(urlpath):
+        return None
+    path = cache_dir(storage_options) / cached_filename(urlpath, storage_options)
+    if not ensure_intact(path):
+        return None
+    recorded = CacheManager(path=path.parent).etag(path)
+    if recorded is None or (etag is not None and recorded != etag):
+        return None
+    return path, recorded
+
+
+def row_group_may_match(
+    statistics: Dict[str, Any], filters: Optional[List[Any]]
+) -> bool:
+    """Check whether a row group could contain rows satisfying DNF filters.
+
+    Args:
+        statistics: Mapping of column names to (min, max) values within the row group.
+            Predicates on columns without statistics are assumed to be satisfiable.
+        filters: Filters in disjunctive normal form, or a single conjunction.
+    """
+    if not filters:
+        return True
+    if isinstance(filters[0], tuple):
+        filters = [filters]
+    return any(
+        all(
+            _predicate_may_match(statistics[col], op, value)
+            for col, op, value in conjunction
+            if col in statistics
+        )
+        for conjunction in filters
+    )
+
+
+def _predicate_may_match(min_max: Any, op: str, value: Any) -> bool:  # noqa: C901
+    """Check whether any value in the range [min, max] could satisfy a predicate."""
+    lo, hi = min_max
+    try:
+        if op in ("=", "=="):
+            return lo <= value <= hi
+        if op == "in":
+            return any(lo <= v <= hi for v in value)
+        if op == "<":
+            return lo < value
+        if op == "<=":
+            return lo <= value
+        if op == ">":
+            return hi > value
+        if op == ">=":
+            return hi >= value
+        if op == "!=":
+            return not (lo == hi == value)
+        if op == "not in":
+            return not (lo == hi and lo in value)
+    except TypeError:
+        # Incomparable types (e.g. tz-naive vs. tz-aware) can't be used for pruning.
+        return True
+    raise ValueError(f"Unrecognized filter operator: {op}")
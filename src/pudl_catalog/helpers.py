@@ -1,11 +1,308 @@
 """Helper functions for working with the PUDL Data Catalog."""
-from itertools import product
-from typing import Iterable, List, Tuple, Union
+from datetime import date, datetime, timezone
+from typing import Any, Iterable, List, Optional, Tuple, Union
+
+Predicate = Tuple[str, str, Any]
+"""A single ``(column, operator, value)`` filter predicate."""
+
+DateTimeLike = Union[str, datetime]
+"""Anything that can be interpreted as a timestamp by :class:`pandas.Timestamp`."""
+
+
+def _set_predicate(column: str, values: Iterable[Any]) -> Predicate:
+    """Select a set of values with a single predicate.
+
+    Single values use equality so that they remain as simple as possible. Multiple
+    values are collapsed into a single ``in`` predicate, rather than one predicate per
+    value.
+    """
+    values = set(values)
+    if len(values) == 1:
+        return (column, "=", values.pop())
+    return (column, "in", values)
+
+
+def _utc_timestamp(value: DateTimeLike) -> Any:
+    """Interpret a datetime-like value as a UTC timestamp."""
+    import pandas as pd
+
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        return ts.tz_localize("UTC")
+    return ts.tz_convert("UTC")
+
+
+def epacems_filter(
+    years: Optional[Iterable[int]] = None,
+    states: Optional[Iterable[str]] = None,
+    plant_ids: Optional[Iterable[int]] = None,
+    min_year: Optional[int] = None,
+    max_year: Optional[int] = None,
+    start: Optional[DateTimeLike] = None,
+    end: Optional[DateTimeLike] = None,
+) -> Optional[List[List[Predicate]]]:
+    """Create a compact filter for reading a subset of the EPA CEMS Parquet data.
+
+    Each kind of constraint is expressed with at most one or two predicates, which are
+    combined into a single conjunction. E.g. asking for 25 years and 50 states results
+    in a filter containing 2 predicates, rather than the 1,250 separate conjunctions
+    that result from enumerating every combination of year and state. This keeps the
+    cost of evaluating the filter against each file and row group constant as more
+    years and states are requested.
+
+    Args:
+        years: 4-digit years of data to read.
+        states: 2-letter abbreviations of the states to read. Case insensitive.
+        plant_ids: EIA plant IDs (``plant_id_eia``) to read.
+        min_year: Earliest year of data to read (inclusive).
+        max_year: Latest year of data to read (inclusive).
+        start: Earliest ``operating_datetime_utc`` to read (inclusive). Naive
+            timestamps are assumed to be in UTC.
+        end: Latest ``operating_datetime_utc`` to read (exclusive). Naive timestamps
+            are assumed to be in UTC.
+
+    Returns:
+        A list containing a single list of ``(column, operator, value)`` tuples,
+        suitable for use as the ``filters`` argument to the read_parquet() methods of
+        pandas and dask dataframes, or None if no constraints were given.
+
+    Examples:
+        >>> epacems_filter(years=[2019, 2020], states=["co"])
+        [[('year', 'in', {2019, 2020}), ('state', '=', 'CO')]]
+        >>> epacems_filter(min_year=2015, plant_ids=[3])
+        [[('year', '>=', 2015), ('plant_id_eia', '=', 3)]]
+    """
+    conjunction: List[Predicate] = []
+    if years is not None:
+        conjunction.append(_set_predicate("year", (int(year) for year in years)))
+    if min_year is not None:
+        conjunction.append(("year", ">=", int(min_year)))
+    if max_year is not None:
+        conjunction.append(("year", "<=", int(max_year)))
+    if states is not None:
+        conjunction.append(_set_predicate("state", (state.upper() for state in states)))
+    if plant_ids is not None:
+        conjunction.append(_set_predicate("plant_id_eia", (int(p) for p in plant_ids)))
+    if start is not None:
+        conjunction.append(("operating_datetime_utc", ">=", _utc_timestamp(start)))
+    if end is not None:
+        conjunction.append(("operating_datetime_utc", "<", _utc_timestamp(end)))
+    return [conjunction] if conjunction else None
+
+
+def time_range_filter(
+    start: Optional[DateTimeLike] = None, end: Optional[DateTimeLike] = None
+) -> Optional[List[List[Predicate]]]:
+    """Select a range of ``operating_datetime_utc``, and the years that may contain it.
+
+    The predicates on ``year`` let whole year partitions outside of the range be
+    skipped. Years aren't necessarily assigned based on UTC, so they're padded by a day
+    on either side.
+
+    Args:
+        start: Earliest ``operating_datetime_utc`` to read (inclusive). Naive
+            timestamps are assumed to be in UTC.
+        end: Latest ``operating_datetime_utc`` to read (exclusive). Naive timestamps
+            are assumed to be in UTC.
+
+    Returns:
+        Filters in disjunctive normal form, or None if neither bound was given.
+
+    Examples:
+        >>> time_range_filter(start="2020-06-01", end="2020-09-01")[0][:2]
+        [('year', '>=', 2020), ('year', '<=', 2020)]
+    """
+    import pandas as pd
+
+    day = pd.Timedelta(days=1)
+    return epacems_filter(
+        min_year=None if start is None else (_utc_timestamp(start) - day).year,
+        max_year=None if end is None else (_utc_timestamp(end) + day).year,
+        start=start,
+        end=end,
+    )
+
+
+def filters_to_expression(filters: Optional[List[Any]]) -> Any:  # noqa: C901
+    """Convert DNF filters into an equivalent :mod:`pyarrow.dataset` expression.
+
+    Args:
+        filters: Filters in disjunctive normal form, like those returned by
+            :func:`epacems_filter` or :func:`year_state_filter`. A single conjunction
+            (a flat list of tuples) is also accepted.
+
+    Returns:
+        A :class:`pyarrow.dataset.Expression`, or None if there are no filters.
+    """
+    import pyarrow.dataset as ds
+
+    if not filters:
+        return None
+    if isinstance(filters[0], tuple):
+        filters = [filters]
+    expression = None
+    for conjunction in filters:
+        term = None
+        for col, op, value in conjunction:
+            field = ds.field(col)
+            if op in ("=", "=="):
+                pred = field == value
+            elif op == "!=":
+                pred = field != value
+            elif op == "<":
+                pred = field < value
+            elif op == "<=":
+                pred = field <= value
+            elif op == ">":
+                pred = field > value
+            elif op == ">=":
+                pred = field >= value
+            elif op == "in":
+                pred = field.isin(list(value))
+            elif op == "not in":
+                pred = ~field.isin(list(value))
+            else:
+                raise ValueError(f"Unrecognized filter operator: {op}")
+            term = pred if term is None else term & pred
+        expression = term if expression is None else expression | term
+    return expression
+
+
+def _sql_param(value: Any) -> Any:
+    """Convert a filter value into something SQLite can compare against.
+
+    SQLite stores dates and datetimes as ISO 8601 strings, with datetimes in UTC.
+    NumPy scalars are converted to the equivalent Python values.
+    """
+    if type(value).__module__ == "numpy" and hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def filters_to_sql(filters: Optional[List[Any]]) -> Tuple[Optional[str], List[Any]]:
+    """Convert DNF filters into an equivalent SQL ``WHERE`` clause.
+
+    Args:
+        filters: Filters in disjunctive normal form, or a single conjunction.
+
+    Returns:
+        The SQL expression, with ``?`` placeholders for the values, and the values to
+        substitute for them. The expression is None if there are no filters.
+
+    Examples:
+        >>> filters_to_sql([[("report_year", ">=", 2020), ("state", "in", {"CO", "ID"})]])
+        ('(("report_year" >= ? AND "state" IN (?, ?)))', [2020, 'CO', 'ID'])
+    """
+    if not filters:
+        return None, []
+    if isinstance(filters[0], tuple):
+        filters = [filters]
+    terms, params = [], []
+    for conjunction in filters:
+        preds = []
+        for col, op, value in conjunction:
+            if op in ("in", "not in"):
+                values = sorted(value) if isinstance(value, (set, frozenset)) else value
+                values = [_sql_param(v) for v in values]
+                placeholders = ", ".join("?" * len(values))
+                preds.append(f'"{col}" {op.upper()} ({placeholders})')
+                params.extend(values)
+            elif op in ("=", "==", "!=", "<", "<=", ">", ">="):
+                preds.append(f'"{col}" {"=" if op == "==" else op} ?')
+                params.append(_sql_param(value))
+            else:
+                raise ValueError(f"Unrecognized filter operator: {op}")
+        terms.append(f"({' AND '.join(preds)})")
+    return f"({' OR '.join(terms)})", params
+
+
+def restrict_filters(
+    filters: Optional[List[Any]], columns: Iterable[str]
+) -> Optional[List[List[Predicate]]]:
+    """Restrict DNF filters to the predicates on some of the columns.
+
+    Rows matching the original filters also match the restricted filters, so the
+    restricted filters can be used to look up candidate rows in an index.
+
+    Args:
+        filters: Filters in disjunctive normal form, or a single conjunction.
+        columns: The columns whose predicates are kept.
+
+    Returns:
+        The restricted filters, or None if some conjunction has no predicates on the
+        columns, in which case they can't rule out any rows.
+
+    Examples:
+        >>> plant, state = ("plant_id_eia", "==", 1), ("state", "==", "CO")
+        >>> restrict_filters([plant, state], ["plant_id_eia"])
+        [[('plant_id_eia', '==', 1)]]
+        >>> restrict_filters([[plant], [state]], ["plant_id_eia"]) is None
+        True
+    """
+    if not filters:
+        return None
+    if isinstance(filters[0], tuple):
+        filters = [filters]
+    columns = set(columns)
+    restricted = []
+    for conjunction in filters:
+        preds = [pred for pred in conjunction if pred[0] in columns]
+        if not preds:
+            return None
+        restricted.append(preds)
+    return restricted
+
+
+def normalize_filters(filters: Optional[List[Any]]) -> List[List[List[Any]]]:
+    """Put DNF filters into a canonical form, e.g. to use them as a cache key.
+
+    Filters that select the same rows in trivially different ways, e.g. with their
+    predicates or set members in a different order, normalize to the same value.
+    Values are converted as in :func:`filters_to_sql`.
+
+    Args:
+        filters: Filters in disjunctive normal form, or a single conjunction.
+
+    Returns:
+        A sorted list of conjunctions, each a sorted list of ``[column, operator,
+        value]`` predicates, which can be serialized as JSON.
+
+    Examples:
+        >>> normalize_filters([("year", "in", {2020, 2019}), ("state", "=", "CO")])
+        [[['state', '==', 'CO'], ['year', 'in', [2019, 2020]]]]
+    """
+    if not filters:
+        return []
+    if isinstance(filters[0], tuple):
+        filters = [filters]
+    normalized = set()
+    for conjunction in filters:
+        preds = set()
+        for col, op, value in conjunction:
+            if op in ("in", "not in"):
+                value = tuple(sorted({_sql_param(v) for v in value}, key=repr))
+            else:
+                value = _sql_param(value)
+            preds.add((col, "==" if op == "=" else op, value))
+        normalized.add(tuple(sorted(preds, key=repr)))
+    return [
+        [
+            [col, op, list(value) if isinstance(value, tuple) else value]
+            for col, op, value in conjunction
+        ]
+        for conjunction in sorted(normalized, key=repr)
+    ]
 
 
 def year_state_filter(
     years: Iterable[int] = None, states: Iterable[str] = None
-) -> List[List[Tuple[Union[str, int]]]]:
+) -> Optional[List[List[Predicate]]]:
     """
     Create filters to read given years and states from partitioned parquet dataset.
 
@@ -25,6 +322,10 @@ def year_state_filter(
     states. E.g. if years=(2018, 2019) and states=("CA", "CO") then the filter would
     result in getting 2018 and 2019 data for CO, as well as 2018 and 2019 data for CA.
 
+    This is now a thin wrapper around :func:`epacems_filter`, which expresses the same
+    selection using set membership rather than enumerating every combination of year
+    and state.
+
     Args:
         years: 4-digit integers indicating the years of data you would like
             to read. By default it includes all available years.
@@ -36,28 +337,4 @@ def year_state_filter(
         read_parquet() method of pandas and dask dataframes.
 
     """
-    if years is not None:
-        year_filters = [("year", "=", year) for year in years]
-    if states is not None:
-        state_filters = [("state", "=", state.upper()) for state in states]
-
-    if states and not years:
-        filters = [
-            [
-                tuple(x),
-            ]
-            for x in state_filters
-        ]
-    elif years and not states:
-        filters = [
-            [
-                tuple(x),
-            ]
-            for x in year_filters
-        ]
-    elif years and states:
-        filters = [list(x) for x in product(year_filters, state_filters)]
-    else:
-        filters = None
-
-    return filters
+    return epacems_filter(years=years or None, states=states or None)
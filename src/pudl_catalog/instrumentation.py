@@ -0,0 +1,262 @@
+"""Count the I/O done by each catalog source, and time each phase of reading it.
+
+When a read is slow it's useful to know whether the time went to listing remote
+files, reading Parquet footers, transferring data into the local cache, or reading
+and decoding the data. The catalog records this as it goes, attributing everything to
+the source that caused it:
+
+* ``requests`` and ``bytes_transferred``: remote requests made, and the bytes they
+  returned.
+* ``cache_hits`` and ``cache_misses``: lookups in each of the local caches, i.e.
+  ``data`` (whole objects in ``PUDL_INTAKE_CACHE``), ``content`` (identical objects
+  cached for another catalog version), ``footers`` (the Parquet footer database),
+  ``index`` (the EPA CEMS plant index), ``pages`` (blocks of SQLite databases read
+  using range requests) and ``results`` (memoized EPA CEMS reads).
+* ``seconds`` and ``calls``: time spent in each phase, i.e. ``listing``, ``footers``,
+  ``index``, ``transfer`` and ``read``.
+
+EPA CEMS sources are identified by their name in the catalog, SQLite databases by
+their file name (e.g. ``pudl``), and SQLite tables as ``<database>.<table>``.
+
+The statistics are kept in memory for the life of the process. They're available from
+:func:`stats`, can be logged with :func:`log_stats`, or written out in the Prometheus
+text exposition format with :func:`to_prometheus` and :func:`write_prometheus`, e.g. for
+the node exporter's textfile collector.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+PHASES = ("listing", "footers", "index", "transfer", "read")
+"""Phases of reading data that are timed separately."""
+
+CACHES = ("data", "content", "footers", "index", "pages", "results")
+"""Local caches whose hits and misses are counted."""
+
+UNATTRIBUTED = "unattributed"
+"""Source to which I/O that happens outside of any catalog source is attributed."""
+
+_current_source: ContextVar[str] = ContextVar(
+    "pudl_catalog_source", default=UNATTRIBUTED
+)
+
+
+class SourceStats:
+    """I/O statistics for a single catalog source."""
+
+    def __init__(self):
+        """Start with all statistics at zero."""
+        self.requests = 0
+        self.bytes_transferred = 0
+        self.cache_hits: Dict[str, int] = {}
+        self.cache_misses: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Represent the statistics as a dictionary, copying any nested values."""
+        return {
+            "requests": self.requests,
+            "bytes_transferred": self.bytes_transferred,
+            "cache_hits": dict(self.cache_hits),
+            "cache_misses": dict(self.cache_misses),
+            "seconds": dict(self.seconds),
+            "calls": dict(self.calls),
+        }
+
+
+_stats: Dict[str, SourceStats] = {}
+_stats_lock = threading.Lock()
+
+
+def _source_stats(source: Optional[str]) -> SourceStats:
+    """Get the statistics of a source, creating them if needed. Hold the lock."""
+    source = source or _current_source.get()
+    if source not in _stats:
+        _stats[source] = SourceStats()
+    return _stats[source]
+
+
+def current_source() -> str:
+    """The source to which I/O in the current context is attributed."""
+    return _current_source.get()
+
+
+@contextmanager
+def source(name: Optional[str]) -> Iterator[None]:
+    """Attribute any I/O within the block to a catalog source.
+
+    The source is tracked using a :mod:`contextvars` variable, so it isn't inherited
+    by threads started within the block. Code that hands work off to other threads
+    needs to pass the source name along explicitly.
+
+    Args:
+        name: Name of the source. If None, the current source is left unchanged.
+    """
+    if name is None:
+        yield
+        return
+    token = _current_source.set(name)
+    try:
+        yield
+    finally:
+        _current_source.reset(token)
+
+
+def record_request(nbytes: int = 0, source: Optional[str] = None) -> None:
+    """Count a remote request, and the number of bytes it returned.
+
+    Args:
+        nbytes: Number of bytes returned by the request.
+        source: The source that made the request. Defaults to the current source.
+    """
+    with _stats_lock:
+        stats = _source_stats(source)
+        stats.requests += 1
+        stats.bytes_transferred += nbytes
+
+
+def record_cache(cache: str, hit: bool, source: Optional[str] = None) -> None:
+    """Count a lookup in one of the local caches.
+
+    Args:
+        cache: Which cache was used. One of :data:`CACHES`.
+        hit: Whether the item was found in the cache.
+        source: The source that did the lookup. Defaults to the current source.
+    """
+    with _stats_lock:
+        stats = _source_stats(source)
+        counts = stats.cache_hits if hit else stats.cache_misses
+        counts[cache] = counts.get(cache, 0) + 1
+
+
+@contextmanager
+def phase(name: str, source: Optional[str] = None) -> Iterator[None]:
+    """Time a phase of reading data, adding the elapsed time to the source's total.
+
+    Args:
+        name: Name of the phase. One of :data:`PHASES`.
+        source: The source doing the work. Defaults to the current source.
+    """
+    source = source or _current_source.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _stats_lock:
+            stats = _source_stats(source)
+            stats.seconds[name] = stats.seconds.get(name, 0.0) + elapsed
+            stats.calls[name] = stats.calls.get(name, 0) + 1
+        logger.debug(
+            f"{source}: {name} took {elapsed:.3f}s",
+            extra={"pudl_source": source, "pudl_phase": name, "pudl_seconds": elapsed},
+        )
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """Get a snapshot of the statistics recorded so far, by source.
+
+    Examples:
+        >>> reset()
+        >>> with source("hourly_emissions_epacems"):
+        ...     record_request(nbytes=1024)
+        ...     record_cache("data", hit=False)
+        >>> stats()["hourly_emissions_epacems"]["bytes_transferred"]
+        1024
+    """
+    with _stats_lock:
+        return {name: s.to_dict() for name, s in _stats.items()}
+
+
+def reset() -> None:
+    """Discard all of the statistics recorded so far."""
+    with _stats_lock:
+        _stats.clear()
+
+
+def log_stats(level: int = logging.INFO) -> None:
+    """Log a summary of the statistics of each source.
+
+    Each record also carries the full statistics as ``pudl_stats``, and the source
+    name as ``pudl_source``, for use by structured logging formatters.
+    """
+    for name, s in stats().items():
+        hits, misses = sum(s["cache_hits"].values()), sum(s["cache_misses"].values())
+        timings = ", ".join(f"{p} {t:.3f}s" for p, t in s["seconds"].items())
+        logger.log(
+            level,
+            f"{name}: {s['requests']} requests, {s['bytes_transferred']} bytes, "
+            f"{hits} cache hits, {misses} cache misses"
+            + (f", {timings}" if timings else ""),
+            extra={"pudl_source": name, "pudl_stats": s},
+        )
+
+
+def _escape_label(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus(prefix: str = "pudl_catalog") -> str:
+    """Render the statistics in the Prometheus text exposition format.
+
+    Args:
+        prefix: Prefix of the metric names.
+    """
+    metrics = [
+        ("requests_total", "counter", "Remote requests made.", "requests", None),
+        (
+            "transferred_bytes_total",
+            "counter",
+            "Bytes returned by remote requests.",
+            "bytes_transferred",
+            None,
+        ),
+        ("cache_hits_total", "counter", "Local cache hits.", "cache_hits", "cache"),
+        (
+            "cache_misses_total",
+            "counter",
+            "Local cache misses.",
+            "cache_misses",
+            "cache",
+        ),
+        (
+            "phase_seconds_total",
+            "counter",
+            "Time spent in each phase of reading data.",
+            "seconds",
+            "phase",
+        ),
+        ("phase_calls_total", "counter", "Number of timed phases.", "calls", "phase"),
+    ]
+    snapshot = stats()
+    lines: List[str] = []
+    for suffix, kind, help_text, key, label in metrics:
+        name = f"{prefix}_{suffix}"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for source_name, s in sorted(snapshot.items()):
+            labels = f'source="{_escape_label(source_name)}"'
+            if label is None:
+                lines.append(f"{name}{{{labels}}} {s[key]}")
+                continue
+            for value_label, value in sorted(s[key].items()):
+                lines.append(
+                    f'{name}{{{labels},{label}="{_escape_label(value_label)}"}} {value}'
+                )
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: Union[str, Path], prefix: str = "pudl_catalog") -> None:
+    """Atomically write the statistics to a file in the Prometheus text format."""
+    path = Path(path)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(to_prometheus(prefix))
+    os.replace(tmp, path)
@@ -0,0 +1,60 @@
+"""Checksums of the objects in the local cache, for detecting corrupted files.
+
+Objects are downloaded as byte ranges fetched concurrently and in no particular order
+(see :mod:`pudl_catalog.download`), so they can't be hashed as a single stream.
+Instead each range is hashed with SHA-256 as it arrives, and the checksum of the
+object is the SHA-256 of the concatenated digests of its ranges. The range size is
+part of the checksum, so that a cached file can be verified later by hashing it in
+ranges of the same size.
+
+Examples:
+    >>> checksum = combine_digests([chunk_digest(b"abc"), chunk_digest(b"de")], 3)
+    >>> checksum.startswith("sha256-3:")
+    True
+    >>> checksum_chunk_size(checksum)
+    3
+"""
+import hashlib
+from pathlib import Path
+from typing import List
+
+ALGORITHM = "sha256"
+"""Hash function used for the checksums."""
+
+
+def chunk_digest(data: bytes) -> str:
+    """Hash a single byte range of an object."""
+    return hashlib.new(ALGORITHM, data).hexdigest()
+
+
+def combine_digests(digests: List[str], chunk_size: int) -> str:
+    """Combine the digests of the consecutive byte ranges of an object into a checksum.
+
+    Args:
+        digests: Digests of each range, in order. An empty object has a single empty
+            range.
+        chunk_size: Size of the ranges. Only the last one may be smaller.
+    """
+    combined = hashlib.new(ALGORITHM)
+    for digest in digests:
+        combined.update(bytes.fromhex(digest))
+    return f"{ALGORITHM}-{chunk_size}:{combined.hexdigest()}"
+
+
+def checksum_chunk_size(checksum: str) -> int:
+    """The size of the byte ranges a checksum was computed from."""
+    return int(checksum.split(":", 1)[0].split("-", 1)[1])
+
+
+def file_checksum(path: Path, chunk_size: int) -> str:
+    """Compute the checksum of a local file, reading it in ranges of a given size."""
+    digests = []
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data and digests:
+                break
+            digests.append(chunk_digest(data))
+            if len(data) < chunk_size:
+                break
+    return combine_digests(digests, chunk_size)
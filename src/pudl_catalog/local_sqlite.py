@@ -0,0 +1,259 @@
+"""Pooled, tuned, read-only connections to SQLite databases in the local cache.
+
+Opening a SQLite connection means opening the file, reading its schema and starting
+with an empty page cache, and by default a :mod:`sqlite3` connection can only be used
+by the thread that opened it. Rather than paying those costs on every read, each
+database gets a :class:`ConnectionPool` of connections that are handed to one thread
+at a time and reused afterwards. The :mod:`sqlite3` module releases the GIL while a
+query runs, so threads using different connections from the same pool read
+concurrently.
+
+The connections are read-only, use memory-mapped I/O and a large page cache, and keep
+temporary tables in memory. Databases downloaded into the cache are immutable within a
+catalog version, so they're also opened with ``immutable=1``, which tells SQLite not
+to take any locks or check whether the file has been changed by another process.
+
+The published databases can't be modified, so extra indexes on frequently filtered
+columns, like ``plant_id_eia`` or ``report_date``, are kept in a separate sidecar
+database in the cache (see :func:`ensure_indexes`). Each indexed table is copied into
+the sidecar with its ``rowid`` and the indexed columns only, and the sidecar is attached
+to the connections reading the table so that the matching rowids can be looked up
+there, e.g.::
+
+    SELECT ... FROM generators_eia860 WHERE rowid IN (
+        SELECT pudl_catalog_rowid FROM pudl_catalog_indexes.generators_eia860
+        WHERE plant_id_eia IN (...)
+    ) AND plant_id_eia IN (...)
+"""
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pudl_catalog
+from pudl_catalog import instrumentation
+from pudl_catalog.cache import SQLITE_INDEXES_DIR_NAME, cache_dir, cached_filename
+from pudl_catalog.download import _file_lock, _lock_for
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 8
+"""Maximum number of idle connections kept open for each database."""
+
+DEFAULT_MMAP_SIZE = 2**34
+"""Bytes of each database to memory map. SQLite caps this at a compile time limit."""
+
+DEFAULT_CACHE_SIZE = 64 * 2**20
+"""Bytes of pages cached by each connection, in addition to the memory mapped pages."""
+
+INDEX_SCHEMA = "pudl_catalog_indexes"
+"""Name under which the sidecar index database is attached to connections."""
+
+ROWID_COLUMN = "pudl_catalog_rowid"
+"""Column of the sidecar tables holding the rowid of the indexed rows."""
+
+_pools: Dict[Tuple[str, bool], "ConnectionPool"] = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """A pool of tuned, read-only connections to a local SQLite database.
+
+    Args:
+        path: Path to the database.
+        immutable: Whether the database is guaranteed not to change while it's open,
+            e.g. because it was downloaded into the cache for a catalog version.
+        size: Maximum number of idle connections to keep open. More connections are
+            opened if more threads need them at the same time, but only this many are
+            kept afterwards.
+        mmap_size: Bytes of the database to memory map.
+        cache_size: Bytes of pages cached by each connection.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        immutable: bool = False,
+        size: int = DEFAULT_POOL_SIZE,
+        mmap_size: int = DEFAULT_MMAP_SIZE,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+    ):
+        """Initialize the pool. Connections are opened when they're first needed."""
+        self.path = Path(path)
+        self.immutable = immutable
+        self.size = size
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def _open(self) -> sqlite3.Connection:
+        """Open a new connection to the database and tune it for reading."""
+        uri = f"{self.path.as_uri()}?mode=ro"
+        if self.immutable:
+            uri += "&immutable=1"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = 1")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        # Negative sizes are in KiB rather than pages.
+        conn.execute(f"PRAGMA cache_size = {-int(self.cache_size // 1024)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection from the pool, returning it afterwards.
+
+        The connection must not be used by any other thread until it's returned.
+        """
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._open()
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                keep = len(self._idle) < self.size
+                if keep:
+                    self._idle.append(conn)
+            if not keep:
+                conn.close()
+
+    def close(self) -> None:
+        """Close all of the idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+def pool_for(path: Path, immutable: bool = False) -> ConnectionPool:
+    """Get the connection pool for a local database, creating it if needed.
+
+    Args:
+        path: Path to the database.
+        immutable: Whether the database is guaranteed not to change while it's open.
+    """
+    key = (str(Path(path).resolve()), immutable)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(Path(key[0]), immutable=immutable)
+        return _pools[key]
+
+
+def close_pools() -> None:
+    """Close the idle connections in every pool, e.g. before removing databases."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
+
+
+def index_path(
+    urlpath: str,
+    storage_options: Optional[Dict[str, Any]] = None,
+    catalog_version: Optional[str] = None,
+) -> Path:
+    """Where the extra indexes of a SQLite database are stored in the cache.
+
+    Args:
+        urlpath: Path or URL of the SQLite database.
+        storage_options: Storage options associated with the URL, which may specify
+            the location of the cache.
+        catalog_version: Version of the catalog the database belongs to. Defaults to
+            the current version.
+    """
+    return (
+        cache_dir(storage_options)
+        / SQLITE_INDEXES_DIR_NAME
+        / (catalog_version or pudl_catalog.CATALOG_VERSION)
+        / f"{cached_filename(urlpath)}.sqlite"
+    )
+
+
+def ensure_indexes(
+    db_path: Path, path: Path, table: str, columns: Iterable[str]
+) -> List[str]:
+    """Index some columns of a table in a sidecar database, if they aren't already.
+
+    Args:
+        db_path: Path to the local database containing the table.
+        path: Path to the sidecar database. See :func:`index_path`.
+        table: Name of the table.
+        columns: Names of the columns to index. They must be in the table.
+
+    Returns:
+        All of the columns of the table that are indexed in the sidecar.
+    """
+    columns = list(columns)
+    path = Path(path).resolve()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _lock_for(path), _file_lock(path.with_suffix(".lock")):
+        if path.exists() and Path(db_path).stat().st_mtime > path.stat().st_mtime:
+            logger.info(f"Rebuilding the indexes in {path.name}, which are stale.")
+            path.unlink()
+        conn = sqlite3.connect(path.as_uri(), uri=True, timeout=30)
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS pudl_catalog_indexed ("
+                    "table_name TEXT NOT NULL, "
+                    "column_name TEXT NOT NULL, "
+                    "PRIMARY KEY (table_name, column_name))"
+                )
+            indexed = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT column_name FROM pudl_catalog_indexed WHERE table_name = ?",
+                    (table,),
+                )
+            ]
+            if set(columns) <= set(indexed):
+                return indexed
+            indexed += [col for col in columns if col not in indexed]
+            logger.info(f"Indexing {', '.join(indexed)} of {table} in {path.name}")
+            with instrumentation.phase("index"):
+                conn.execute(
+                    "ATTACH DATABASE ? AS source",
+                    (f"{Path(db_path).resolve().as_uri()}?mode=ro",),
+                )
+                with conn:
+                    conn.execute(f'DROP TABLE IF EXISTS main."{table}"')
+                    conn.execute(
+                        f'CREATE TABLE main."{table}" AS SELECT rowid AS {ROWID_COLUMN}, '
+                        + ", ".join(f'"{col}"' for col in indexed)
+                        + f' FROM source."{table}"'
+                    )
+                    for col in indexed:
+                        conn.execute(
+                            f'CREATE INDEX main."{table}.{col}" '
+                            f'ON "{table}" ("{col}", {ROWID_COLUMN})'
+                        )
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO main.pudl_catalog_indexed VALUES (?, ?)",
+                        [(table, col) for col in indexed],
+                    )
+                    conn.execute("ANALYZE main")
+                conn.execute("DETACH DATABASE source")
+        finally:
+            conn.close()
+    return indexed
+
+
+@contextmanager
+def attached_indexes(conn: sqlite3.Connection, path: Path) -> Iterator[None]:
+    """Attach a sidecar index database to a connection as :data:`INDEX_SCHEMA`."""
+    conn.execute(
+        f"ATTACH DATABASE ? AS {INDEX_SCHEMA}",
+        (f"{Path(path).resolve().as_uri()}?mode=ro",),
+    )
+    try:
+        yield
+    finally:
+        conn.execute(f"DETACH DATABASE {INDEX_SCHEMA}")
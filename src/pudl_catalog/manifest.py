@@ -0,0 +1,270 @@
+"""Manifests mapping (year, state) partitions of EPA CEMS to published Parquet files.
+
+The partitioned EPA CEMS dataset is stored as one Parquet file per year and state.
+Rather than listing the remote directory and opening every file footer in order to
+figure out which files contain the requested data, we ship a small manifest with each
+version of the catalog that tells us exactly which objects exist, so a request for a
+handful of years and states can be resolved directly to a short list of files.
+
+The manifest must be generated from a listing of the published files, using
+``pudl_catalog manifest`` (see :func:`build_partition_manifest`), and never written by
+hand: any partition it lists that doesn't exist turns a read into a 404. If no
+manifest is distributed with the catalog, the remote files are listed instead.
+"""
+import logging
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import fsspec
+import yaml
+
+from pudl_catalog.sessions import url_to_fs
+
+logger = logging.getLogger(__name__)
+
+PartitionKey = Tuple[int, str]
+"""A (year, state) pair identifying a single EPA CEMS partition."""
+
+DEFAULT_MANIFEST_PATH = Path(__file__).parent.resolve() / "epacems_partitions.yaml"
+"""Location of the partition manifest distributed with the catalog."""
+
+PARTITION_TEMPLATE = "epacems-{year}-{state}.parquet"
+"""Naming convention used for the year-state partitioned Parquet files."""
+
+_PARTITION_REGEX = re.compile(r"epacems-(?P<year>\d{4})-(?P<state>[A-Z]{2})\.parquet$")
+
+_MANIFEST_HEADER = """\
+# Manifest of the year-state partitioned EPA CEMS Parquet files published with a
+# given version of the catalog. Each (year, state) pair maps to a single object named
+# using the template below, relative to the hourly_emissions_epacems directory.
+# Generated from a listing of the published files by `pudl_catalog manifest`.
+# Don't edit it by hand. Regenerate it whenever CATALOG_VERSION is bumped.
+"""
+
+_parsed_manifests: Dict[Tuple[str, float], "PartitionManifest"] = {}
+
+
+class PartitionManifest:
+    """The set of year-state partitioned Parquet files in a catalog version.
+
+    Args:
+        catalog_version: Version of the catalog the manifest describes.
+        partitions: Mapping of (year, state) to the name of the corresponding file,
+            relative to the directory containing the partitioned dataset.
+    """
+
+    def __init__(self, catalog_version: str, partitions: Dict[PartitionKey, str]):
+        """Initialize the manifest."""
+        self.catalog_version = catalog_version
+        self.partitions = dict(sorted(partitions.items()))
+
+    def __len__(self) -> int:
+        """Number of partitions in the manifest."""
+        return len(self.partitions)
+
+    @property
+    def years(self) -> List[int]:
+        """All years which appear in at least one partition."""
+        return sorted({year for year, _ in self.partitions})
+
+    @property
+    def states(self) -> List[str]:
+        """All states which appear in at least one partition."""
+        return sorted({state for _, state in self.partitions})
+
+    @classmethod
+    def from_yaml(cls, path: Union[str, Path]) -> "PartitionManifest":
+        """Read a partition manifest from a YAML file.
+
+        The file lists the years and states that have been published, and any
+        combinations of the two that are missing, rather than enumerating every one of
+        the more than a thousand partitions.
+        """
+        with fsspec.open(str(path), mode="r") as f:
+            spec = yaml.safe_load(f)
+        template = spec.get("template", PARTITION_TEMPLATE)
+        missing = {(int(year), str(state)) for year, state in spec.get("missing", [])}
+        partitions = {
+            (int(year), str(state)): template.format(year=year, state=state)
+            for year in spec["years"]
+            for state in spec["states"]
+            if (int(year), str(state)) not in missing
+        }
+        return cls(catalog_version=str(spec["catalog_version"]), partitions=partitions)
+
+    def to_yaml(self, path: Union[str, Path]) -> None:
+        """Write the manifest out in the same compact format read by :meth:`from_yaml`."""
+        years, states = self.years, self.states
+        spec = {
+            "catalog_version": self.catalog_version,
+            "table": "hourly_emissions_epacems",
+            "template": PARTITION_TEMPLATE,
+            "years": years,
+            "states": states,
+            "missing": [
+                [year, state]
+                for year in years
+                for state in states
+                if (year, state) not in self.partitions
+            ],
+        }
+        with fsspec.open(str(path), mode="w") as f:
+            f.write(_MANIFEST_HEADER)
+            yaml.safe_dump(spec, f, sort_keys=False)
+
+    def select(
+        self,
+        years: Optional[Iterable[int]] = None,
+        states: Optional[Iterable[str]] = None,
+        filters: Optional[List[Any]] = None,
+    ) -> List[str]:
+        """Identify the files which could contain the requested years and states.
+
+        Args:
+            years: Years of data to select. By default all years are selected.
+            states: 2-letter state abbreviations to select. By default all states are
+                selected.
+            filters: DNF filters of the kind passed to :func:`dask.dataframe.read_parquet`.
+                Only the predicates on ``year`` and ``state`` are used to prune
+                partitions. Any other predicates are ignored here, and must still be
+                applied when the data is read.
+
+        Returns:
+            Sorted list of the relative file names of the selected partitions.
+        """
+        year_set = None if years is None else {int(year) for year in years}
+        state_set = None if states is None else {state.upper() for state in states}
+        keys = [
+            (year, state)
+            for year, state in self.partitions
+            if (year_set is None or year in year_set)
+            and (state_set is None or state in state_set)
+            and partition_matches_filters(year, state, filters)
+        ]
+        return [self.partitions[key] for key in keys]
+
+
+def _predicate_may_match(value: Any, op: str, target: Any) -> bool:
+    """Evaluate a single DNF predicate against a partition's year or state."""
+    if op in ("=", "=="):
+        return value == target
+    if op == "!=":
+        return value != target
+    if op == "in":
+        return value in target
+    if op == "not in":
+        return value not in target
+    if op == "<":
+        return value < target
+    if op == "<=":
+        return value <= target
+    if op == ">":
+        return value > target
+    if op == ">=":
+        return value >= target
+    raise ValueError(f"Unrecognized filter operator: {op}")
+
+
+def partition_matches_filters(
+    year: int, state: str, filters: Optional[List[Any]]
+) -> bool:
+    """Determine whether a year-state partition could satisfy a set of DNF filters.
+
+    Filters may be given either as a single conjunction (a list of tuples) or as a
+    disjunction of conjunctions (a list of lists of tuples). A partition matches if
+    any of the conjunctions could be true for it, considering only the predicates that
+    refer to the ``year`` and ``state`` columns.
+    """
+    if not filters:
+        return True
+    if isinstance(filters[0], tuple):
+        filters = [filters]
+    partition = {"year": year, "state": state}
+    return any(
+        all(
+            _predicate_may_match(partition[col], op, target)
+            for col, op, target in conjunction
+            if col in partition
+        )
+        for conjunction in filters
+    )
+
+
+def partition_key(urlpath: str) -> Optional[PartitionKey]:
+    """Identify the year and state of a partition from its file name, if possible."""
+    match = _PARTITION_REGEX.search(urlpath)
+    if match is None:
+        return None
+    return int(match.group("year")), match.group("state")
+
+
+def _read_manifest(path: Union[str, Path]) -> PartitionManifest:
+    """Read a manifest, reusing the parsed copy of a local file that hasn't changed."""
+    local = Path(path)
+    if "://" in str(path) or not local.is_file():
+        return PartitionManifest.from_yaml(path)
+    key = (str(local.resolve()), local.stat().st_mtime)
+    if key not in _parsed_manifests:
+        _parsed_manifests[key] = PartitionManifest.from_yaml(local)
+    return _parsed_manifests[key]
+
+
+def load_partition_manifest(
+    catalog_version: str, path: Optional[Union[str, Path]] = None
+) -> Optional[PartitionManifest]:
+    """Load the partition manifest for a given catalog version, if one is available.
+
+    Args:
+        catalog_version: The version of the catalog that the manifest must describe.
+        path: Location of the manifest. By default the manifest distributed with the
+            catalog is used.
+
+    Returns:
+        The manifest, or None if it describes a different version of the catalog or
+        no manifest has been distributed with the catalog, in which case the caller
+        should fall back to listing the remote files.
+    """
+    if path is None and not DEFAULT_MANIFEST_PATH.is_file():
+        logger.info(
+            f"No partition manifest is distributed with catalog version "
+            f"{catalog_version}. Listing the remote files instead."
+        )
+        return None
+    manifest = _read_manifest(path or DEFAULT_MANIFEST_PATH)
+    if manifest.catalog_version != catalog_version:
+        logger.warning(
+            f"Partition manifest describes catalog version {manifest.catalog_version} "
+            f"but {catalog_version} was requested. Ignoring the manifest."
+        )
+        return None
+    return manifest
+
+
+def build_partition_manifest(
+    urlpath: str,
+    catalog_version: str,
+    storage_options: Optional[Dict[str, Any]] = None,
+) -> PartitionManifest:
+    """Construct a partition manifest by listing the published files.
+
+    This is meant to be run once when a new version of the catalog is released, so
+    that users don't have to list the remote directory themselves.
+
+    Args:
+        urlpath: URL of the directory containing the partitioned Parquet files.
+        catalog_version: Version of the catalog the files belong to.
+        storage_options: Options passed to the :mod:`fsspec` filesystem.
+
+    Returns:
+        A manifest describing every partition found in the directory.
+    """
+    fs, path = url_to_fs(urlpath, storage_options)
+    partitions: Dict[PartitionKey, str] = {}
+    for name in fs.ls(path, detail=False):
+        key = partition_key(name)
+        if key is None:
+            logger.debug(f"Skipping non-partition file {name}")
+            continue
+        partitions[key] = PARTITION_TEMPLATE.format(year=key[0], state=key[1])
+    return PartitionManifest(catalog_version=catalog_version, partitions=partitions)
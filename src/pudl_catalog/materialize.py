@@ -0,0 +1,266 @@
+"""Convert published data into Parquet files in the local cache that are faster to read.
+
+SQLite stores data row by row, so reading a few columns of a large table still means
+reading every row in its entirety and converting each value into a Python object. The
+published databases are immutable within a catalog version, so the first time a table
+is read we can convert it into a Parquet file in the local cache, and serve later
+reads from that file instead, reading only the requested columns and skipping row
+groups which can't contain the requested rows.
+
+Similarly, each row group of the published EPA CEMS data covers a whole year of a few
+plants, so its statistics can't be used to skip any of it when reading a few weeks of
+data. A local copy of each file can be sorted by time, so that each row group covers a
+short period, and only the row groups overlapping the requested period are read.
+"""
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pudl_catalog
+from pudl_catalog.cache import (
+    SORTED_DIR_NAME,
+    TABLES_DIR_NAME,
+    cache_dir,
+    cached_filename,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROW_GROUP_SIZE = 250_000
+"""Number of rows in each row group of the converted tables.
+
+Large enough for efficient columnar scans, and small enough that the row group
+statistics can be used to skip much of a table when reading a subset of its rows.
+"""
+
+DEFAULT_SORTED_ROW_GROUP_SIZE = 100_000
+"""Number of rows in each row group of the EPA CEMS files sorted by time.
+
+Between about a week and a month of hourly data, depending on how many units there
+are in the state.
+"""
+
+DEFAULT_SORT_MAX_ROWS_IN_MEMORY = 1_000_000
+"""Approximate number of rows sorted at once when sorting EPA CEMS files by time."""
+
+SORT_COLUMNS = ("operating_datetime_utc", "plant_id_eia", "emissions_unit_id_epa")
+"""Columns the sorted copies of the EPA CEMS files are sorted by, if present."""
+
+
+def materialized_path(
+    urlpath: str,
+    table: str,
+    storage_options: Optional[Dict[str, Any]] = None,
+    catalog_version: Optional[str] = None,
+) -> Path:
+    """Where a SQLite table converted to Parquet is stored in the cache.
+
+    Args:
+        urlpath: Path or URL of the SQLite database.
+        table: Name of the table.
+        storage_options: Storage options associated with the URL, which may specify
+            the location of the cache.
+        catalog_version: Version of the catalog the database belongs to. Defaults to
+            the current version.
+    """
+    return (
+        cache_dir(storage_options)
+        / TABLES_DIR_NAME
+        / (catalog_version or pudl_catalog.CATALOG_VERSION)
+        / cached_filename(urlpath)
+        / f"{table}.parquet"
+    )
+
+
+def write_parquet(
+    batches: Iterable[Any],
+    schema: Any,
+    path: Path,
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+) -> Path:
+    """Atomically write a stream of Arrow record batches to a Parquet file.
+
+    Batches are accumulated until they fill a whole row group, so the row group size
+    doesn't depend on the size of the batches.
+
+    Args:
+        batches: Record batches to write.
+        schema: The schema of the file. Fields with the null type take their type from
+            the first batch.
+        path: Where to write the file.
+        row_group_size: Number of rows in each row group.
+
+    Raises:
+        pyarrow.ArrowInvalid: if the values in a batch can't be cast to the schema.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    writer = None
+    pending: List[Any] = []
+    pending_rows = 0
+
+    def flush(final: bool = False) -> None:
+        nonlocal pending, pending_rows
+        if not pending:
+            return
+        table = pa.Table.from_batches(pending).cast(writer.schema)
+        rows = (
+            table.num_rows if final else pending_rows // row_group_size * row_group_size
+        )
+        writer.write_table(table.slice(0, rows), row_group_size=row_group_size)
+        pending = table.slice(rows).to_batches()
+        pending_rows = table.num_rows - rows
+
+    try:
+        for batch in batches:
+            if writer is None:
+                schema = pa.schema(
+                    [
+                        batch.schema.field(field.name)
+                        if pa.types.is_null(field.type)
+                        else field
+                        for field in schema
+                    ]
+                )
+                writer = pq.ParquetWriter(tmp, schema, compression="snappy")
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows >= row_group_size:
+                flush()
+        if writer is None:
+            writer = pq.ParquetWriter(tmp, schema, compression="snappy")
+        flush(final=True)
+        writer.close()
+        os.replace(tmp, path)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        tmp.unlink(missing_ok=True)
+        raise
+    return path
+
+
+def sorted_path(
+    urlpath: str,
+    storage_options: Optional[Dict[str, Any]] = None,
+    catalog_version: Optional[str] = None,
+) -> Path:
+    """Where a copy of a Parquet file sorted by time is stored in the cache.
+
+    Args:
+        urlpath: URL of the original file.
+        storage_options: Storage options associated with the URL, which may specify
+            the location of the cache.
+        catalog_version: Version of the catalog the file belongs to. Defaults to the
+            current version.
+    """
+    return (
+        cache_dir(storage_options)
+        / SORTED_DIR_NAME
+        / (catalog_version or pudl_catalog.CATALOG_VERSION)
+        / f"{cached_filename(urlpath, storage_options)}.parquet"
+    )
+
+
+def _time_range(pf: Any) -> Optional[Tuple[int, int]]:
+    """The earliest and latest ``operating_datetime_utc`` in a file, as integers.
+
+    Only the timestamp column is read, one row group at a time.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if "operating_datetime_utc" not in pf.schema_arrow.names:
+        return None
+    lows, highs = [], []
+    for i in range(pf.num_row_groups):
+        column = pf.read_row_group(i, columns=["operating_datetime_utc"]).column(0)
+        min_max = pc.min_max(column.cast(pa.int64()))
+        if min_max["min"].is_valid:
+            lows.append(min_max["min"].as_py())
+            highs.append(min_max["max"].as_py())
+    return (min(lows), max(highs)) if lows else None
+
+
+def write_sorted(
+    source: Any,
+    path: Path,
+    row_group_size: int = DEFAULT_SORTED_ROW_GROUP_SIZE,
+    max_rows_in_memory: int = DEFAULT_SORT_MAX_ROWS_IN_MEMORY,
+) -> Path:
+    """Atomically write a copy of a Parquet file sorted by :data:`SORT_COLUMNS`.
+
+    Files with more than ``max_rows_in_memory`` rows are sorted without reading all
+    of them into memory. The time they cover is divided into periods expected to hold
+    about that many rows each. Each row group of the file is sorted on its own, and
+    split by period into a temporary file next to the copy. Then the rows of each
+    period are read back, sorted together and written to the copy in order.
+
+    Args:
+        source: Path or file-like object to read the original file from.
+        path: Where to write the sorted copy.
+        row_group_size: Number of rows in each row group of the copy.
+        max_rows_in_memory: Approximate number of rows to sort at once, in addition
+            to one row group of the original file.
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(source)
+    schema = pf.schema_arrow
+    keys = [(col, "ascending") for col in SORT_COLUMNS if col in schema.names]
+    num_periods = -(-pf.metadata.num_rows // max_rows_in_memory)
+    time_range = _time_range(pf) if num_periods > 1 else None
+    if time_range is None:
+        table = pf.read().sort_by(keys)
+        return write_parquet(
+            table.to_batches(max_chunksize=row_group_size),
+            schema,
+            path,
+            row_group_size=row_group_size,
+        )
+
+    first, last = time_range
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=path.parent, prefix=f"{path.name}.") as tmp:
+        spill_path = Path(tmp) / "unsorted.parquet"
+        # The row groups of the temporary file holding rows from each period.
+        periods: List[List[int]] = [[] for _ in range(num_periods)]
+        with pq.ParquetWriter(spill_path, schema, compression="snappy") as writer:
+            spilled = 0
+            for i in range(pf.num_row_groups):
+                table = pf.read_row_group(i).sort_by(keys)
+                # Missing timestamps are sorted last, so they go in the last period.
+                times = (
+                    table.column("operating_datetime_utc")
+                    .cast(pa.int64())
+                    .fill_null(last)
+                    .to_numpy()
+                )
+                period = (times - first) * num_periods // (last - first + 1)
+                bounds = np.searchsorted(period, np.arange(num_periods + 1))
+                for p, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])):
+                    for offset in range(lo, hi, row_group_size):
+                        chunk = table.slice(offset, min(row_group_size, hi - offset))
+                        writer.write_table(chunk, row_group_size=chunk.num_rows)
+                        periods[p].append(spilled)
+                        spilled += 1
+
+        unsorted = pq.ParquetFile(spill_path)
+
+        def sorted_batches() -> Iterator[Any]:
+            for row_groups in periods:
+                if row_groups:
+                    table = unsorted.read_row_groups(row_groups).sort_by(keys)
+                    yield from table.to_batches(max_chunksize=row_group_size)
+
+        return write_parquet(
+            sorted_batches(), schema, path, row_group_size=row_group_size
+        )
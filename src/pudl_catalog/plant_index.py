@@ -0,0 +1,194 @@
+"""A local index of the plants and units found in each EPA CEMS row group.
+
+Most queries of the hourly EPA CEMS data ask for every hour of a few plants. The data
+is only partitioned by year and state, and the row group statistics only record the
+minimum and maximum ``plant_id_eia`` in each row group, which span nearly the whole
+range of plant IDs in a state. So a query for a few plants, especially one that doesn't
+specify their states, ends up reading every row group of every file it touches.
+
+The index records exactly which ``plant_id_eia`` and ``emissions_unit_id_epa`` values
+appear in each row group. It's built one file at a time, the first time that file is
+queried by plant or unit, by reading only those two columns, which are a tiny fraction
+of the file and are fetched with range requests if the file hasn't been cached
+locally. The index is stored in a SQLite database alongside the cached data and keyed
+by catalog version and URL, like the Parquet footers (see :mod:`pudl_catalog.footers`),
+so it never needs to be rebuilt within a catalog version.
+"""
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import fsspec
+
+from pudl_catalog import instrumentation
+from pudl_catalog.cache import (
+    cache_dir,
+    cached_filename,
+    is_cached_url,
+    is_offline,
+    local_copy,
+    split_cached_url,
+)
+from pudl_catalog.helpers import filters_to_sql, restrict_filters
+from pudl_catalog.sessions import url_to_fs
+
+logger = logging.getLogger(__name__)
+
+INDEX_COLUMNS = ("plant_id_eia", "emissions_unit_id_epa")
+"""Columns whose values are indexed, if they're present in the data."""
+
+
+def uses_index(filters: Optional[List[Any]]) -> bool:
+    """Check whether the index could help select the rows matching some filters."""
+    return restrict_filters(filters, INDEX_COLUMNS) is not None
+
+
+class PlantIndex:
+    """A SQLite database of the plants and units in each row group of each file.
+
+    Args:
+        path: Location of the SQLite database. Created if it doesn't exist.
+        catalog_version: The version of the catalog whose files are being indexed.
+    """
+
+    def __init__(self, path: Path, catalog_version: str):
+        """Initialize the index, creating the database if needed."""
+        self.path = Path(path)
+        self.catalog_version = catalog_version
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "catalog_version TEXT NOT NULL, "
+                "url TEXT NOT NULL, "
+                "columns TEXT NOT NULL, "
+                "PRIMARY KEY (catalog_version, url))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS row_groups ("
+                "catalog_version TEXT NOT NULL, "
+                "url TEXT NOT NULL, "
+                "row_group INTEGER NOT NULL, "
+                "plant_id_eia INTEGER, "
+                "emissions_unit_id_epa TEXT)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS row_groups_by_plant "
+                "ON row_groups (catalog_version, url, plant_id_eia)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection to the database, committing and closing it afterwards."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def indexed_columns(self, url: str) -> Optional[List[str]]:
+        """The columns that were indexed for a file, or None if it isn't indexed."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT columns FROM files WHERE catalog_version = ? AND url = ?",
+                (self.catalog_version, url),
+            ).fetchone()
+        return None if row is None else [c for c in row[0].split(",") if c]
+
+    def build(
+        self, urlpath: str, storage_options: Optional[Dict[str, Any]] = None
+    ) -> List[str]:
+        """Index a Parquet file, reading only the indexed columns.
+
+        Args:
+            urlpath: URL of the Parquet file, optionally prefixed with
+                ``simplecache::``. If the file has been cached, the local copy is
+                read. Otherwise only the indexed columns are read from the remote
+                file.
+            storage_options: Storage options associated with the URL.
+
+        Returns:
+            The columns that were indexed.
+        """
+        import pyarrow.parquet as pq
+
+        url, options = split_cached_url(urlpath, storage_options)
+        local = cache_dir(storage_options) / cached_filename(urlpath, storage_options)
+        if is_cached_url(urlpath) and local.exists():
+            instrumentation.record_cache("data", hit=True)
+            fs, path = fsspec.filesystem("file"), str(local)
+        elif is_offline():
+            fs, path = fsspec.filesystem("file"), str(local_copy(urlpath, options))
+        else:
+            fs, path = url_to_fs(url, options)
+        logger.debug(f"Indexing plants and units in {url}")
+        rows = []
+        with instrumentation.phase("index"), fs.open(path, mode="rb") as f:
+            pf = pq.ParquetFile(f)
+            columns = [c for c in INDEX_COLUMNS if c in pf.schema_arrow.names]
+            for i in range(pf.num_row_groups if columns else 0):
+                values = (
+                    pf.read_row_group(i, columns=columns)
+                    .group_by(columns)
+                    .aggregate([])
+                    .to_pydict()
+                )
+                plants = values.get("plant_id_eia", [None] * len(values[columns[0]]))
+                units = values.get("emissions_unit_id_epa", [None] * len(plants))
+                rows += [
+                    (self.catalog_version, url, i, plant, unit)
+                    for plant, unit in zip(plants, units)
+                ]
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "DELETE FROM row_groups WHERE catalog_version = ? AND url = ?",
+                (self.catalog_version, url),
+            )
+            conn.executemany("INSERT INTO row_groups VALUES (?, ?, ?, ?, ?)", rows)
+            conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+                (self.catalog_version, url, ",".join(columns)),
+            )
+        return columns
+
+    def row_groups(
+        self,
+        urlpath: str,
+        filters: Optional[List[Any]],
+        storage_options: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Set[int]]:
+        """Find the row groups of a file which may contain rows matching some filters.
+
+        The file is indexed first if it hasn't been already.
+
+        Args:
+            urlpath: URL of the Parquet file, optionally prefixed with
+                ``simplecache::``.
+            filters: Filters in disjunctive normal form, or a single conjunction.
+            storage_options: Storage options associated with the URL.
+
+        Returns:
+            The indices of the row groups, or None if the filters don't constrain any
+            of the indexed columns, in which case any row group may match.
+        """
+        url, _ = split_cached_url(urlpath, storage_options)
+        columns = self.indexed_columns(url)
+        instrumentation.record_cache("index", hit=columns is not None)
+        if columns is None:
+            columns = self.build(urlpath, storage_options)
+        index_filters = restrict_filters(filters, columns)
+        if index_filters is None:
+            return None
+        sql, params = filters_to_sql(index_filters)
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT row_group FROM row_groups "
+                f"WHERE catalog_version = ? AND url = ? AND {sql}",
+                [self.catalog_version, url, *params],
+            ).fetchall()
+        return {row[0] for row in rows}
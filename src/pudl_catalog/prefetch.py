@@ -0,0 +1,260 @@
+"""Warm the local cache ahead of time by prefetching the data a job will need.
+
+Otherwise the first ``read()`` or ``to_dask().compute()`` of remote data pays the full
+cost of downloading it. :func:`prefetch` resolves catalog sources (optionally limited
+to some years and states of the EPA CEMS data) to the remote objects they read, and
+downloads them into the cache concurrently, so it can be run while a container is
+starting up, before any latency-sensitive work begins. The same thing is available
+from the command line as ``pudl_catalog prefetch`` and to asyncio applications as
+:func:`prefetch_async`.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import pudl_catalog
+from pudl_catalog import instrumentation
+from pudl_catalog.cache import (
+    CACHE_PREFIX,
+    FOOTER_DB_NAME,
+    cache_dir,
+    cached_filename,
+    is_cached_url,
+    register_cached_urls,
+)
+from pudl_catalog.download import (
+    DEFAULT_MAX_WORKERS,
+    DownloadCancelled,
+    download_to_cache,
+)
+from pudl_catalog.footers import FooterCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREFETCH_WORKERS = 4
+"""Maximum number of objects to download at the same time."""
+
+
+class PrefetchTarget(NamedTuple):
+    """A remote object to be fetched into the cache."""
+
+    source: str
+    urlpath: str
+    storage_options: Dict[str, Any]
+
+
+class PrefetchResult(NamedTuple):
+    """The outcome of prefetching a single remote object."""
+
+    target: PrefetchTarget
+    path: Optional[Path]
+    already_cached: bool = False
+    error: Optional[BaseException] = None
+
+
+def _cached_urlpath(urlpath: str) -> str:
+    """Ensure that a remote URL is accessed via the cache."""
+    if is_cached_url(urlpath) or "://" not in urlpath:
+        return urlpath
+    return CACHE_PREFIX + urlpath
+
+
+def plan_prefetch(
+    sources: Iterable[str],
+    years: Optional[Iterable[int]] = None,
+    states: Optional[Iterable[str]] = None,
+    filters: Optional[List[Any]] = None,
+    catalog: Any = None,
+) -> List[PrefetchTarget]:
+    """Identify the remote objects read by some catalog sources.
+
+    Args:
+        sources: Names of sources in the catalog, e.g.
+            ``hourly_emissions_epacems_partitioned`` or ``pudl``.
+        years: Years of EPA CEMS data to fetch. By default all years are fetched.
+        states: States of EPA CEMS data to fetch. By default all states are fetched.
+        filters: Additional DNF filters used to select EPA CEMS partitions.
+        catalog: The Intake catalog containing the sources. Defaults to the PUDL
+            catalog.
+
+    Returns:
+        The objects to fetch. Local files are left out, since there's nothing to
+        fetch.
+    """
+    from pudl_catalog.sources import EpaCemsSource, SQLiteCatalog
+
+    catalog = pudl_catalog.pudl_cat if catalog is None else catalog
+    targets = []
+    for name in sources:
+        if name not in catalog:
+            raise KeyError(f"No source named {name!r} in the catalog.")
+        # Look at the arguments before opening the source, since opening a SQLite
+        # catalog downloads the whole database.
+        plugin, args = catalog._entries[name]._create_open_args({})
+        storage_options = args.get("storage_options") or {}
+        if issubclass(plugin, EpaCemsSource):
+            if filters is not None:
+                args["filters"] = filters
+            source = plugin(years=years, states=states, **args)
+            source.name = name
+            urlpaths = source.selected_urlpaths()
+        elif issubclass(plugin, SQLiteCatalog):
+            urlpaths = [_cached_urlpath(args["urlpath"])]
+        else:
+            raise ValueError(f"Don't know how to prefetch {name} ({plugin.__name__}).")
+        targets += [
+            PrefetchTarget(name, urlpath, storage_options)
+            for urlpath in urlpaths
+            if is_cached_url(urlpath)
+        ]
+    return targets
+
+
+def _fetch(
+    target: PrefetchTarget,
+    range_workers: int,
+    progress: Optional[Callable[[str, int, int], None]],
+    cancel: threading.Event,
+) -> PrefetchResult:
+    """Download a single object into the cache, along with its Parquet footer."""
+    if cancel.is_set():
+        raise DownloadCancelled(f"Prefetching {target.urlpath} was cancelled.")
+    dest = cache_dir(target.storage_options) / cached_filename(target.urlpath)
+    already_cached = dest.exists()
+    with instrumentation.source(target.source):
+        path = download_to_cache(
+            target.urlpath,
+            target.storage_options,
+            max_workers=range_workers,
+            progress=None
+            if progress is None
+            else lambda done, total: progress(target.urlpath, done, total),
+            cancel=cancel,
+        )
+        register_cached_urls([target.urlpath], target.storage_options)
+        if target.urlpath.endswith(".parquet"):
+            FooterCache(
+                cache_dir(target.storage_options) / FOOTER_DB_NAME,
+                catalog_version=pudl_catalog.CATALOG_VERSION,
+            ).get(target.urlpath, target.storage_options)
+    if progress is not None:
+        size = path.stat().st_size
+        progress(target.urlpath, size, size)
+    return PrefetchResult(target, path, already_cached=already_cached)
+
+
+def prefetch_targets(
+    targets: List[PrefetchTarget],
+    max_workers: int = DEFAULT_PREFETCH_WORKERS,
+    range_workers: int = DEFAULT_MAX_WORKERS,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> List[PrefetchResult]:
+    """Download remote objects into the cache concurrently.
+
+    Args:
+        targets: The objects to download.
+        max_workers: Maximum number of objects to download at the same time.
+        range_workers: Maximum number of byte ranges of each object to download at
+            the same time.
+        progress: Called with the URL, the number of bytes completed and the total
+            size of an object as its download progresses.
+        cancel: If this event is set, objects that haven't been started are skipped
+            and downloads in progress stop as soon as possible. Partial downloads are
+            resumed the next time they're requested.
+
+    Returns:
+        The outcome for each object, in the same order as the targets. Errors are
+        reported in the results rather than raised, so one failure doesn't prevent
+        the other objects from being fetched.
+    """
+    cancel = threading.Event() if cancel is None else cancel
+    results: Dict[int, PrefetchResult] = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_fetch, target, range_workers, progress, cancel): i
+            for i, target in enumerate(targets)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as err:
+                if not isinstance(err, DownloadCancelled):
+                    logger.error(f"Failed to prefetch {targets[i].urlpath}: {err}")
+                results[i] = PrefetchResult(targets[i], None, error=err)
+    return [results[i] for i in range(len(targets))]
+
+
+def prefetch(
+    sources: Iterable[str],
+    years: Optional[Iterable[int]] = None,
+    states: Optional[Iterable[str]] = None,
+    filters: Optional[List[Any]] = None,
+    catalog: Any = None,
+    max_workers: int = DEFAULT_PREFETCH_WORKERS,
+    range_workers: int = DEFAULT_MAX_WORKERS,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> List[PrefetchResult]:
+    """Download the data read by some catalog sources into the local cache.
+
+    Args:
+        sources: Names of sources in the catalog, e.g.
+            ``hourly_emissions_epacems_partitioned`` or ``pudl``.
+        years: Years of EPA CEMS data to fetch. By default all years are fetched.
+        states: States of EPA CEMS data to fetch. By default all states are fetched.
+        filters: Additional DNF filters used to select EPA CEMS partitions.
+        catalog: The Intake catalog containing the sources. Defaults to the PUDL
+            catalog.
+        max_workers: Maximum number of objects to download at the same time.
+        range_workers: Maximum number of byte ranges of each object to download at
+            the same time.
+        progress: Called with the URL, the number of bytes completed and the total
+            size of an object as its download progresses.
+        cancel: An event which can be set from another thread to stop prefetching.
+
+    Returns:
+        The outcome of fetching each remote object.
+
+    Examples:
+        Warm the cache with two years of Colorado EPA CEMS data and the PUDL DB::
+
+            prefetch(
+                ["hourly_emissions_epacems_partitioned", "pudl"],
+                years=[2019, 2020],
+                states=["CO"],
+            )
+    """
+    targets = plan_prefetch(
+        sources, years=years, states=states, filters=filters, catalog=catalog
+    )
+    logger.info(f"Prefetching {len(targets)} objects into the local cache.")
+    return prefetch_targets(
+        targets,
+        max_workers=max_workers,
+        range_workers=range_workers,
+        progress=progress,
+        cancel=cancel,
+    )
+
+
+async def prefetch_async(sources: Iterable[str], **kwargs: Any) -> List[PrefetchResult]:
+    """Prefetch data without blocking the event loop.
+
+    Takes the same arguments as :func:`prefetch`. The downloads happen on a thread
+    pool. If the awaiting task is cancelled, the downloads are stopped too.
+    """
+    cancel = kwargs.pop("cancel", None) or threading.Event()
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(
+        None, lambda: prefetch(list(sources), cancel=cancel, **kwargs)
+    )
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        cancel.set()
+        raise
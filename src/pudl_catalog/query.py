@@ -0,0 +1,313 @@
+"""Query the EPA CEMS and PUDL data together with SQL, using an embedded DuckDB.
+
+Joining the hourly EPA CEMS data to tables like ``plants_entity_eia`` using pandas
+means loading both into memory first, which doesn't work for more than a few years of
+EPA CEMS data. A :class:`QueryEngine` instead exposes the catalog sources as tables in
+an in-process DuckDB database, which runs joins, aggregations and filters on the
+Parquet files in the local cache directly, using multiple threads, and spilling to
+disk when the data doesn't fit in memory:
+
+* The files of an EPA CEMS source are downloaded into the cache (concurrently, see
+  :mod:`pudl_catalog.prefetch`) and exposed as a view over the local Parquet files.
+  DuckDB pushes filters on any column down to the row groups of each file.
+* The tables of a SQLite database are exposed as views in a schema named after the
+  database, e.g. ``pudl.plants_entity_eia``. Each table is converted to Parquet in the
+  cache the first time it's used (see :mod:`pudl_catalog.materialize`), so it's read
+  column by column rather than row by row, and without any DuckDB extensions.
+
+This requires the optional :mod:`duckdb` package.
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import fsspec
+import pandas as pd
+
+import pudl_catalog
+from pudl_catalog.cache import cache_dir, cached_filename, is_cached_url
+from pudl_catalog.prefetch import (
+    DEFAULT_PREFETCH_WORKERS,
+    PrefetchTarget,
+    prefetch_targets,
+)
+from pudl_catalog.sessions import url_to_fs
+
+logger = logging.getLogger(__name__)
+
+
+def _import_duckdb() -> Any:
+    """Import the optional duckdb package, explaining how to install it if needed."""
+    try:
+        import duckdb
+    except ImportError as err:
+        raise ImportError(
+            "Querying the catalog with SQL requires the duckdb package. Install it "
+            "with: pip install catalystcoop.pudl_catalog[duckdb]"
+        ) from err
+    return duckdb
+
+
+def _identifier(name: str) -> str:
+    """Quote an SQL identifier."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _string_list(values: Iterable[str]) -> str:
+    """Format strings as a DuckDB list literal."""
+    return "[" + ", ".join("'" + v.replace("'", "''") + "'" for v in values) + "]"
+
+
+class QueryEngine:
+    """An embedded DuckDB database exposing catalog sources as SQL tables.
+
+    Args:
+        catalog: The Intake catalog containing the sources. Defaults to the PUDL
+            catalog.
+        threads: Number of threads DuckDB uses. Defaults to the number of cores.
+        memory_limit: Memory DuckDB may use before spilling to disk, e.g. ``"8GB"``.
+        temp_directory: Where DuckDB spills data that doesn't fit in memory.
+        max_workers: Maximum number of files to download at the same time.
+
+    Examples:
+        Total the 2020 CO2 emissions of each Colorado plant by operator::
+
+            with QueryEngine() as engine:
+                engine.register("hourly_emissions_epacems_partitioned",
+                                years=[2020], states=["CO"], view="epacems")
+                engine.register("pudl", tables=["plants_eia860"])
+                df = engine.to_pandas(
+                    "SELECT p.utility_id_eia, SUM(e.co2_mass_tons) AS co2_mass_tons "
+                    "FROM epacems e JOIN pudl.plants_eia860 p "
+                    "ON e.plant_id_eia = p.plant_id_eia "
+                    "AND p.report_date = '2020-01-01' GROUP BY 1"
+                )
+    """
+
+    def __init__(
+        self,
+        catalog: Any = None,
+        threads: Optional[int] = None,
+        memory_limit: Optional[str] = None,
+        temp_directory: Optional[str] = None,
+        max_workers: int = DEFAULT_PREFETCH_WORKERS,
+    ):
+        """Create an empty in-memory DuckDB database."""
+        duckdb = _import_duckdb()
+        self.catalog = pudl_catalog.pudl_cat if catalog is None else catalog
+        self.max_workers = max_workers
+        config: Dict[str, Any] = {}
+        if threads is not None:
+            config["threads"] = threads
+        if memory_limit is not None:
+            config["memory_limit"] = memory_limit
+        if temp_directory is not None:
+            config["temp_directory"] = str(temp_directory)
+        self.connection = duckdb.connect(":memory:", config=config)
+        self.views: Dict[str, List[str]] = {}
+
+    def __enter__(self) -> "QueryEngine":
+        """Use the engine as a context manager, closing it afterwards."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Close the engine."""
+        self.close()
+
+    def close(self) -> None:
+        """Close the DuckDB database."""
+        self.connection.close()
+
+    def _local_paths(
+        self, source: str, urlpaths: List[str], storage_options: Dict[str, Any]
+    ) -> List[str]:
+        """Download remote files into the cache, returning the local paths."""
+        targets = [
+            PrefetchTarget(source, urlpath, storage_options)
+            for urlpath in urlpaths
+            if is_cached_url(urlpath)
+        ]
+        for result in prefetch_targets(targets, max_workers=self.max_workers):
+            if result.error is not None:
+                raise result.error
+        paths = []
+        for urlpath in urlpaths:
+            if is_cached_url(urlpath):
+                path = cache_dir(storage_options) / cached_filename(
+                    urlpath, storage_options
+                )
+                paths.append(str(path))
+                continue
+            fs, path = url_to_fs(urlpath, storage_options)
+            if not isinstance(fs, fsspec.implementations.local.LocalFileSystem):
+                raise ValueError(
+                    f"Can't query {urlpath} because it isn't cached locally."
+                )
+            paths.append(path)
+        return paths
+
+    def register(
+        self,
+        source: str,
+        years: Optional[Iterable[int]] = None,
+        states: Optional[Iterable[str]] = None,
+        filters: Optional[List[Any]] = None,
+        tables: Optional[Iterable[str]] = None,
+        view: Optional[str] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        """Make a catalog source available to queries.
+
+        Args:
+            source: Name of a source in the catalog, e.g.
+                ``hourly_emissions_epacems_partitioned`` or ``pudl``.
+            years: Years of EPA CEMS data to include. Defaults to all years.
+            states: States of EPA CEMS data to include. Defaults to all states.
+            filters: Filters used to select the EPA CEMS files to include. Like the
+                years and states, they select whole files, so a view of the
+                monolithic EPA CEMS source includes every row. Filter the rows in the
+                query instead.
+            tables: Tables of a SQLite database to include. Defaults to all tables.
+            view: Name of the view of an EPA CEMS source. Defaults to the name of the
+                source. SQLite tables are always in a schema named after the source.
+            kwargs: Additional arguments for the source, e.g. ``partition_manifest``.
+
+        Returns:
+            The names of the views that were created.
+        """
+        from pudl_catalog.sources import (
+            EpaCemsRollupSource,
+            EpaCemsSource,
+            SQLiteCatalog,
+        )
+
+        if source not in self.catalog:
+            raise KeyError(f"No source named {source!r} in the catalog.")
+        plugin, args = self.catalog._entries[source]._create_open_args(kwargs)
+        if issubclass(plugin, EpaCemsSource):
+            if filters is not None:
+                args["filters"] = filters
+            src = plugin(years=years, states=states, **args)
+            src.name = source
+            if issubclass(plugin, EpaCemsRollupSource):
+                paths, _ = src._rollup_paths()
+            else:
+                paths = self._local_paths(
+                    source,
+                    src.selected_urlpaths(),
+                    args.get("storage_options") or {},
+                )
+            if not paths:
+                raise ValueError(f"No files of {source} match the selection.")
+            names = [self._create_view(view or source, paths)]
+        elif issubclass(plugin, SQLiteCatalog):
+            names = self._register_sqlite(
+                source, self.catalog[source](**kwargs), tables
+            )
+        else:
+            raise ValueError(f"Don't know how to query {source} ({plugin.__name__}).")
+        return names
+
+    def _create_view(
+        self, name: str, paths: Sequence[str], schema: Optional[str] = None
+    ) -> str:
+        """Create a view over some local Parquet files."""
+        qualified = _identifier(name)
+        if schema is not None:
+            qualified = f"{_identifier(schema)}.{qualified}"
+            name = f"{schema}.{name}"
+        self.connection.execute(
+            f"CREATE OR REPLACE VIEW {qualified} AS "
+            f"SELECT * FROM read_parquet({_string_list(paths)})"
+        )
+        self.views[name] = list(paths)
+        logger.debug(f"Created view {name} over {len(paths)} Parquet files.")
+        return name
+
+    def _register_sqlite(
+        self, schema: str, sqlite_cat: Any, tables: Optional[Iterable[str]]
+    ) -> List[str]:
+        """Create views of the tables of a SQLite database, converting them first."""
+        self.connection.execute(f"CREATE SCHEMA IF NOT EXISTS {_identifier(schema)}")
+        names = []
+        for table in list(sqlite_cat) if tables is None else list(tables):
+            src = sqlite_cat[table](materialize=True)
+            path = src._ensure_materialized()
+            if path is None:
+                # Tables that can't be converted are read into memory instead.
+                name = f"{schema}.{table}"
+                hidden = f"_{schema}_{table}"
+                self.connection.register(hidden, _read_arrow(src))
+                self.connection.execute(
+                    f"CREATE OR REPLACE VIEW {_identifier(schema)}.{_identifier(table)}"
+                    f" AS SELECT * FROM {_identifier(hidden)}"
+                )
+                self.views[name] = []
+                names.append(name)
+            else:
+                names.append(self._create_view(table, [str(path)], schema=schema))
+        return names
+
+    def sql(self, query: str, params: Optional[Sequence[Any]] = None) -> Any:
+        """Run a query, returning a :class:`duckdb.DuckDBPyRelation`.
+
+        Statements that don't return any rows, like ``CREATE VIEW``, return None.
+
+        Args:
+            query: The SQL query, which may contain ``?`` placeholders.
+            params: Values to substitute for the placeholders.
+        """
+        return self.connection.sql(query, params=params)
+
+    def to_arrow(self, query: str, params: Optional[Sequence[Any]] = None) -> Any:
+        """Run a query, returning the results as a :class:`pyarrow.Table`."""
+        result = self.sql(query, params)
+        # fetch_arrow_table() was renamed in DuckDB 1.4.
+        fetch = getattr(result, "to_arrow_table", None) or result.fetch_arrow_table
+        return fetch()
+
+    def to_pandas(
+        self, query: str, params: Optional[Sequence[Any]] = None
+    ) -> pd.DataFrame:
+        """Run a query, returning the results as a pandas dataframe."""
+        return self.sql(query, params).df()
+
+
+def _read_arrow(src: Any) -> Any:
+    """Read a SQLite table into a :class:`pyarrow.Table`."""
+    import pyarrow as pa
+
+    batches = list(src.read_batches())
+    if not batches:
+        return src._get_arrow_schema().empty_table()
+    return pa.Table.from_batches(batches)
+
+
+def query(
+    sql: str,
+    params: Optional[Sequence[Any]] = None,
+    sources: Optional[Dict[str, Dict[str, Any]]] = None,
+    catalog: Any = None,
+    output: str = "pandas",
+) -> Any:
+    """Run a single query against some catalog sources.
+
+    Args:
+        sql: The SQL query, which may contain ``?`` placeholders.
+        params: Values to substitute for the placeholders.
+        sources: Arguments of :meth:`QueryEngine.register` for each source to make
+            available, by source name.
+        catalog: The Intake catalog containing the sources. Defaults to the PUDL
+            catalog.
+        output: ``pandas`` or ``arrow``.
+
+    Returns:
+        The results, as a pandas dataframe or :class:`pyarrow.Table`.
+    """
+    if output not in ("pandas", "arrow"):
+        raise ValueError(f"Unknown output {output!r}. Use pandas or arrow.")
+    with QueryEngine(catalog=catalog) as engine:
+        for name, kwargs in (sources or {}).items():
+            engine.register(name, **kwargs)
+        if output == "arrow":
+            return engine.to_arrow(sql, params)
+        return engine.to_pandas(sql, params)
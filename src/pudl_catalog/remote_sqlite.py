@@ -0,0 +1,265 @@
+"""Read-only access to remote SQLite databases using byte range requests.
+
+SQLite reads its database file one page at a time, and answering a query that uses an
+index only touches a small number of pages. Rather than downloading a multi-gigabyte
+database before running a query that needs a few kilobytes of it, we register a custom
+SQLite virtual filesystem (VFS) that serves each read from a local cache of fixed-size
+blocks, fetching any missing blocks from the remote object with a range request.
+
+The Python standard library doesn't allow custom VFS implementations, so this requires
+the optional :mod:`apsw` package.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import fsspec
+
+import pudl_catalog
+from pudl_catalog import instrumentation
+from pudl_catalog.cache import (
+    PAGE_CACHE_DIR_NAME,
+    cache_dir,
+    cached_filename,
+    split_cached_url,
+)
+from pudl_catalog.footers import etag_from_info
+from pudl_catalog.sessions import request_slot, url_to_fs
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 256 * 2**10
+"""Size of the blocks fetched from the remote database. A multiple of the page size."""
+
+VFS_NAME = "pudl_range"
+"""Name under which the range request VFS is registered with SQLite."""
+
+
+def _import_apsw() -> Any:
+    """Import the optional apsw package, explaining how to install it if needed."""
+    try:
+        import apsw
+    except ImportError as err:
+        raise ImportError(
+            "Reading remote SQLite databases using range requests requires the apsw "
+            "package. Install it with: pip install catalystcoop.pudl_catalog[apsw]"
+        ) from err
+    return apsw
+
+
+class BlockCache:
+    """Serve reads of a remote object from a local cache of fixed-size blocks.
+
+    Args:
+        fs: The filesystem the object is stored in.
+        path: Path to the object within the filesystem.
+        directory: Local directory in which to store fetched blocks.
+        block_size: Size of the blocks to fetch from the remote object.
+        memory_blocks: Number of recently used blocks to keep in memory.
+    """
+
+    def __init__(
+        self,
+        fs: fsspec.AbstractFileSystem,
+        path: str,
+        directory: Path,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        memory_blocks: int = 64,
+    ):
+        """Initialize the cache, discarding any blocks from a different object."""
+        self.fs = fs
+        self.path = path
+        self.directory = Path(directory)
+        self.block_size = block_size
+        self.memory_blocks = memory_blocks
+        self.remote_requests = 0
+        self.bytes_fetched = 0
+        self._memory: "OrderedDict[int, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        info = fs.info(path)
+        instrumentation.record_request()
+        self.size = int(info["size"])
+        etag = etag_from_info(info)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        marker = self.directory / "etag"
+        if marker.exists() and marker.read_text() != f"{etag}-{block_size}":
+            logger.info(f"Remote object {path} has changed. Discarding cached pages.")
+            for block in self.directory.glob("*.block"):
+                block.unlink()
+        marker.write_text(f"{etag}-{block_size}")
+
+    def _block(self, index: int) -> bytes:
+        """Get a single block, from memory, the local disk, or the remote object."""
+        with self._lock:
+            if index in self._memory:
+                self._memory.move_to_end(index)
+                instrumentation.record_cache("pages", hit=True)
+                return self._memory[index]
+        local = self.directory / f"{index}.block"
+        try:
+            data = local.read_bytes()
+        except FileNotFoundError:
+            data = None
+        instrumentation.record_cache("pages", hit=data is not None)
+        if data is None:
+            start = index * self.block_size
+            end = min(start + self.block_size, self.size)
+            with request_slot(self.fs):
+                data = self.fs.cat_file(self.path, start=start, end=end)
+            instrumentation.record_request(len(data))
+            with self._lock:
+                self.remote_requests += 1
+                self.bytes_fetched += len(data)
+            tmp = local.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            # The blocks may have been evicted while the database was open.
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(data)
+            os.replace(tmp, local)
+        with self._lock:
+            self._memory[index] = data
+            if len(self._memory) > self.memory_blocks:
+                self._memory.popitem(last=False)
+        return data
+
+    def read(self, offset: int, amount: int) -> bytes:
+        """Read a range of bytes from the object."""
+        end = min(offset + amount, self.size)
+        if offset >= end:
+            return b""
+        first, last = offset // self.block_size, (end - 1) // self.block_size
+        data = b"".join(self._block(i) for i in range(first, last + 1))
+        start = offset - first * self.block_size
+        return data[start : start + end - offset]
+
+
+class _RangeRequestFile:
+    """A read-only SQLite database file backed by a :class:`BlockCache`."""
+
+    def __init__(self, blocks: BlockCache):
+        self.blocks = blocks
+
+    def xRead(self, amount: int, offset: int) -> bytes:  # noqa: N802
+        data = self.blocks.read(offset, amount)
+        # SQLite expects short reads to be zero-filled.
+        return data + b"\0" * (amount - len(data))
+
+    def xFileSize(self) -> int:  # noqa: N802
+        return self.blocks.size
+
+    def xClose(self) -> None:  # noqa: N802
+        pass
+
+    def xLock(self, level: int) -> None:  # noqa: N802
+        pass
+
+    def xUnlock(self, level: int) -> None:  # noqa: N802
+        pass
+
+    def xCheckReservedLock(self) -> bool:  # noqa: N802
+        return False
+
+    def xFileControl(self, op: int, ptr: int) -> bool:  # noqa: N802
+        return False
+
+    def xSectorSize(self) -> int:  # noqa: N802
+        return 4096
+
+    def xDeviceCharacteristics(self) -> int:  # noqa: N802
+        return 0
+
+    def xSync(self, flags: int) -> None:  # noqa: N802
+        pass
+
+    def xWrite(self, data: bytes, offset: int) -> None:  # noqa: N802
+        raise IOError("Remote SQLite databases are read-only.")
+
+    def xTruncate(self, size: int) -> None:  # noqa: N802
+        raise IOError("Remote SQLite databases are read-only.")
+
+
+_vfs = None
+_blocks: Dict[str, BlockCache] = {}
+_vfs_lock = threading.Lock()
+
+
+def _register_vfs() -> None:
+    """Register the range request VFS with SQLite, if it hasn't been already."""
+    global _vfs
+    apsw = _import_apsw()
+
+    class RangeRequestVFS(apsw.VFS):
+        """Open registered remote databases using their block caches."""
+
+        def __init__(self):
+            super().__init__(VFS_NAME, "")
+
+        def xOpen(self, name: Any, flags: Any) -> Any:  # noqa: N802
+            filename = name.filename() if isinstance(name, apsw.URIFilename) else name
+            if filename in _blocks:
+                return _RangeRequestFile(_blocks[filename])
+            return super().xOpen(name, flags)
+
+        def xAccess(self, pathname: str, flags: int) -> bool:  # noqa: N802
+            if pathname in _blocks:
+                return True
+            return super().xAccess(pathname, flags)
+
+        def xFullPathname(self, name: str) -> str:  # noqa: N802
+            if name in _blocks:
+                return name
+            return super().xFullPathname(name)
+
+    with _vfs_lock:
+        if _vfs is None:
+            _vfs = RangeRequestVFS()
+
+
+def connect(
+    urlpath: str,
+    storage_options: Optional[Dict[str, Any]] = None,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> Any:
+    """Open a read-only connection to a remote SQLite database.
+
+    Only the parts of the database needed to answer each query are fetched, and they
+    are kept in the local cache for later use.
+
+    Args:
+        urlpath: URL of the remote database, optionally prefixed with
+            ``simplecache::``.
+        storage_options: Storage options associated with the URL.
+        block_size: Size of the blocks to fetch from the remote database.
+
+    Returns:
+        An :class:`apsw.Connection` to the database.
+    """
+    apsw = _import_apsw()
+    _register_vfs()
+    url, options = split_cached_url(urlpath, storage_options)
+    key = "/" + cached_filename(url)
+    with _vfs_lock:
+        if key not in _blocks:
+            fs, path = url_to_fs(url, options)
+            _blocks[key] = BlockCache(
+                fs,
+                path,
+                directory=cache_dir(storage_options)
+                / PAGE_CACHE_DIR_NAME
+                / pudl_catalog.CATALOG_VERSION
+                / cached_filename(url),
+                block_size=block_size,
+            )
+    return apsw.Connection(
+        f"file:{key}?immutable=1",
+        flags=apsw.SQLITE_OPEN_READONLY | apsw.SQLITE_OPEN_URI,
+        vfs=VFS_NAME,
+    )
+
+
+def block_cache(urlpath: str) -> Optional[BlockCache]:
+    """Get the block cache serving reads of a remote database, if it has been opened."""
+    return _blocks.get("/" + cached_filename(urlpath))
@@ -0,0 +1,154 @@
+"""Disk-backed memoization of EPA CEMS reads as memory-mapped Arrow IPC files.
+
+Services built on the catalog tend to ask for the same data over and over, e.g. the
+same few years and states of the hourly EPA CEMS data with the same columns. Even when
+the files are in the local cache, each of those reads decompresses and filters the
+Parquet data again. With ``result_cache=True`` an EPA CEMS source instead stores the
+:class:`pyarrow.Table` it reads as an uncompressed Arrow IPC file in the local cache,
+keyed by everything that determines its contents (see :func:`result_key`). Later reads
+of the same selection, in any process on the same host, memory-map the file, which
+takes milliseconds and doesn't copy the data, so processes reading the same result
+share the operating system's page cache.
+
+The published data is immutable within a catalog version, so results never need to be
+invalidated. They're kept in a separate directory for each catalog version, which is
+removed along with the rest of the superseded data, and the least recently used results
+are evicted when they grow beyond a byte budget.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import pudl_catalog
+from pudl_catalog.cache import parse_size
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 10 * 2**30
+"""Default size of the result cache. See :class:`ResultCache`."""
+
+
+def result_key(fields: Dict[str, Any]) -> str:
+    """Hash the values that determine the result of a read into a cache key.
+
+    Args:
+        fields: The source name, URL, normalized filters, columns and any other
+            arguments that affect the result. Must be serializable as JSON, after
+            converting any values that aren't to strings.
+
+    Examples:
+        >>> result_key({"columns": ["year"]}) == result_key({"columns": ["year"]})
+        True
+    """
+    fields = {"catalog_version": pudl_catalog.CATALOG_VERSION, **fields}
+    encoded = json.dumps(fields, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ResultCache:
+    """A directory of Arrow IPC files holding the results of previous reads.
+
+    Args:
+        path: Directory to keep the results in. Each catalog version gets its own
+            subdirectory.
+        max_bytes: Total size of the results to keep. Defaults to the
+            ``PUDL_INTAKE_RESULT_CACHE_MAX_BYTES`` environment variable, or
+            :data:`DEFAULT_MAX_BYTES` if it isn't set. Results bigger than this are
+            never stored.
+        catalog_version: Version of the catalog the results belong to. Defaults to the
+            current version.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: Optional[Union[int, str]] = None,
+        catalog_version: Optional[str] = None,
+    ):
+        """Initialize the cache. The directory is created when a result is stored."""
+        self.path = Path(path) / (catalog_version or pudl_catalog.CATALOG_VERSION)
+        if max_bytes is None:
+            max_bytes = os.environ.get(
+                "PUDL_INTAKE_RESULT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES
+            )
+        self.max_bytes = parse_size(max_bytes)
+
+    def _path(self, key: str) -> Path:
+        """Where the result with a given key is stored."""
+        return self.path / f"{key}.arrow"
+
+    def get(self, key: str) -> Optional[Any]:
+        """Memory-map a stored result.
+
+        Returns:
+            The result as a :class:`pyarrow.Table` backed by the memory-mapped file,
+            or None if it isn't in the cache.
+        """
+        import pyarrow as pa
+
+        path = self._path(key)
+        try:
+            source = pa.memory_map(str(path), "r")
+        except FileNotFoundError:
+            return None
+        table = pa.ipc.open_file(source).read_all()
+        # The modification time records when the result was last used.
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return table
+
+    def put(self, key: str, table: Any) -> Optional[Path]:
+        """Store a result, evicting the least recently used results if needed.
+
+        Returns:
+            The path to the stored result, or None if it's too big to store.
+        """
+        import pyarrow as pa
+
+        if table.nbytes > self.max_bytes:
+            logger.debug(f"Not storing a {table.nbytes} byte result, which is too big.")
+            return None
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        options = pa.ipc.IpcWriteOptions(compression=None)
+        with pa.OSFile(str(tmp), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+        os.replace(tmp, path)
+        self.trim()
+        return path
+
+    def trim(self, max_bytes: Optional[Union[int, str]] = None) -> int:
+        """Remove the least recently used results until the rest fit in the budget.
+
+        Args:
+            max_bytes: Size to shrink the results to. Defaults to the budget the
+                cache was created with.
+
+        Returns:
+            The number of bytes removed.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else parse_size(max_bytes)
+        files = []
+        for path in self.path.glob("*.arrow"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in sorted(files):
+            if total - removed <= max_bytes:
+                break
+            logger.debug(f"Evicting cached result {path.name}")
+            path.unlink(missing_ok=True)
+            removed += size
+        return removed
@@ -0,0 +1,201 @@
+"""Daily, monthly and annual totals of the hourly EPA CEMS data.
+
+Most uses of the EPA CEMS data start by adding up the hourly emissions, fuel and
+generation of each plant or unit by day, month or year. Doing that from scratch means
+reading and grouping tens of millions of rows per year of data, every time. Instead,
+the totals for each file of hourly data are computed the first time they're needed, one
+row group at a time, and stored as a small Parquet file in the local cache. The
+published data is immutable within a catalog version, so later reads only need to read
+the stored totals.
+
+Periods are based on ``operating_datetime_utc``, so e.g. a day runs from midnight to
+midnight UTC, not local time.
+"""
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pudl_catalog
+from pudl_catalog.cache import ROLLUPS_DIR_NAME, cache_dir, cached_filename
+from pudl_catalog.materialize import write_parquet
+
+logger = logging.getLogger(__name__)
+
+FREQUENCIES = {"daily": "day", "monthly": "month", "annual": "year"}
+"""Supported rollup frequencies, and the corresponding Arrow temporal units."""
+
+LEVELS = {
+    "plant": ("plant_id_eia",),
+    "unit": ("plant_id_eia", "emissions_unit_id_epa"),
+}
+"""Supported levels of aggregation, and the columns identifying each group."""
+
+SUM_COLUMNS = (
+    "operating_time_hours",
+    "gross_load_mw",
+    "heat_content_mmbtu",
+    "steam_load_1000_lbs",
+    "so2_mass_lbs",
+    "nox_mass_lbs",
+    "co2_mass_tons",
+)
+"""Hourly columns which are totalled within each period, if they're present."""
+
+PERIOD_COLUMN = "period_start_utc"
+"""Column holding the start of the period each row of a rollup covers."""
+
+COUNT_COLUMN = "num_hours"
+"""Column holding the number of hourly records that went into each row of a rollup."""
+
+
+def check_rollup(freq: str, level: str) -> None:
+    """Make sure the frequency and level of a rollup are supported.
+
+    Raises:
+        ValueError: if either of them isn't.
+    """
+    if freq not in FREQUENCIES:
+        raise ValueError(
+            f"Unknown rollup frequency {freq!r}. Use one of {', '.join(FREQUENCIES)}."
+        )
+    if level not in LEVELS:
+        raise ValueError(
+            f"Unknown rollup level {level!r}. Use one of {', '.join(LEVELS)}."
+        )
+
+
+def rollup_path(
+    urlpath: str,
+    freq: str,
+    level: str,
+    storage_options: Optional[Dict[str, Any]] = None,
+    catalog_version: Optional[str] = None,
+) -> Path:
+    """Where the rollup of a file of hourly EPA CEMS data is stored in the cache.
+
+    Args:
+        urlpath: URL of the hourly data.
+        freq: One of :data:`FREQUENCIES`.
+        level: One of :data:`LEVELS`.
+        storage_options: Storage options associated with the URL, which may specify
+            the location of the cache.
+        catalog_version: Version of the catalog the data belongs to. Defaults to the
+            current version.
+    """
+    return (
+        cache_dir(storage_options)
+        / ROLLUPS_DIR_NAME
+        / (catalog_version or pudl_catalog.CATALOG_VERSION)
+        / f"{cached_filename(urlpath, storage_options)}-{freq}-{level}.parquet"
+    )
+
+
+def _keys(schema: Any, level: str) -> List[str]:
+    """The columns identifying each row of a rollup, given the hourly schema."""
+    keys = [col for col in ("year", "state") if col in schema.names]
+    return (
+        keys + [col for col in LEVELS[level] if col in schema.names] + [PERIOD_COLUMN]
+    )
+
+
+def _strip_sums(table: Any) -> Any:
+    """Remove the suffix Arrow adds to the names of summed columns."""
+    return table.rename_columns(
+        [
+            name[: -len("_sum")] if name.endswith("_sum") else name
+            for name in table.column_names
+        ]
+    )
+
+
+def _decoded(column: Any) -> Any:
+    """Decode a dictionary encoded column, which Arrow can group by but not sort by."""
+    import pyarrow as pa
+
+    if pa.types.is_dictionary(column.type):
+        return column.cast(column.type.value_type)
+    return column
+
+
+def rollup_table(table: Any, freq: str, level: str) -> Any:
+    """Total some hourly EPA CEMS data by period, and by plant or unit.
+
+    Args:
+        table: A :class:`pyarrow.Table` of hourly data, including
+            ``operating_datetime_utc``.
+        freq: One of :data:`FREQUENCIES`.
+        level: One of :data:`LEVELS`.
+
+    Returns:
+        A table with one row for each group, identified by ``year`` and ``state`` (if
+        present), the plant or unit, and :data:`PERIOD_COLUMN`. It has a float64
+        total of each of the :data:`SUM_COLUMNS` that were present, and the number of
+        hourly records in :data:`COUNT_COLUMN`.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    check_rollup(freq, level)
+    keys = _keys(table.schema, level)
+    sums = [col for col in SUM_COLUMNS if col in table.column_names]
+    period = pc.floor_temporal(
+        table.column("operating_datetime_utc"), unit=FREQUENCIES[freq]
+    )
+    grouped = pa.table(
+        {
+            **{
+                col: _decoded(table.column(col)) for col in keys if col != PERIOD_COLUMN
+            },
+            PERIOD_COLUMN: period,
+            **{col: table.column(col).cast(pa.float64()) for col in sums},
+        }
+    ).group_by(keys)
+    result = _strip_sums(
+        grouped.aggregate([(col, "sum") for col in sums] + [(PERIOD_COLUMN, "count")])
+    )
+    return result.rename_columns(
+        [
+            COUNT_COLUMN if name == f"{PERIOD_COLUMN}_count" else name
+            for name in result.column_names
+        ]
+    ).select(keys + sums + [COUNT_COLUMN])
+
+
+def _combine(tables: List[Any], keys: List[str]) -> Any:
+    """Add up partial rollups of the same data, e.g. from different row groups."""
+    import pyarrow as pa
+
+    table = pa.concat_tables(tables)
+    values = [col for col in table.column_names if col not in keys]
+    result = table.group_by(keys).aggregate([(col, "sum") for col in values])
+    return _strip_sums(result).select(table.column_names)
+
+
+def write_rollup(source: Any, path: Path, freq: str, level: str) -> Path:
+    """Compute the rollup of a Parquet file of hourly data, one row group at a time.
+
+    Only the columns needed for the rollup are read.
+
+    Args:
+        source: Path or file-like object to read the hourly data from.
+        path: Where to write the rollup.
+        freq: One of :data:`FREQUENCIES`.
+        level: One of :data:`LEVELS`.
+    """
+    import pyarrow.parquet as pq
+
+    check_rollup(freq, level)
+    pf = pq.ParquetFile(source)
+    schema = pf.schema_arrow
+    keys = _keys(schema, level)
+    columns = [
+        col
+        for col in ["operating_datetime_utc", *keys, *SUM_COLUMNS]
+        if col in schema.names
+    ]
+    partials = [
+        rollup_table(pf.read_row_group(i, columns=columns), freq, level)
+        for i in range(pf.num_row_groups)
+    ] or [rollup_table(schema.empty_table().select(columns), freq, level)]
+    table = _combine(partials, keys).sort_by([(key, "ascending") for key in keys])
+    return write_parquet(table.to_batches(), table.schema, path)
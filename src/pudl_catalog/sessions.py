@@ -0,0 +1,205 @@
+"""Shared filesystem sessions for all of the catalog's sources and helpers.
+
+:mod:`fsspec` caches filesystem instances, but the cache is keyed by thread as well as
+by protocol and storage options. Every thread that touches the remote data (the range
+downloads, the prefetching workers, the dask scheduler) therefore sets up its own
+``s3fs`` or ``gcsfs`` instance, with its own HTTP connection pool, credential lookup
+and TLS handshakes. The asynchronous filesystems run all of their I/O on a single
+event loop thread, so they're safe to share. Instead we keep one instance (a session)
+per protocol and set of storage options for the whole process, and every source and
+helper that talks to a filesystem gets it from here.
+
+Each session has a bounded connection pool and a limit on the number of requests made
+through it at the same time, so fanning out over hundreds of partition files reuses a
+fixed set of connections. Both can be set with :func:`configure`, or with the
+``PUDL_INTAKE_MAX_CONNECTIONS`` and ``PUDL_INTAKE_MAX_CONCURRENT_REQUESTS`` environment
+variables. The size of the connection pool can only be set for S3. Other filesystems
+use their default pool.
+
+Sessions aren't inherited by forked processes, e.g. the workers of a multiprocessing
+dask scheduler, because their connections and event loop threads don't survive the
+fork. Each process creates its own sessions instead.
+"""
+import logging
+import os
+import threading
+from contextlib import nullcontext
+from typing import Any, ContextManager, Dict, NamedTuple, Optional, Tuple
+
+import fsspec
+from fsspec.utils import tokenize
+
+from pudl_catalog.cache import cache_dir, is_cached_url, split_cached_url
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 64
+"""Default size of the connection pool of each session."""
+
+DEFAULT_MAX_CONCURRENT_REQUESTS = 64
+"""Default maximum number of requests made through each session at the same time."""
+
+
+class Session(NamedTuple):
+    """A filesystem shared by the whole process, and the limit on its requests."""
+
+    fs: fsspec.AbstractFileSystem
+    requests: threading.BoundedSemaphore
+
+
+_sessions: Dict[Tuple[str, str], Session] = {}
+_sessions_lock = threading.Lock()
+_limits: Dict[str, Optional[int]] = {
+    "max_connections": None,
+    "max_concurrent_requests": None,
+}
+
+
+def _limit(name: str, env_var: str, default: int) -> int:
+    """Get a configured limit, falling back to the environment and the default."""
+    value = _limits[name]
+    if value is None:
+        value = int(os.environ.get(env_var, default))
+    return value
+
+
+def max_connections() -> int:
+    """The size of the connection pool of each session."""
+    return _limit(
+        "max_connections", "PUDL_INTAKE_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS
+    )
+
+
+def max_concurrent_requests() -> int:
+    """The maximum number of requests made through each session at the same time."""
+    return _limit(
+        "max_concurrent_requests",
+        "PUDL_INTAKE_MAX_CONCURRENT_REQUESTS",
+        DEFAULT_MAX_CONCURRENT_REQUESTS,
+    )
+
+
+def configure(
+    max_connections: Optional[int] = None,
+    max_concurrent_requests: Optional[int] = None,
+) -> None:
+    """Set the limits of the shared sessions, replacing any existing sessions.
+
+    Args:
+        max_connections: Size of the connection pool of each session. Defaults to
+            ``PUDL_INTAKE_MAX_CONNECTIONS``, or :data:`DEFAULT_MAX_CONNECTIONS`.
+        max_concurrent_requests: Maximum number of requests made through each session
+            at the same time. Defaults to ``PUDL_INTAKE_MAX_CONCURRENT_REQUESTS``, or
+            :data:`DEFAULT_MAX_CONCURRENT_REQUESTS`.
+    """
+    with _sessions_lock:
+        _limits["max_connections"] = max_connections
+        _limits["max_concurrent_requests"] = max_concurrent_requests
+        _sessions.clear()
+
+
+def close_sessions() -> None:
+    """Forget the shared sessions, so that new ones are created when needed."""
+    with _sessions_lock:
+        _sessions.clear()
+
+
+def _forget_sessions_after_fork() -> None:
+    """Forget the parent process's sessions in a newly forked child process."""
+    global _sessions_lock
+    # The lock may have been held by another thread of the parent when it forked.
+    _sessions_lock = threading.Lock()
+    _sessions.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_sessions_after_fork)
+
+
+def session(protocol: str, storage_options: Optional[Dict[str, Any]] = None) -> Session:
+    """Get the shared session for a protocol and storage options, creating it if needed.
+
+    Args:
+        protocol: The :mod:`fsspec` protocol, e.g. ``s3`` or ``gs``.
+        storage_options: Options for the filesystem, like ``anon`` or
+            ``requester_pays``.
+    """
+    storage_options = dict(storage_options or {})
+    key = (protocol, tokenize(storage_options))
+    with _sessions_lock:
+        if key not in _sessions:
+            options = dict(storage_options)
+            if protocol in ("s3", "s3a"):
+                options["config_kwargs"] = {
+                    "max_pool_connections": max_connections(),
+                    **options.get("config_kwargs", {}),
+                }
+            logger.debug(f"Creating a shared {protocol} filesystem session.")
+            _sessions[key] = Session(
+                fs=fsspec.filesystem(protocol, skip_instance_cache=True, **options),
+                requests=threading.BoundedSemaphore(max_concurrent_requests()),
+            )
+        return _sessions[key]
+
+
+def url_to_fs(
+    url: str, storage_options: Optional[Dict[str, Any]] = None
+) -> Tuple[fsspec.AbstractFileSystem, str]:
+    """Like :func:`fsspec.core.url_to_fs`, but using the shared session.
+
+    Args:
+        url: A URL or local path, without any ``simplecache::`` prefix.
+        storage_options: Options for the filesystem the URL refers to.
+
+    Returns:
+        The shared filesystem, and the path of the URL within it.
+    """
+    protocol = url.split("://")[0] if "://" in url else "file"
+    fs = session(protocol, storage_options).fs
+    return fs, fs._strip_protocol(url)
+
+
+def request_slot(fs: fsspec.AbstractFileSystem) -> ContextManager[Any]:
+    """Wait until a request can be made through a filesystem, within its limit.
+
+    Filesystems that aren't shared sessions aren't limited.
+
+    Examples:
+        >>> fs, path = url_to_fs("/tmp")
+        >>> with request_slot(fs):
+        ...     fs.isdir(path)
+        True
+    """
+    with _sessions_lock:
+        for shared in _sessions.values():
+            if shared.fs is fs:
+                return shared.requests
+    return nullcontext()
+
+
+def chained_url_to_fs(
+    urlpath: str, storage_options: Optional[Dict[str, Any]] = None
+) -> Tuple[fsspec.AbstractFileSystem, str]:
+    """Get a filesystem for a URL that may be accessed via the cache.
+
+    ``simplecache::`` URLs get a ``simplecache`` filesystem wrapping the shared
+    session, which is useful for libraries like dask that open the files themselves.
+    Chaining the URL would make :mod:`fsspec` set up its own remote filesystem.
+
+    Args:
+        urlpath: URL of the data, optionally prefixed with ``simplecache::``.
+        storage_options: Storage options associated with the URL.
+
+    Returns:
+        The filesystem, and the path of the URL within it.
+    """
+    fs, path = url_to_fs(*split_cached_url(urlpath, storage_options))
+    if is_cached_url(urlpath):
+        options = {
+            **(storage_options or {}).get("simplecache", {}),
+            "cache_storage": str(cache_dir(storage_options)),
+        }
+        fs = fsspec.filesystem(
+            "simplecache", fs=fs, skip_instance_cache=True, **options
+        )
+    return fs, path
@@ -0,0 +1,1600 @@
+"""Intake data sources tailored to the datasets distributed by the PUDL catalog."""
+import itertools
+import logging
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import fsspec
+import intake_sqlite
+import pandas as pd
+from intake.catalog.local import LocalCatalogEntry
+from intake.source.base import DataSource, Schema
+from intake_parquet.source import ParquetSource
+from intake_sql.sql_cat import SQLCatalog
+
+import pudl_catalog
+from pudl_catalog import instrumentation, local_sqlite, remote_sqlite
+from pudl_catalog.cache import (
+    CACHE_PREFIX,
+    FOOTER_DB_NAME,
+    PLANT_INDEX_DB_NAME,
+    RESULTS_DIR_NAME,
+    CacheManager,
+    NotCachedError,
+    cache_dir,
+    is_cached_url,
+    is_offline,
+    local_copy,
+    parse_size,
+    register_cached_urls,
+    split_cached_url,
+)
+from pudl_catalog.download import _file_lock, _lock_for, ensure_cached
+from pudl_catalog.dtypes import (
+    arrow_to_pandas,
+    check_dtype_profile,
+    compact_arrow_table,
+    compact_dtypes,
+)
+from pudl_catalog.footers import FooterCache, row_group_may_match
+from pudl_catalog.helpers import (
+    DateTimeLike,
+    filters_to_expression,
+    filters_to_sql,
+    normalize_filters,
+    restrict_filters,
+    time_range_filter,
+    year_state_filter,
+)
+from pudl_catalog.manifest import (
+    load_partition_manifest,
+    partition_key,
+    partition_matches_filters,
+)
+from pudl_catalog.materialize import (
+    materialized_path,
+    sorted_path,
+    write_parquet,
+    write_sorted,
+)
+from pudl_catalog.plant_index import PlantIndex, uses_index
+from pudl_catalog.results import ResultCache, result_key
+from pudl_catalog.rollups import check_rollup, rollup_path, write_rollup
+from pudl_catalog.sessions import chained_url_to_fs, url_to_fs
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "EpaCemsRollupSource",
+    "EpaCemsSource",
+    "SQLiteCatalog",
+    "SQLiteTableSource",
+    "connect_sqlite",
+]
+
+# Arguments to dask.dataframe.read_parquet() that we know how to handle when building
+# the dask dataframe from cached Parquet footers.
+_FOOTER_CACHE_KWARGS = {"engine", "split_row_groups", "index", "columns", "filters"}
+
+
+def _filter_columns(filters: Optional[List[Any]]) -> List[str]:
+    """List the columns referred to by a set of DNF filters."""
+    if not filters:
+        return []
+    if isinstance(filters[0], tuple):
+        filters = [filters]
+    return list(dict.fromkeys(col for conj in filters for col, _, _ in conj))
+
+
+def _and_filters(
+    filters: Optional[List[Any]], other: Optional[List[Any]]
+) -> Optional[List[Any]]:
+    """Combine two sets of DNF filters, selecting rows which satisfy both."""
+    if not other:
+        return filters
+    if not filters:
+        return other
+    if isinstance(filters[0], tuple):
+        filters = [filters]
+    return [list(conj) + list(more) for conj in filters for more in other]
+
+
+def read_parquet_piece(
+    piece: Tuple[str, List[int]],
+    columns: List[str],
+    filters: Optional[List[Any]],
+    storage_options: Dict[str, Any],
+    dtype_profile: str = "default",
+    source: Optional[str] = None,
+) -> Any:
+    """Read some row groups from a Parquet file into a pandas dataframe.
+
+    Args:
+        piece: The URL of the Parquet file and the indices of the row groups to read.
+        columns: Names of the columns to return.
+        filters: Row-wise DNF filters to apply to the data.
+        storage_options: Storage options associated with the URL.
+        dtype_profile: The :mod:`pudl_catalog.dtypes` profile to use.
+        source: Name of the catalog source to attribute the I/O to. See
+            :mod:`pudl_catalog.instrumentation`.
+    """
+    return read_parquet_pieces(
+        [piece], columns, filters, storage_options, dtype_profile, source
+    )
+
+
+def read_parquet_pieces(
+    pieces: List[Tuple[str, List[int]]],
+    columns: List[str],
+    filters: Optional[List[Any]],
+    storage_options: Dict[str, Any],
+    dtype_profile: str = "default",
+    source: Optional[str] = None,
+) -> Any:
+    """Read row groups from several Parquet files into a single pandas dataframe.
+
+    Args:
+        pieces: The URL of each Parquet file and the indices of the row groups to
+            read from it.
+        columns: Names of the columns to return.
+        filters: Row-wise DNF filters to apply to the data.
+        storage_options: Storage options associated with the URLs.
+        dtype_profile: The :mod:`pudl_catalog.dtypes` profile to use.
+        source: Name of the catalog source to attribute the I/O to. See
+            :mod:`pudl_catalog.instrumentation`.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    read_columns = columns + [c for c in _filter_columns(filters) if c not in columns]
+    expression = filters_to_expression(filters)
+    tables = []
+    with instrumentation.source(source):
+        for urlpath, row_groups in pieces:
+            ensure_cached(urlpath, storage_options)
+            if is_cached_url(urlpath) or is_offline():
+                # Open the local copy directly, without setting up the remote
+                # filesystem the way simplecache does.
+                fs = fsspec.filesystem("file")
+                path = str(local_copy(urlpath, storage_options))
+            else:
+                fs, path = url_to_fs(*split_cached_url(urlpath, storage_options))
+            with instrumentation.phase("read"):
+                with fs.open(path, mode="rb") as f:
+                    table = pq.ParquetFile(f).read_row_groups(
+                        row_groups, columns=read_columns
+                    )
+                if expression is not None:
+                    table = table.filter(expression)
+                tables.append(table.select(columns))
+        with instrumentation.phase("read"):
+            table = tables[0] if len(tables) == 1 else pa.concat_tables(tables)
+            return arrow_to_pandas(table, dtype_profile)
+
+
+def coalesce_row_groups(
+    pieces: List[Tuple[str, List[int]]], sizes: List[List[int]], target: int
+) -> List[List[Tuple[str, List[int]]]]:
+    """Group consecutive row groups into partitions of about the same size.
+
+    Row groups are added to a partition until the next one would take it over the
+    target size, even if that means combining row groups from different files. A row
+    group larger than the target gets a partition of its own, since row groups are the
+    smallest unit that can be read.
+
+    Args:
+        pieces: Each file and the indices of the row groups to read from it.
+        sizes: Estimated size in bytes of each of the row groups in ``pieces``.
+        target: Target size of each partition, in bytes.
+
+    Returns:
+        The pieces to read into each partition.
+    """
+    partitions: List[List[Tuple[str, List[int]]]] = []
+    current: List[Tuple[str, List[int]]] = []
+    current_bytes = 0
+    for (urlpath, row_groups), rg_sizes in zip(pieces, sizes):
+        for row_group, nbytes in zip(row_groups, rg_sizes):
+            if current and current_bytes + nbytes > target:
+                partitions.append(current)
+                current, current_bytes = [], 0
+            if current and current[-1][0] == urlpath:
+                current[-1][1].append(row_group)
+            else:
+                current.append((urlpath, [row_group]))
+            current_bytes += nbytes
+    if current:
+        partitions.append(current)
+    return partitions
+
+
+class EpaCemsSource(ParquetSource):
+    """Read the EPA CEMS hourly emissions data from Apache Parquet.
+
+    Works with both the monolithic and the year-state partitioned versions of the
+    dataset. When the ``urlpath`` is a glob matching every file in the partitioned
+    dataset, the partition manifest for the current catalog version is used to resolve
+    the requested years and states directly to an explicit list of files. This avoids
+    listing the remote directory and opening the footer of every partition just to
+    discover that most of them don't contain any of the requested data.
+
+    Args:
+        urlpath: Path or URL of the Parquet file, or a ``*.parquet`` glob matching the
+            files in the partitioned dataset.
+        years: Years of data to read. By default all years are read.
+        states: 2-letter abbreviations of the states to read. By default all states
+            are read.
+        columns: Names of the columns to read. By default all columns are read.
+            Reading only the columns you need saves both time and memory.
+        start: Earliest ``operating_datetime_utc`` to read (inclusive). Naive
+            timestamps are assumed to be in UTC.
+        end: Latest ``operating_datetime_utc`` to read (exclusive). Naive timestamps
+            are assumed to be in UTC.
+        sort_by_time: If True, read from local copies of the selected files which are
+            sorted by time, with small row groups, so that only the row groups
+            overlapping ``start`` and ``end`` are read. The copies are made the first
+            time each file is read this way, which requires downloading all of it.
+            Requires ``footer_cache``, and so the same restrictions on
+            ``parquet_kwargs``.
+        dtype_profile: How the data should be represented in pandas. ``default``
+            uses the types the data is stored with. ``compact`` reads
+            low-cardinality columns like ``state`` as categoricals, downcasts
+            integer columns where that's lossless, and uses Arrow-backed strings,
+            which greatly reduces memory usage. See :mod:`pudl_catalog.dtypes`.
+        partition_manifest: Location of an alternative partition manifest to use in
+            place of the one distributed with the catalog. Set to False to disable the
+            use of the manifest entirely and list the remote files instead.
+        footer_cache: If True, the Parquet footers and row group statistics used to
+            plan the dask dataframe are stored in a database next to the locally
+            cached data, and are only read from the remote files once per catalog
+            version. Only applies when using the ``pyarrow`` engine.
+        plant_index: If True, and the filters select particular values of
+            ``plant_id_eia`` or ``emissions_unit_id_epa``, only the row groups which
+            contain those plants or units are read. Which plants and units appear in
+            each row group is recorded in a local index the first time each file is
+            queried this way. See :mod:`pudl_catalog.plant_index`. Requires
+            ``footer_cache``.
+        partition_size: Target in-memory size of each partition of the dask
+            dataframe, in bytes or as a string like ``"256MiB"``. Consecutive row
+            groups are combined, even across files, until adding another would exceed
+            it, based on their uncompressed size in the cached footers. If not set,
+            each row group becomes a partition if ``split_row_groups`` is set, and
+            otherwise each file does.
+        arrow_max_rows: If set, :meth:`read` reads the data directly with
+            :mod:`pyarrow.dataset` rather than with dask if the row groups that may
+            contain the selected data hold at most this many rows in total. The
+            values, dtypes and columns are the same either way, but the result has a
+            :class:`pandas.RangeIndex` rather than restarting at 0 in each dask
+            partition. The estimate comes from the cached footers, so this requires
+            ``footer_cache``. By default :meth:`read` always uses dask.
+        result_cache: If True, the table read by :meth:`to_arrow` is stored in the
+            local cache as an Arrow IPC file, and identical reads in any process
+            memory-map it instead of reading the data again. :meth:`read` then always
+            reads with :meth:`to_arrow`. See :mod:`pudl_catalog.results`.
+        metadata: Arbitrary metadata dictionary associated with the data source.
+        storage_options: Options passed to the :mod:`fsspec` filesystems.
+        parquet_kwargs: Additional arguments passed to
+            :func:`dask.dataframe.read_parquet`, like ``filters``.
+    """
+
+    name = "epacems_parquet"
+
+    def __init__(
+        self,
+        urlpath: str,
+        years: Optional[Iterable[int]] = None,
+        states: Optional[Iterable[str]] = None,
+        columns: Optional[List[str]] = None,
+        start: Optional[DateTimeLike] = None,
+        end: Optional[DateTimeLike] = None,
+        sort_by_time: bool = False,
+        dtype_profile: str = "default",
+        partition_manifest: Any = None,
+        footer_cache: bool = True,
+        plant_index: bool = True,
+        partition_size: Optional[Union[int, str]] = None,
+        arrow_max_rows: Optional[int] = None,
+        result_cache: bool = False,
+        metadata: Optional[Dict[str, Any]] = None,
+        storage_options: Optional[Dict[str, Any]] = None,
+        **parquet_kwargs: Any,
+    ):
+        """Initialize the data source."""
+        self._years = years
+        self._states = states
+        self._dtype_profile = check_dtype_profile(dtype_profile)
+        if columns is not None:
+            parquet_kwargs["columns"] = list(columns)
+        time_range = time_range_filter(start=start, end=end)
+        if time_range is not None:
+            parquet_kwargs["filters"] = _and_filters(
+                parquet_kwargs.get("filters"), time_range
+            )
+        self._sort_by_time = sort_by_time
+        self._partition_manifest = partition_manifest
+        self._footer_cache = footer_cache
+        self._plant_index = plant_index
+        self._partition_size = (
+            None if partition_size is None else parse_size(partition_size)
+        )
+        self._arrow_max_rows = arrow_max_rows
+        self._result_cache = result_cache
+        self._plan = None
+        super().__init__(
+            urlpath=urlpath,
+            metadata=metadata,
+            storage_options=storage_options,
+            **parquet_kwargs,
+        )
+        if sort_by_time and not self._use_footer_cache():
+            raise ValueError(
+                "sort_by_time requires footer_cache, the pyarrow engine, no index, and "
+                f"no parquet_kwargs other than {', '.join(sorted(_FOOTER_CACHE_KWARGS))}."
+            )
+
+    def _year_state_filters(self) -> Optional[List[Any]]:
+        """Combine any requested years and states with the user supplied filters.
+
+        This is only needed when the files to read can't be selected using the
+        partition manifest.
+        """
+        return _and_filters(
+            self._kwargs.get("filters"),
+            year_state_filter(years=self._years, states=self._states),
+        )
+
+    def _resolve_urlpaths(self) -> Tuple[List[str], Optional[List[Any]]]:
+        """Identify the files to read, using the partition manifest if possible.
+
+        Returns:
+            The URLs of the files to read, and the filters to apply when reading them.
+        """
+        manifest = None
+        if (
+            self._urlpath.endswith("/*.parquet")
+            and self._partition_manifest is not False
+        ):
+            manifest = load_partition_manifest(
+                pudl_catalog.CATALOG_VERSION, path=self._partition_manifest
+            )
+        if manifest is None:
+            return [self._urlpath], self._year_state_filters()
+        base_url = self._urlpath[: -len("/*.parquet")]
+        filenames = manifest.select(
+            years=self._years,
+            states=self._states,
+            filters=self._kwargs.get("filters"),
+        )
+        if not filenames:
+            raise ValueError(
+                "None of the EPA CEMS partitions in catalog version "
+                f"{manifest.catalog_version} match the requested years, states, "
+                "and filters."
+            )
+        logger.info(
+            f"Selected {len(filenames)} of {len(manifest)} EPA CEMS partitions "
+            "using the partition manifest."
+        )
+        urlpaths = [f"{base_url}/{filename}" for filename in filenames]
+        return urlpaths, self._kwargs.get("filters")
+
+    def _expand_urlpaths(self, urlpaths: List[str]) -> List[str]:
+        """Expand any globs in the URLs by listing the remote files.
+
+        In offline mode the cached objects are listed instead.
+        """
+        expanded = []
+        for urlpath in urlpaths:
+            if "*" not in urlpath:
+                expanded.append(urlpath)
+                continue
+            url, options = split_cached_url(urlpath, self._storage_options)
+            if is_offline() and is_cached_url(urlpath):
+                manager = CacheManager(path=cache_dir(self._storage_options))
+                paths = manager.cached_urls(url)
+                if not paths:
+                    raise NotCachedError(
+                        f"No cached objects match {url}, and the catalog is offline."
+                    )
+                expanded += [CACHE_PREFIX + p for p in paths]
+                continue
+            if is_offline():
+                # Remote files can't be listed offline, so this raises for them.
+                local_copy(url)
+            fs, path = url_to_fs(url, options)
+            prefix = CACHE_PREFIX if is_cached_url(urlpath) else ""
+            protocol = url.split("://")[0] + "://" if "://" in url else ""
+            with instrumentation.source(self.name), instrumentation.phase("listing"):
+                paths = sorted(fs.glob(path))
+                instrumentation.record_request()
+            expanded += [prefix + protocol + p for p in paths]
+        return expanded
+
+    def _selected(self) -> Tuple[List[str], Optional[List[Any]]]:
+        """Identify the files needed to read the selected data, and the filters."""
+        urlpaths, filters = self._resolve_urlpaths()
+        selected = [
+            urlpath
+            for urlpath in self._expand_urlpaths(urlpaths)
+            if (key := partition_key(urlpath)) is None
+            or partition_matches_filters(*key, filters)
+        ]
+        return selected, filters
+
+    def selected_urlpaths(self) -> List[str]:
+        """List the URLs of the files needed to read the selected data.
+
+        Uses the partition manifest if possible. Otherwise the remote files are listed,
+        and any year-state partitions that can't contain the selected data are left
+        out based on their names.
+        """
+        return self._selected()[0]
+
+    def _use_footer_cache(self) -> bool:
+        """Determine whether we can build the dask dataframe from cached footers."""
+        return (
+            self._footer_cache
+            and self._kwargs.get("engine", "pyarrow") == "pyarrow"
+            and self._kwargs.get("index") in (None, False)
+            and set(self._kwargs).issubset(_FOOTER_CACHE_KWARGS)
+        )
+
+    def _plan_row_groups(
+        self, urlpaths: List[str], filters: Optional[List[Any]]
+    ) -> Tuple[List[Tuple[str, List[int]]], int, Any]:
+        """Find the row groups that may contain selected rows, using cached footers.
+
+        Row groups are first selected using their statistics, and then, if the filters
+        constrain the plants or units, using the plant index.
+
+        Returns:
+            Each file containing any such row groups, with their indices; the total
+            number of rows in them, which is an upper bound on the number of rows
+            selected; and the Arrow schema of the files.
+        """
+        footer_cache = FooterCache(
+            cache_dir(self._storage_options) / FOOTER_DB_NAME,
+            catalog_version=pudl_catalog.CATALOG_VERSION,
+        )
+        plant_index = None
+        if self._plant_index and uses_index(filters):
+            plant_index = PlantIndex(
+                cache_dir(self._storage_options) / PLANT_INDEX_DB_NAME,
+                catalog_version=pudl_catalog.CATALOG_VERSION,
+            )
+        register_cached_urls(urlpaths, self._storage_options)
+        pieces = []
+        num_rows = 0
+        footer = None
+        for urlpath in urlpaths:
+            footer = footer_cache.get(urlpath, self._storage_options)
+            row_groups = [
+                i
+                for i, rg in enumerate(footer.row_groups)
+                if row_group_may_match(rg["statistics"], filters)
+            ]
+            if row_groups and plant_index is not None:
+                matches = plant_index.row_groups(
+                    urlpath, filters, self._storage_options
+                )
+                if matches is not None:
+                    row_groups = [i for i in row_groups if i in matches]
+            if row_groups:
+                pieces.append((urlpath, row_groups))
+                num_rows += sum(footer.row_groups[i]["num_rows"] for i in row_groups)
+        if footer is None:
+            raise ValueError(f"No Parquet files found at {self._urlpath}")
+        return pieces, num_rows, footer.metadata.schema.to_arrow_schema()
+
+    def _row_group_plan(
+        self,
+    ) -> Tuple[List[Tuple[str, List[int]]], int, Any, Optional[List[Any]]]:
+        """Plan which row groups to read, reusing the plan for later reads.
+
+        Returns:
+            The output of :meth:`_plan_row_groups` for the selected files, and the
+            filters to apply to the row groups.
+        """
+        if self._plan is None:
+            urlpaths, filters = self._selected()
+            with instrumentation.source(self.name):
+                if self._sort_by_time:
+                    urlpaths = [self._sorted_copy(urlpath) for urlpath in urlpaths]
+                self._plan = (*self._plan_row_groups(urlpaths, filters), filters)
+        return self._plan
+
+    def _sorted_copy(self, urlpath: str) -> str:
+        """Get the path of a local copy of a file sorted by time, making it if needed."""
+        path = sorted_path(urlpath, self._storage_options)
+        if path.exists():
+            return str(path)
+        logger.info(f"Sorting {urlpath} by time into {path}")
+        with self._open(urlpath) as f, instrumentation.phase("read"):
+            write_sorted(f, path)
+        return str(path)
+
+    @contextmanager
+    def _open(self, urlpath: str) -> Iterator[Any]:
+        """Open a whole file for reading, downloading it into the cache if needed.
+
+        Yields:
+            The path of the cached file, or a file-like object if it isn't cached.
+        """
+        if is_cached_url(urlpath) or is_offline():
+            ensure_cached(urlpath, self._storage_options)
+            yield str(local_copy(urlpath, self._storage_options))
+            return
+        fs, path = url_to_fs(*split_cached_url(urlpath, self._storage_options))
+        with fs.open(path, mode="rb") as f:
+            yield f
+
+    def _columns(self, schema: Any) -> List[str]:
+        """The names of the columns to read."""
+        return self._kwargs.get("columns") or [
+            name for name in schema.names if not name.startswith("__index_level_")
+        ]
+
+    def _row_group_bytes(
+        self, pieces: List[Tuple[str, List[int]]], columns: List[str], schema: Any
+    ) -> List[List[int]]:
+        """Estimate the in-memory size of some columns of each planned row group.
+
+        Fixed width columns take up their width times the number of rows. Other
+        columns are assumed to take up their uncompressed size in the file, plus an
+        offset for each row.
+        """
+        widths = {}
+        for field in schema:
+            try:
+                widths[field.name] = field.type.bit_width / 8
+            except ValueError:
+                widths[field.name] = None
+        footer_cache = FooterCache(
+            cache_dir(self._storage_options) / FOOTER_DB_NAME,
+            catalog_version=pudl_catalog.CATALOG_VERSION,
+        )
+        sizes = []
+        for urlpath, row_groups in pieces:
+            url, _ = split_cached_url(urlpath, self._storage_options)
+            footer = footer_cache.lookup(url) or footer_cache.get(
+                urlpath, self._storage_options
+            )
+            sizes.append(
+                [
+                    int(
+                        sum(
+                            rg.num_rows * width
+                            if (width := widths.get(col.path_in_schema))
+                            else col.total_uncompressed_size + 4 * rg.num_rows
+                            for col in map(rg.column, range(rg.num_columns))
+                            if col.path_in_schema in columns
+                        )
+                    )
+                    for rg in map(footer.metadata.row_group, row_groups)
+                ]
+            )
+        return sizes
+
+    def _footer_cache_dask(self):
+        """Build a dask dataframe using cached footers and row group statistics.
+
+        Row groups whose statistics show that they can't contain any of the rows
+        selected by the filters are skipped entirely. The remaining row groups are
+        combined into partitions of about ``partition_size`` if it's set. Otherwise
+        each row group becomes a partition if ``split_row_groups`` is set, and each
+        file does if not.
+        """
+        import dask.dataframe as dd
+        from dask.dataframe.utils import clear_known_categories
+
+        pieces, _, schema, filters = self._row_group_plan()
+        columns = self._columns(schema)
+        if self._partition_size is not None:
+            read_columns = columns + _filter_columns(filters)
+            partitions = coalesce_row_groups(
+                pieces,
+                self._row_group_bytes(pieces, read_columns, schema),
+                self._partition_size,
+            )
+        elif self._kwargs.get("split_row_groups", False):
+            partitions = [[(urlpath, [i])] for urlpath, rgs in pieces for i in rgs]
+        else:
+            partitions = [[piece] for piece in pieces]
+        meta = clear_known_categories(
+            arrow_to_pandas(schema.empty_table().select(columns), self._dtype_profile)
+        )
+        if not partitions:
+            logger.info("No row groups match the requested filters.")
+            return dd.from_pandas(meta, npartitions=1)
+        return dd.from_map(
+            read_parquet_pieces,
+            partitions,
+            columns=columns,
+            filters=filters,
+            storage_options=self._storage_options,
+            dtype_profile=self._dtype_profile,
+            source=self.name,
+            meta=meta,
+            label="read-epacems-parquet",
+            enforce_metadata=False,
+        )
+
+    def _to_dask(self):
+        """Create a lazy dask dataframe from the selected Parquet files."""
+        import dask.dataframe as dd
+        from dask.dataframe.utils import clear_known_categories
+
+        if self._use_footer_cache():
+            with instrumentation.source(self.name):
+                self._df = self._footer_cache_dask()
+        else:
+            urlpaths, filters = self._resolve_urlpaths()
+            register_cached_urls(
+                [url for url in urlpaths if "*" not in url], self._storage_options
+            )
+            kwargs = {**self._kwargs, "filters": filters}
+            if is_offline():
+                urlpaths = [
+                    str(local_copy(urlpath, self._storage_options))
+                    for urlpath in self._expand_urlpaths(urlpaths)
+                ]
+            else:
+                kwargs["filesystem"], _ = chained_url_to_fs(
+                    urlpaths[0], self._storage_options
+                )
+                urlpaths = [split_cached_url(urlpath)[0] for urlpath in urlpaths]
+            if self._partition_size is not None:
+                kwargs["split_row_groups"] = "adaptive"
+                kwargs["blocksize"] = self._partition_size
+            self._df = dd.read_parquet(
+                urlpaths if len(urlpaths) > 1 else urlpaths[0], **kwargs
+            )
+            if self._dtype_profile == "compact":
+                self._df = self._df.map_partitions(
+                    compact_dtypes,
+                    meta=clear_known_categories(compact_dtypes(self._df._meta)),
+                )
+        self._load_metadata()
+        return self._df
+
+    def _local_paths(self, urlpaths: List[str]) -> Tuple[Any, List[str]]:
+        """Find the files to scan, downloading them into the cache if needed.
+
+        Returns:
+            A :mod:`pyarrow.fs` filesystem and the paths of the files within it.
+        """
+        from pyarrow.fs import FSSpecHandler, LocalFileSystem, PyFileSystem
+
+        if is_offline() or all(is_cached_url(urlpath) for urlpath in urlpaths):
+            for urlpath in urlpaths:
+                ensure_cached(urlpath, self._storage_options)
+            return LocalFileSystem(), [
+                str(local_copy(urlpath, self._storage_options)) for urlpath in urlpaths
+            ]
+        fs, paths = None, []
+        for urlpath in urlpaths:
+            fs, path = url_to_fs(*split_cached_url(urlpath, self._storage_options))
+            paths.append(path)
+        if isinstance(fs, fsspec.implementations.local.LocalFileSystem):
+            return LocalFileSystem(), paths
+        return PyFileSystem(FSSpecHandler(fs)), paths
+
+    def _result_key_fields(self) -> Dict[str, Any]:
+        """Everything that determines the table read by :meth:`to_arrow`."""
+        return {
+            "source": self.name,
+            "urlpath": self._urlpath,
+            "years": (
+                None
+                if self._years is None
+                else sorted({int(year) for year in self._years})
+            ),
+            "states": (
+                None
+                if self._states is None
+                else sorted({state.upper() for state in self._states})
+            ),
+            "filters": normalize_filters(self._kwargs.get("filters")),
+            "columns": self._kwargs.get("columns"),
+            "dtype_profile": self._dtype_profile,
+            "sort_by_time": self._sort_by_time,
+            "partition_manifest": self._partition_manifest,
+        }
+
+    def to_arrow(self) -> Any:
+        """Read the selected data into a :class:`pyarrow.Table`, without using dask.
+
+        The selected files are scanned with :mod:`pyarrow.dataset` using multiple
+        threads, reading only the requested columns, and only the row groups whose
+        statistics show they may contain rows matching the filters. The ``compact``
+        dtype profile is applied to the Arrow types.
+
+        With ``result_cache`` the table is memory-mapped from the local cache if the
+        same selection has been read before, and stored there otherwise.
+        """
+        if not self._result_cache:
+            return self._read_arrow()
+        cache = ResultCache(cache_dir(self._storage_options) / RESULTS_DIR_NAME)
+        key = result_key(self._result_key_fields())
+        with instrumentation.source(self.name):
+            table = cache.get(key)
+            instrumentation.record_cache("results", hit=table is not None)
+        if table is None:
+            table = self._read_arrow()
+            cache.put(key, table)
+        return table
+
+    def _read_arrow(self) -> Any:
+        """Read the selected data into a :class:`pyarrow.Table`."""
+        import pyarrow.dataset as ds
+
+        if self._footer_cache:
+            pieces, _, schema, filters = self._row_group_plan()
+        else:
+            urlpaths, filters = self._selected()
+            pieces, schema = [(urlpath, None) for urlpath in urlpaths], None
+        with instrumentation.source(self.name):
+            filesystem, paths = self._local_paths([urlpath for urlpath, _ in pieces])
+            with instrumentation.phase("read"):
+                fmt = ds.ParquetFileFormat()
+                fragments = [
+                    fmt.make_fragment(path, filesystem=filesystem, row_groups=rgs)
+                    for path, (_, rgs) in zip(paths, pieces)
+                ]
+                if schema is None:
+                    if not fragments:
+                        raise ValueError(f"No Parquet files found at {self._urlpath}")
+                    schema = fragments[0].physical_schema
+                table = ds.FileSystemDataset(
+                    fragments, schema=schema, format=fmt, filesystem=filesystem
+                ).to_table(
+                    columns=self._columns(schema),
+                    filter=filters_to_expression(filters),
+                    use_threads=True,
+                )
+        if self._dtype_profile == "compact":
+            table = compact_arrow_table(table)
+        return table
+
+    def _use_arrow_read(self) -> bool:
+        """Decide whether to read directly with Arrow rather than with dask."""
+        if not self._arrow_max_rows or not self._use_footer_cache():
+            return False
+        _, num_rows, _, _ = self._row_group_plan()
+        logger.debug(f"Estimated {num_rows} selected rows in {self.name}.")
+        return num_rows <= self._arrow_max_rows
+
+    def read(self) -> pd.DataFrame:
+        """Read the selected data into a pandas dataframe.
+
+        The data is read using dask, unless ``arrow_max_rows`` is set and the
+        selection is small enough. Then it's read with :meth:`to_arrow`, which avoids
+        the overhead of building and scheduling a dask graph. With ``result_cache``
+        everything is read with :meth:`to_arrow`.
+        """
+        if self._result_cache or self._use_arrow_read():
+            return arrow_to_pandas(self.to_arrow(), self._dtype_profile)
+        return super().read()
+
+
+class EpaCemsRollupSource(EpaCemsSource):
+    """Read daily, monthly or annual totals of the EPA CEMS hourly data.
+
+    The totals for each file of hourly data are computed the first time they're read,
+    and kept in the local cache for the current catalog version. After that, reading
+    them takes milliseconds. See :mod:`pudl_catalog.rollups` for how the totals are
+    calculated.
+
+    Args:
+        urlpath: Path or URL of the hourly data, as for :class:`EpaCemsSource`.
+        freq: How often to total the data: ``daily``, ``monthly`` or ``annual``.
+        level: Whether to total the data by ``plant`` or by ``unit``.
+        years: Years of data to read. By default all years are read.
+        states: 2-letter abbreviations of the states to read. By default all states
+            are read.
+        columns: Names of the columns of the totals to read. By default all columns
+            are read.
+        dtype_profile: How the data should be represented in pandas. See
+            :class:`EpaCemsSource`.
+        partition_manifest: Location of an alternative partition manifest. See
+            :class:`EpaCemsSource`.
+        result_cache: If True, memoize the selected totals. See
+            :class:`EpaCemsSource`.
+        metadata: Arbitrary metadata dictionary associated with the data source.
+        storage_options: Options passed to the :mod:`fsspec` filesystems.
+        parquet_kwargs: Additional arguments, like ``filters``, which may refer to any
+            of the columns of the totals.
+    """
+
+    name = "epacems_rollup"
+
+    def __init__(
+        self,
+        urlpath: str,
+        freq: str = "monthly",
+        level: str = "unit",
+        years: Optional[Iterable[int]] = None,
+        states: Optional[Iterable[str]] = None,
+        columns: Optional[List[str]] = None,
+        dtype_profile: str = "default",
+        partition_manifest: Any = None,
+        result_cache: bool = False,
+        metadata: Optional[Dict[str, Any]] = None,
+        storage_options: Optional[Dict[str, Any]] = None,
+        **parquet_kwargs: Any,
+    ):
+        """Initialize the data source."""
+        check_rollup(freq, level)
+        self._freq = freq
+        self._level = level
+        super().__init__(
+            urlpath=urlpath,
+            years=years,
+            states=states,
+            columns=columns,
+            dtype_profile=dtype_profile,
+            partition_manifest=partition_manifest,
+            result_cache=result_cache,
+            metadata=metadata,
+            storage_options=storage_options,
+            **parquet_kwargs,
+        )
+
+    def _result_key_fields(self) -> Dict[str, Any]:
+        """Everything that determines the table read by :meth:`to_arrow`."""
+        return {
+            **super()._result_key_fields(),
+            "freq": self._freq,
+            "level": self._level,
+        }
+
+    def _rollup_paths(self) -> Tuple[List[str], Optional[List[Any]]]:
+        """Find the totals of the selected files, computing any that are missing.
+
+        Returns:
+            The local paths of the totals, and the filters to apply to them.
+        """
+        urlpaths, filters = self._selected()
+        if not urlpaths:
+            raise ValueError(
+                f"None of the EPA CEMS files at {self._urlpath} match the requested "
+                "years, states, and filters."
+            )
+        paths = []
+        with instrumentation.source(self.name):
+            for urlpath in urlpaths:
+                path = rollup_path(
+                    urlpath, self._freq, self._level, self._storage_options
+                )
+                if not path.exists():
+                    logger.info(f"Computing {self._freq} totals of {urlpath}")
+                    with self._open(urlpath) as f, instrumentation.phase("read"):
+                        write_rollup(f, path, self._freq, self._level)
+                paths.append(str(path))
+        return paths, filters
+
+    def _read_arrow(self) -> Any:
+        """Read the selected totals into a :class:`pyarrow.Table`."""
+        import pyarrow.dataset as ds
+
+        paths, filters = self._rollup_paths()
+        with instrumentation.phase("read", source=self.name):
+            table = ds.dataset(paths, format="parquet").to_table(
+                columns=self._kwargs.get("columns"),
+                filter=filters_to_expression(filters),
+            )
+        if self._dtype_profile == "compact":
+            table = compact_arrow_table(table)
+        return table
+
+    def _to_dask(self):
+        """Create a lazy dask dataframe with one partition per file of totals."""
+        import dask.dataframe as dd
+        import pyarrow.parquet as pq
+        from dask.dataframe.utils import clear_known_categories
+
+        paths, filters = self._rollup_paths()
+        files = [pq.ParquetFile(path) for path in paths]
+        schema = files[0].schema_arrow
+        columns = self._columns(schema)
+        self._df = dd.from_map(
+            read_parquet_piece,
+            [(path, list(range(f.num_row_groups))) for path, f in zip(paths, files)],
+            columns=columns,
+            filters=filters,
+            storage_options={},
+            dtype_profile=self._dtype_profile,
+            source=self.name,
+            meta=clear_known_categories(
+                arrow_to_pandas(
+                    schema.empty_table().select(columns), self._dtype_profile
+                )
+            ),
+            label="read-epacems-rollup",
+            enforce_metadata=False,
+        )
+        self._load_metadata()
+        return self._df
+
+    def read(self) -> pd.DataFrame:
+        """Read the selected totals into a pandas dataframe."""
+        return arrow_to_pandas(self.to_arrow(), self._dtype_profile)
+
+
+def connect_sqlite(
+    urlpath: str,
+    storage_options: Optional[Dict[str, Any]] = None,
+    range_requests: bool = False,
+) -> Any:
+    """Open a read-only DB-API connection to a local or remote SQLite database.
+
+    Args:
+        urlpath: A local path or :mod:`fsspec` readable URL pointing to a SQLite
+            database.
+        storage_options: Storage options associated with the URL.
+        range_requests: If True, read a remote database in place using range
+            requests. Otherwise it's downloaded into the local cache first.
+    """
+    if range_requests and "://" in urlpath:
+        return remote_sqlite.connect(urlpath, storage_options or {})
+    local_path, _ = _local_sqlite_path(urlpath, storage_options)
+    return sqlite3.connect(f"file:{local_path}?mode=ro", uri=True)
+
+
+def _local_sqlite_path(
+    urlpath: str, storage_options: Optional[Dict[str, Any]] = None
+) -> Tuple[Path, bool]:
+    """Find the local copy of a SQLite database, caching it first if it's remote.
+
+    Returns:
+        The path to the local copy, and whether it's immutable, which is the case for
+        remote databases cached for the current catalog version.
+    """
+    if "://" not in urlpath:
+        return Path(urlpath), False
+    storage_options = storage_options or {}
+    ensure_cached(CACHE_PREFIX + urlpath, storage_options)
+    return local_copy(CACHE_PREFIX + urlpath, storage_options), True
+
+
+def _database_name(urlpath: str) -> str:
+    """Name a SQLite database after its file, e.g. ``pudl`` for ``pudl.sqlite``."""
+    return PurePosixPath(urlpath).stem
+
+
+def _sqlite_arrow_type(declared_type: str) -> Any:
+    """Choose an Arrow type for a column based on its declared SQLite type.
+
+    Follows the SQLite column affinity rules, with additional handling for the
+    boolean, date and datetime types used by PUDL. Returns None if the type should be
+    inferred from the values instead.
+    """
+    import pyarrow as pa
+
+    declared_type = (declared_type or "").upper()
+    if "BOOL" in declared_type:
+        return pa.bool_()
+    if "DATETIME" in declared_type or "TIMESTAMP" in declared_type:
+        return pa.timestamp("us")
+    if "DATE" in declared_type:
+        return pa.date32()
+    if "INT" in declared_type:
+        return pa.int64()
+    if any(t in declared_type for t in ("CHAR", "CLOB", "TEXT")):
+        return pa.string()
+    if "BLOB" in declared_type:
+        return pa.binary()
+    if any(t in declared_type for t in ("REAL", "FLOA", "DOUB")):
+        return pa.float64()
+    return None
+
+
+def _sqlite_arrow_array(values: Tuple[Any, ...], arrow_type: Any) -> Any:
+    """Convert the values of a column to an Arrow array of the declared type.
+
+    SQLite doesn't enforce column types, so if the values don't conform to the
+    declared type, the type is inferred from the values instead.
+    """
+    import pyarrow as pa
+
+    try:
+        if arrow_type is None:
+            return pa.array(values)
+        if pa.types.is_temporal(arrow_type):
+            return pa.array(values, type=pa.string()).cast(arrow_type)
+        if pa.types.is_boolean(arrow_type):
+            # SQLite stores booleans as the integers 0 and 1.
+            if all(v in (0, 1, None) for v in values):
+                values = [None if v is None else bool(v) for v in values]
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        logger.debug(f"Values don't conform to {arrow_type}. Inferring type instead.")
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if v is None else str(v) for v in values])
+
+
+class SQLiteTableSource(DataSource):
+    """Read a table from a local or remote SQLite database.
+
+    Besides reading the whole table at once, the table can be streamed in chunks of a
+    bounded number of rows, either as Arrow record batches or pandas dataframes, or
+    read as a dask dataframe partitioned by ranges of ``rowid``. Only the requested
+    ``columns`` and the rows matching the ``filters`` and ``where`` clause are read
+    from the database.
+
+    Local and cached databases are read using a pool of tuned, read-only connections
+    shared by all of the sources reading the same database, which can be used by
+    several threads at once (see :mod:`pudl_catalog.local_sqlite`). Columns listed in
+    ``index_columns`` are indexed in a sidecar database in the local cache the first
+    time the ``filters`` refer to them, and the index is used to find the matching
+    rows.
+
+    With ``materialize=True`` the whole table is converted into a Parquet file in the
+    local cache the first time it's read (see :mod:`pudl_catalog.materialize`), and
+    subsequent reads of any subset of the table are served from that file.
+
+    Args:
+        urlpath: A local path or :mod:`fsspec` readable URL pointing to a SQLite
+            database.
+        table: Name of the table to read.
+        columns: Names of the columns to read. By default all columns are read.
+        filters: Filters in disjunctive normal form selecting the rows to read, like
+            those used by :func:`dask.dataframe.read_parquet`.
+        where: An SQL expression used to select the rows to read, e.g.
+            ``"report_year >= ?"``. It may contain ``?`` placeholders. Prefer
+            ``filters``, which can also be applied to materialized tables.
+        params: Values to substitute for the placeholders in ``where``.
+        chunksize: Number of rows in each chunk yielded by :meth:`read_chunked` and
+            :meth:`read_batches`.
+        rows_per_partition: Number of ``rowid`` values spanned by each partition of
+            the dask dataframe returned by :meth:`to_dask`.
+        materialize: If True, convert the table to Parquet in the local cache and
+            read it from there.
+        storage_options: Storage options associated with the URL.
+        range_requests: If True, read a remote database in place using range
+            requests, fetching only the pages that are needed. Otherwise the whole
+            database is downloaded into the local cache first. Ignored in offline
+            mode.
+        index_columns: Columns to index locally if they're in the table and the
+            filters refer to them, e.g. ``plant_id_eia`` and ``report_date``. Ignored
+            when reading a remote database using range requests.
+        metadata: Arbitrary metadata dictionary associated with the data source.
+    """
+
+    name = "pudl_sqlite_table"
+    container = "dataframe"
+    partition_access = True
+
+    def __init__(
+        self,
+        urlpath: str,
+        table: str,
+        columns: Optional[List[str]] = None,
+        filters: Optional[List[Any]] = None,
+        where: Optional[str] = None,
+        params: Optional[Iterable[Any]] = None,
+        chunksize: int = 100_000,
+        rows_per_partition: int = 1_000_000,
+        materialize: bool = False,
+        storage_options: Optional[Dict[str, Any]] = None,
+        range_requests: bool = False,
+        index_columns: Optional[List[str]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+    ):
+        """Initialize the data source."""
+        self._urlpath = urlpath
+        self._table = table
+        self._columns = list(columns) if columns else None
+        self._filters = filters
+        self._where = where
+        self._params = tuple(params or ())
+        self._chunksize = chunksize
+        self._rows_per_partition = rows_per_partition
+        self._materialize = materialize
+        self._storage_options = storage_options or {}
+        self._range_requests = range_requests and "://" in urlpath and not is_offline()
+        self._index_columns = list(index_columns or [])
+        self._index_path = None
+        self._table_schema = None
+        self._partitions = None
+        self._arrow_schema = None
+        self._parquet_path = None
+        self._source_name = f"{_database_name(urlpath)}.{table}"
+        super().__init__(metadata=metadata)
+
+    @contextmanager
+    def _connect(self) -> Iterator[Any]:
+        """Borrow a read-only DB-API connection to the database.
+
+        Connections to local databases come from a shared pool, and have the sidecar
+        indexes attached if they're being used.
+        """
+        if self._range_requests:
+            with instrumentation.source(self._source_name):
+                conn = connect_sqlite(
+                    self._urlpath, self._storage_options, range_requests=True
+                )
+            try:
+                yield conn
+            finally:
+                conn.close()
+            return
+        with instrumentation.source(self._source_name):
+            path, immutable = _local_sqlite_path(self._urlpath, self._storage_options)
+        with local_sqlite.pool_for(path, immutable).connection() as conn:
+            if self._index_path is None:
+                yield conn
+            else:
+                with local_sqlite.attached_indexes(conn, self._index_path):
+                    yield conn
+
+    def _query(self, sql: str, params: Tuple[Any, ...] = ()) -> List[Tuple[Any, ...]]:
+        """Run a query, returning all of the resulting rows."""
+        with self._connect() as conn, instrumentation.source(self._source_name):
+            return list(conn.cursor().execute(sql, params))
+
+    def _get_table_schema(self) -> Any:
+        """Build the Arrow schema of the whole table from the declared column types."""
+        import pyarrow as pa
+
+        if self._table_schema is None:
+            declared = self._query(f'PRAGMA table_info("{self._table}")')
+            if not declared:
+                raise ValueError(f"Table {self._table} not found in {self._urlpath}")
+            self._table_schema = pa.schema(
+                [
+                    pa.field(row[1], _sqlite_arrow_type(row[2]) or pa.null())
+                    for row in declared
+                ]
+            )
+        return self._table_schema
+
+    def _get_arrow_schema(self) -> Any:
+        """The Arrow schema of the selected columns."""
+        schema = self._get_table_schema()
+        if self._columns is None:
+            return schema
+        missing = [col for col in self._columns if col not in schema.names]
+        if missing:
+            raise ValueError(f"Columns {missing} not found in table {self._table}")
+        return _select_fields(schema, self._columns)
+
+    def _rowid_bounds(self) -> Optional[Tuple[int, int]]:
+        """Find the range of rowid values in the table, if it has them."""
+        rows = self._query(
+            "SELECT type, sql FROM sqlite_master WHERE name = ?", (self._table,)
+        )
+        if not rows or rows[0][0] != "table" or "WITHOUT ROWID" in rows[0][1].upper():
+            return None
+        lo, hi = self._query(f'SELECT MIN(rowid), MAX(rowid) FROM "{self._table}"')[0]
+        return None if lo is None else (lo, hi)
+
+    def _use_parquet(self) -> bool:
+        """Whether reads should be served from the table converted to Parquet."""
+        if not self._materialize:
+            return False
+        if self._where is not None:
+            logger.debug(
+                f"Reading {self._table} from SQLite because the where clause can't be "
+                "applied to the Parquet file. Use filters instead."
+            )
+            return False
+        if self._parquet_path is None:
+            self._parquet_path = self._ensure_materialized() or False
+        return bool(self._parquet_path)
+
+    def _ensure_materialized(self) -> Optional[Path]:
+        """Convert the table to Parquet in the cache, if it hasn't been already.
+
+        Returns:
+            The path to the Parquet file, or None if the table couldn't be converted.
+        """
+        import pyarrow as pa
+
+        path = materialized_path(self._urlpath, self._table, self._storage_options)
+        with _lock_for(path), _file_lock(path.with_suffix(".lock")):
+            if path.exists() and not self._materialized_is_stale(path):
+                return path
+            logger.info(f"Converting {self._table} to Parquet in {path.parent}")
+            try:
+                write_parquet(
+                    self._iter_batches(full_table=True),
+                    self._get_table_schema(),
+                    path,
+                )
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as err:
+                logger.warning(
+                    f"Couldn't convert {self._table} to Parquet, reading it from "
+                    f"SQLite instead: {err}"
+                )
+                return None
+        return path
+
+    def _materialized_is_stale(self, path: Path) -> bool:
+        """Check whether a local database has been modified since it was converted.
+
+        Remote databases are immutable within a catalog version.
+        """
+        if "://" in self._urlpath:
+            return False
+        return Path(self._urlpath).stat().st_mtime > path.stat().st_mtime
+
+    def _parquet_dataset(self) -> Any:
+        """The Parquet file the table was converted into, as a pyarrow dataset."""
+        import pyarrow.dataset as ds
+
+        return ds.dataset(self._parquet_path, format="parquet")
+
+    def _get_schema(self) -> Schema:
+        if self._use_parquet():
+            dataset = self._parquet_dataset()
+            schema = dataset.schema
+            if self._columns is not None:
+                schema = _select_fields(schema, self._columns)
+            num_row_groups = next(dataset.get_fragments()).metadata.num_row_groups
+            self._partitions = list(range(num_row_groups))
+        else:
+            schema = self._get_arrow_schema()
+            if self._partitions is None:
+                bounds = self._rowid_bounds()
+                if bounds is None:
+                    self._partitions = [None]
+                else:
+                    lo, hi = bounds
+                    self._partitions = [
+                        (start, min(start + self._rows_per_partition, hi + 1))
+                        for start in range(lo, hi + 1, self._rows_per_partition)
+                    ]
+        self._arrow_schema = schema
+        return Schema(
+            datashape=None,
+            dtype={field.name: str(field.type) for field in schema},
+            shape=(None, len(schema)),
+            npartitions=len(self._partitions),
+            extra_metadata={},
+        )
+
+    def _select(
+        self,
+        rowid_range: Optional[Tuple[int, int]] = None,
+        full_table: bool = False,
+    ) -> Tuple[str, Tuple[Any, ...]]:
+        """Build the query that reads the selected columns and rows."""
+        schema = self._get_table_schema() if full_table else self._get_arrow_schema()
+        columns = ", ".join(f'"{field.name}"' for field in schema)
+        sql = f'SELECT {columns} FROM "{self._table}"'
+        if full_table:
+            return sql, ()
+        conditions, params = [], self._params
+        if self._where:
+            conditions.append(f"({self._where})")
+        filter_sql, filter_params = filters_to_sql(self._filters)
+        if filter_sql:
+            index_sql, index_params = self._index_condition()
+            if index_sql:
+                conditions.append(index_sql)
+                params = params + tuple(index_params)
+            conditions.append(filter_sql)
+            params = params + tuple(filter_params)
+        if rowid_range is not None:
+            conditions.append("rowid >= ? AND rowid < ?")
+            params = params + tuple(rowid_range)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        return sql, params
+
+    def _index_condition(self) -> Tuple[Optional[str], List[Any]]:
+        """Select the rowids matching the filters using the sidecar indexes.
+
+        The indexes are built the first time they're needed.
+
+        Returns:
+            An SQL condition on ``rowid`` and the values of its placeholders, or None
+            if the filters don't refer to any of the indexed columns.
+        """
+        columns = [
+            col for col in self._index_columns if col in self._get_table_schema().names
+        ]
+        if self._range_requests or not columns:
+            return None, []
+        restricted = restrict_filters(self._filters, columns)
+        if restricted is None:
+            return None, []
+        if self._index_path is None:
+            if self._rowid_bounds() is None:
+                return None, []
+            with instrumentation.source(self._source_name):
+                path, _ = _local_sqlite_path(self._urlpath, self._storage_options)
+                index_path = local_sqlite.index_path(
+                    self._urlpath, self._storage_options
+                )
+                local_sqlite.ensure_indexes(path, index_path, self._table, columns)
+            self._index_path = index_path
+        sql, params = filters_to_sql(restricted)
+        return (
+            f"rowid IN (SELECT {local_sqlite.ROWID_COLUMN} "
+            f'FROM {local_sqlite.INDEX_SCHEMA}."{self._table}" WHERE {sql})',
+            params,
+        )
+
+    def _iter_batches(
+        self,
+        chunksize: Optional[int] = None,
+        rowid_range: Optional[Tuple[int, int]] = None,
+        full_table: bool = False,
+    ) -> Iterator[Any]:
+        """Stream rows from the database as Arrow record batches.
+
+        Args:
+            chunksize: Maximum number of rows in each batch.
+            rowid_range: Only read rows with rowids in this half-open interval.
+            full_table: Read every row and column of the table, ignoring the
+                selected columns and filters.
+        """
+        import pyarrow as pa
+
+        schema = self._get_table_schema() if full_table else self._get_arrow_schema()
+        sql, params = self._select(rowid_range, full_table=full_table)
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            with instrumentation.source(self._source_name):
+                cursor = cursor.execute(sql, params)
+            try:
+                while True:
+                    # The source is set around each batch rather than the whole loop,
+                    # since the context can change while the generator is suspended.
+                    with instrumentation.source(
+                        self._source_name
+                    ), instrumentation.phase("read"):
+                        rows = list(
+                            itertools.islice(cursor, chunksize or self._chunksize)
+                        )
+                        if not rows:
+                            break
+                        values = list(zip(*rows))
+                        batch = pa.RecordBatch.from_arrays(
+                            [
+                                _sqlite_arrow_array(
+                                    col_values,
+                                    None
+                                    if pa.types.is_null(field.type)
+                                    else field.type,
+                                )
+                                for col_values, field in zip(values, schema)
+                            ],
+                            names=schema.names,
+                        )
+                    yield batch
+            finally:
+                # Finish the query before the connection goes back to the pool.
+                cursor.close()
+
+    def read_batches(self, chunksize: Optional[int] = None) -> Iterator[Any]:
+        """Stream the selected rows as :class:`pyarrow.RecordBatch` objects.
+
+        Args:
+            chunksize: Maximum number of rows in each batch. Defaults to the
+                ``chunksize`` the source was created with.
+        """
+        if self._use_parquet():
+            return self._parquet_dataset().to_batches(
+                columns=self._columns,
+                filter=filters_to_expression(self._filters),
+                batch_size=chunksize or self._chunksize,
+            )
+        return self._iter_batches(chunksize)
+
+    def read_chunked(self, chunksize: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """Stream the selected rows as pandas dataframes of bounded length.
+
+        Args:
+            chunksize: Maximum number of rows in each dataframe. Defaults to the
+                ``chunksize`` the source was created with.
+        """
+        for batch in self.read_batches(chunksize):
+            if batch.num_rows:
+                yield batch.to_pandas(date_as_object=False)
+
+    def _get_partition(self, i: int) -> pd.DataFrame:
+        self._load_metadata()
+        if not self._partitions and i == 0:
+            # An empty table converted to Parquet has no row groups to read.
+            return _batches_to_pandas([], self._arrow_schema)
+        return self._read_partition(self._partitions[i])
+
+    def _read_partition(self, partition: Any) -> pd.DataFrame:
+        """Read the selected rows within a row group or range of rowid values."""
+        if self._use_parquet():
+            fragment = next(self._parquet_dataset().get_fragments())
+            with instrumentation.phase("read", source=self._source_name):
+                return (
+                    fragment.subset(row_group_ids=[partition])
+                    .to_table(
+                        columns=self._columns,
+                        filter=filters_to_expression(self._filters),
+                    )
+                    .to_pandas(date_as_object=False)
+                )
+        return _batches_to_pandas(
+            list(self._iter_batches(rowid_range=partition)), self._get_arrow_schema()
+        )
+
+    def read(self) -> pd.DataFrame:
+        """Read all of the selected rows into a pandas dataframe."""
+        if self._use_parquet():
+            with instrumentation.phase("read", source=self._source_name):
+                return (
+                    self._parquet_dataset()
+                    .to_table(
+                        columns=self._columns,
+                        filter=filters_to_expression(self._filters),
+                    )
+                    .to_pandas(
+                        date_as_object=False, split_blocks=True, self_destruct=True
+                    )
+                )
+        return _batches_to_pandas(list(self._iter_batches()), self._get_arrow_schema())
+
+    def to_dask(self) -> Any:
+        """Read the selected rows into a dask dataframe.
+
+        Partitioned by row group if the table has been converted to Parquet, and by
+        ranges of rowid otherwise. An empty table becomes a single empty partition.
+        """
+        import dask.dataframe as dd
+
+        self._load_metadata()
+        meta = _batches_to_pandas([], self._arrow_schema)
+        if not self._partitions:
+            return dd.from_pandas(meta, npartitions=1)
+        return dd.from_map(
+            self._read_partition,
+            self._partitions,
+            meta=meta,
+            label=f"read-sqlite-{self._table}",
+            enforce_metadata=False,
+        )
+
+
+def _select_fields(schema: Any, columns: List[str]) -> Any:
+    """Select a subset of the fields of an Arrow schema, in the given order."""
+    import pyarrow as pa
+
+    return pa.schema([schema.field(col) for col in columns])
+
+
+def _batches_to_pandas(batches: List[Any], schema: Any) -> pd.DataFrame:
+    """Combine Arrow record batches into a single pandas dataframe."""
+    import pyarrow as pa
+
+    if not batches:
+        return schema.empty_table().to_pandas(date_as_object=False)
+    if any(batch.schema != batches[0].schema for batch in batches):
+        # Batches whose values didn't conform to the declared types.
+        return pd.concat(
+            [batch.to_pandas(date_as_object=False) for batch in batches],
+            ignore_index=True,
+        )
+    table = pa.Table.from_batches(batches)
+    del batches[:]
+    return table.to_pandas(date_as_object=False, split_blocks=True, self_destruct=True)
+
+
+class SQLiteCatalog(intake_sqlite.SQLiteCatalog):
+    """A catalog of the tables in a local or remote SQLite database.
+
+    Remote databases are cached locally in their entirety before they're opened, using
+    parallel, resumable range requests (see :mod:`pudl_catalog.download`), and are
+    registered with the :class:`pudl_catalog.cache.CacheManager` so they can be
+    evicted when they're no longer needed. Each table is read using a
+    :class:`SQLiteTableSource`, which can stream large tables in bounded memory.
+
+    Args:
+        urlpath: A local path or :mod:`fsspec` readable URL pointing to a SQLite
+            database.
+        views: Whether to include views as well as tables in the catalog.
+        sql_kwargs: Additional arguments passed to each
+            :class:`SQLiteTableSource`, like ``chunksize``.
+        storage_options: Storage options associated with the URL.
+        range_requests: If True, don't download a remote database. Instead, open it in
+            place and fetch only the pages needed to answer each query using range
+            requests. Requires the optional :mod:`apsw` package. Ignored in offline
+            mode.
+        materialize: If True, convert each table to Parquet in the local cache the
+            first time it's read, and serve subsequent reads from there.
+        kwargs: Additional arguments passed to :class:`intake.catalog.Catalog`.
+    """
+
+    name = "pudl_sqlite_cat"
+
+    def __init__(
+        self,
+        urlpath: str,
+        views: bool = False,
+        sql_kwargs: Optional[Dict[str, Any]] = None,
+        storage_options: Optional[Dict[str, Any]] = None,
+        range_requests: bool = False,
+        materialize: bool = False,
+        **kwargs: Any,
+    ):
+        """Initialize the catalog, registering the remote database with the cache."""
+        storage_options = storage_options or {}
+        self.urlpath = urlpath
+        self.storage_options = storage_options
+        self.range_requests = range_requests and "://" in urlpath and not is_offline()
+        self.materialize = materialize
+        if self.range_requests:
+            # Skip the intake_sqlite initialization, which downloads the database.
+            SQLCatalog.__init__(
+                self, uri=urlpath, views=views, sql_kwargs=sql_kwargs, **kwargs
+            )
+            return
+        if "://" in urlpath:
+            register_cached_urls([CACHE_PREFIX + urlpath], storage_options)
+            with instrumentation.source(_database_name(urlpath)):
+                path, _ = _local_sqlite_path(urlpath, storage_options)
+            # intake_sqlite would look up the cached copy through the remote
+            # filesystem, which needs network access.
+            SQLCatalog.__init__(
+                self,
+                uri=f"sqlite:///{path}",
+                views=views,
+                sql_kwargs=sql_kwargs,
+                **kwargs,
+            )
+            return
+        super().__init__(
+            urlpath=urlpath,
+            views=views,
+            sql_kwargs=sql_kwargs,
+            storage_options=storage_options,
+            **kwargs,
+        )
+
+    def _load(self) -> None:
+        """Create a data source for each table in the database."""
+        types = ("table", "view") if self.views else ("table",)
+        sql = (
+            "SELECT name FROM sqlite_master "
+            f"WHERE type IN ({', '.join('?' * len(types))}) "
+            "AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )
+        with instrumentation.source(_database_name(self.urlpath)):
+            if self.range_requests:
+                conn = connect_sqlite(
+                    self.urlpath, self.storage_options, range_requests=True
+                )
+                try:
+                    with instrumentation.phase("listing"):
+                        names = [row[0] for row in conn.cursor().execute(sql, types)]
+                finally:
+                    conn.close()
+            else:
+                path, immutable = _local_sqlite_path(self.urlpath, self.storage_options)
+                with local_sqlite.pool_for(path, immutable).connection() as conn:
+                    with instrumentation.phase("listing"):
+                        names = [row[0] for row in conn.execute(sql, types)]
+        self._entries = {
+            name: LocalCatalogEntry(
+                name=name,
+                description=f"SQLite table {name} from {self.urlpath}",
+                driver="pudl_catalog.sources.SQLiteTableSource",
+                direct_access=True,
+                args={
+                    **self.sql_kwargs,
+                    "urlpath": self.urlpath,
+                    "table": name,
+                    "storage_options": self.storage_options,
+                    "range_requests": self.range_requests,
+                    "materialize": self.materialize
+                    or self.sql_kwargs.get("materialize", False),
+                },
+                getenv=False,
+                getshell=False,
+            )
+            for name in names
+        }
@@ -12,6 +12,7 @@ import pandas as pd
 import pytest
 from dask.dataframe.utils import check_matching_columns, is_dataframe_like
 
+from benchmarks import synthetic
 from pudl_catalog import BASE_URLS
 from pudl_catalog.helpers import year_state_filter
 
@@ -64,6 +65,7 @@ def expected_df() -> pd.DataFrame:
     )
     is_dataframe_like(expected_df)
     assert expected_df.shape == (70_272, 16)
+    assert list(expected_df.columns) == synthetic.EPACEMS_SCHEMA.names
     return expected_df
 
 
@@ -143,3 +145,8 @@ def test_intake_catalog(
     logger.debug(f"    elapsed time: {elapsed_time:.2f}s")
     is_dataframe_like(actual_dd)
     check_matching_columns(actual_dd, expected_df)
+
+
+def test_synthetic_schema_matches_published() -> None:
+    """The synthetic benchmark data must have the schema of the published data."""
+    assert synthetic.published_epacems_schema() == synthetic.EPACEMS_SCHEMA
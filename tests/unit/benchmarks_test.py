@@ -0,0 +1,77 @@
+"""Unit tests for the offline benchmark suite."""
+import logging
+from pathlib import Path
+
+import intake
+import pyarrow.parquet as pq
+import pytest
+
+import pudl_catalog
+from benchmarks import run, synthetic
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture(scope="module")
+def synthetic_dir(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """A small synthetic copy of the catalog data."""
+    path = tmp_path_factory.mktemp("synthetic")
+    synthetic.write_fixture(path, years=[2020], states=["CO", "ID"], n_plants=1)
+    return path
+
+
+@pytest.fixture
+def catalog(synthetic_dir: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """The PUDL catalog, pointed at the synthetic data."""
+    monkeypatch.setenv("PUDL_INTAKE_PATH", f"file://{synthetic_dir}")
+    monkeypatch.setenv("PUDL_INTAKE_CACHE", str(tmp_path / "cache"))
+    return intake.open_catalog(pudl_catalog._pudl_catalog_path)
+
+
+def test_synthetic_epacems_schema(synthetic_dir: Path):
+    """Both EPA CEMS layouts have the published schema and one row group per state."""
+    monolithic = pq.ParquetFile(synthetic_dir / "hourly_emissions_epacems.parquet")
+    assert monolithic.schema_arrow.remove_metadata() == synthetic.EPACEMS_SCHEMA
+    assert monolithic.num_row_groups == 2
+    partition = pq.ParquetFile(
+        synthetic_dir / "hourly_emissions_epacems" / "epacems-2020-ID.parquet"
+    )
+    assert partition.schema_arrow.remove_metadata() == synthetic.EPACEMS_SCHEMA
+    assert partition.metadata.num_rows == 2 * 8784
+    schema = synthetic.published_epacems_schema(
+        str(synthetic_dir / "hourly_emissions_epacems.parquet")
+    )
+    assert schema == synthetic.EPACEMS_SCHEMA
+    assert schema.field("operating_datetime_utc").type.unit == "ms"
+
+
+def test_catalog_reads_synthetic_data(catalog, synthetic_dir: Path):
+    """The catalog can read every synthetic dataset through the local cache."""
+    df = (
+        catalog.hourly_emissions_epacems_partitioned(
+            years=[2020],
+            states=["ID"],
+            partition_manifest=synthetic_dir / synthetic.MANIFEST_NAME,
+        )
+        .to_dask()
+        .compute()
+    )
+    assert set(df.state) == {"ID"}
+    df = catalog.hourly_emissions_epacems(states=["CO"]).read()
+    assert set(df.state) == {"CO"}
+    assert len(catalog.pudl.fuel_receipts_costs_eia923.read()) == 2_000 * 60
+    assert "f1_steam" in catalog.ferc1
+
+
+def test_compare_flags_regressions():
+    """Only measurements that grew by more than the tolerance are regressions."""
+    baseline = {"a": {"seconds": 1.0, "peak_rss_bytes": 100}, "b": {"seconds": 1.0}}
+    results = {
+        "a": {"seconds": 1.2, "peak_rss_bytes": 200},
+        "b": {"seconds": 2.0},
+        "new": {"seconds": 5.0},
+    }
+    regressions = run.compare(results, baseline, tolerance=0.25)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("a peak_rss_bytes")
+    assert regressions[1].startswith("b seconds")
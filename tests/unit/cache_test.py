@@ -0,0 +1,140 @@
+"""Unit tests for the pudl_catalog.cache module."""
+import logging
+import os
+import sqlite3
+from pathlib import Path
+
+import fsspec
+import pytest
+
+from pudl_catalog.cache import (
+    PAGE_CACHE_DIR_NAME,
+    PARTIAL_DIR_NAME,
+    CacheManager,
+    cached_filename,
+    parse_size,
+    split_cached_url,
+)
+from pudl_catalog.cli import main
+
+logger = logging.getLogger(__name__)
+
+
+def cache_file(source: Path, cache: Path) -> str:
+    """Copy a local file into the cache via simplecache, returning its URL."""
+    url = f"simplecache::file://{source}"
+    with fsspec.open(url, simplecache={"cache_storage": str(cache)}) as f:
+        f.read()
+    return url
+
+
+@pytest.fixture
+def sources(tmp_path: Path) -> list:
+    """Some files of different sizes to be cached."""
+    paths = []
+    for i, size in enumerate([100, 200, 300]):
+        path = tmp_path / f"data-{i}.bin"
+        path.write_bytes(b"x" * size)
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize(
+    "size,expected",
+    [(10, 10), ("10", 10), ("1.5KB", 1500), ("2 GiB", 2 * 1024**3), ("3g", 3e9)],
+)
+def test_parse_size(size, expected):
+    """Human readable sizes are converted to bytes."""
+    assert parse_size(size) == expected
+
+
+def test_split_cached_url():
+    """Storage options nested under the remote protocol are separated out."""
+    url, options = split_cached_url(
+        "simplecache::s3://bucket/key.parquet",
+        {"requester_pays": True, "s3": {"anon": True}, "simplecache": {}},
+    )
+    assert url == "s3://bucket/key.parquet"
+    assert options == {"anon": True}
+
+
+def test_cached_filename(sources: list, pudl_intake_cache: Path):
+    """We know what name simplecache will give each cached file."""
+    url = cache_file(sources[0], pudl_intake_cache)
+    assert (pudl_intake_cache / cached_filename(url)).is_file()
+
+
+def test_trim_lru_and_pinning(sources: list, pudl_intake_cache: Path):
+    """The least recently used objects are evicted first, unless pinned."""
+    manager = CacheManager(max_bytes=450, catalog_version="vtest")
+    urls = [cache_file(source, pudl_intake_cache) for source in sources]
+    manager.register(urls)
+    for age, url in zip([300, 200, 100], urls):
+        path = pudl_intake_cache / cached_filename(url)
+        os.utime(path, (path.stat().st_atime - age, path.stat().st_mtime - age))
+    with sqlite3.connect(pudl_intake_cache / "pudl_catalog_cache.sqlite") as conn:
+        conn.execute("UPDATE objects SET last_access = 0")
+    manager.pin(urls[0])
+    # An unrelated file in the cache directory is never evicted:
+    (pudl_intake_cache / "not-ours").write_bytes(b"y" * 10)
+
+    removed = manager.trim()
+    assert [entry.url for entry in removed] == [split_cached_url(urls[1])[0]]
+    assert manager.total_bytes() == 410
+    assert {entry.pinned for entry in manager.entries() if entry.url} == {True, False}
+
+
+def test_purge_superseded(sources: list, pudl_intake_cache: Path):
+    """Objects from other catalog versions are removed, unless pinned."""
+    old = CacheManager(catalog_version="vold")
+    urls = [cache_file(source, pudl_intake_cache) for source in sources]
+    old.register(urls[:2])
+    old.pin(urls[1])
+    CacheManager(catalog_version="vnew").register(urls[2:])
+
+    removed = CacheManager(catalog_version="vnew").trim()
+    assert [entry.url for entry in removed] == [split_cached_url(urls[0])[0]]
+    assert len(CacheManager(catalog_version="vnew").entries()) == 2
+
+
+def test_scratch_files(pudl_intake_cache: Path):
+    """Database blocks and partial downloads are purged and count against the budget."""
+    for version in ["vold", "vtest"]:
+        pages = pudl_intake_cache / PAGE_CACHE_DIR_NAME / version / "db"
+        pages.mkdir(parents=True)
+        (pages / "0.block").write_bytes(b"x" * 100)
+        partial = pudl_intake_cache / PARTIAL_DIR_NAME / version
+        partial.mkdir(parents=True)
+        for name in ["done", "busy"]:
+            (partial / f"{name}.part").write_bytes(b"x" * 100)
+            (partial / f"{name}.json").write_text("{}")
+    # Partial downloads from before these directories were split up by version:
+    (pudl_intake_cache / PARTIAL_DIR_NAME / "legacy.part").write_bytes(b"x")
+
+    manager = CacheManager(catalog_version="vtest")
+    manager.purge_superseded()
+    assert {path.name for path in (pudl_intake_cache / PARTIAL_DIR_NAME).iterdir()} == {
+        "vtest"
+    }
+    assert not (pudl_intake_cache / PAGE_CACHE_DIR_NAME / "vold").exists()
+    scratch = manager.scratch_entries()
+    assert sum(entry.size for entry in scratch) == 304
+
+    # A download that's still in progress isn't discarded:
+    fcntl = pytest.importorskip("fcntl")
+    with open(pudl_intake_cache / PARTIAL_DIR_NAME / "vtest" / "busy.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        removed = manager.trim(max_bytes=10)
+    assert {entry.path.name for entry in removed} == {"db", "done.part"}
+    assert [entry.path.name for entry in manager.scratch_entries()] == ["busy.part"]
+
+
+def test_cli(sources: list, pudl_intake_cache: Path, capsys: pytest.CaptureFixture):
+    """The cache can be inspected and trimmed from the command line."""
+    urls = [cache_file(source, pudl_intake_cache) for source in sources]
+    CacheManager().register(urls)
+    assert main(["cache", "info"]) == 0
+    assert "3 files, 600.0 B" in capsys.readouterr().out
+    assert main(["cache", "pin", urls[2]]) == 0
+    assert main(["cache", "--max-bytes", "300", "trim"]) == 0
+    assert "Removed 2 files, 300.0 B" in capsys.readouterr().out
@@ -0,0 +1,85 @@
+"""Fixtures shared by the unit tests."""
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from pudl_catalog import instrumentation
+
+TEST_YEARS = [2019, 2020]
+TEST_STATES = ["CO", "ID"]
+
+
+def make_epacems_df(year: int, state: str, n_plants: int = 2) -> pd.DataFrame:
+    """Construct a small dataframe resembling one partition of the EPA CEMS data."""
+    hours = pd.date_range(f"{year}-01-01", periods=48, freq="H", tz="UTC")
+    df = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "plant_id_eia": plant_id,
+                    "unitid": f"{plant_id}A",
+                    "operating_datetime_utc": hours,
+                    "gross_load_mw": 1.0,
+                }
+            )
+            for plant_id in range(n_plants)
+        ],
+        ignore_index=True,
+    )
+    df["year"] = year
+    df["state"] = state
+    return df
+
+
+@pytest.fixture(autouse=True)
+def pudl_intake_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Keep anything the tests cache locally out of the user's real cache."""
+    path = tmp_path / "intake_cache"
+    monkeypatch.setenv("PUDL_INTAKE_CACHE", str(path))
+    return path
+
+
+@pytest.fixture(autouse=True)
+def reset_stats():
+    """Start each test with no statistics."""
+    instrumentation.reset()
+    yield
+    instrumentation.reset()
+
+
+@pytest.fixture
+def pudl_db(tmp_path: Path) -> Path:
+    """A SQLite database with an unindexed table of generators."""
+    db_path = tmp_path / "pudl.sqlite"
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute(
+            "CREATE TABLE generators_eia860 (plant_id_eia INTEGER, "
+            "generator_id TEXT, report_date DATE, capacity_mw REAL, notes)"
+        )
+        conn.executemany(
+            "INSERT INTO generators_eia860 VALUES (?, ?, ?, ?, ?)",
+            (
+                (i % 20, f"GEN{i}", f"{2010 + i % 10}-01-01", i * 1.5, None)
+                for i in range(500)
+            ),
+        )
+    conn.close()
+    return db_path
+
+
+@pytest.fixture
+def epacems_partitioned(tmp_path: Path) -> Path:
+    """Write a small year-state partitioned EPA CEMS dataset to a temporary directory."""
+    path = tmp_path / "hourly_emissions_epacems"
+    path.mkdir()
+    for year in TEST_YEARS:
+        for state in TEST_STATES:
+            make_epacems_df(year, state).to_parquet(
+                path / f"epacems-{year}-{state}.parquet",
+                index=False,
+                coerce_timestamps="ms",
+            )
+    return path
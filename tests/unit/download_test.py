@@ -0,0 +1,202 @@
+"""Unit tests for the pudl_catalog.download module."""
+import logging
+import os
+from pathlib import Path
+
+import fsspec
+import pytest
+from fsspec.implementations.local import LocalFileSystem
+
+from pudl_catalog import instrumentation
+from pudl_catalog.cache import QUARANTINE_DIR_NAME, CacheManager, cached_filename
+from pudl_catalog.cli import main
+from pudl_catalog.download import PARTIAL_DIR_NAME, RangeDownloader, download_to_cache
+from pudl_catalog.integrity import file_checksum
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+
+
+class FlakyFileSystem(LocalFileSystem):
+    """A stand-in for a remote object store that records and can fail range requests."""
+
+    cachable = False
+
+    def __init__(self, fail_at=(), **kwargs):
+        """Fail any request for a range starting at one of the offsets in fail_at."""
+        super().__init__(**kwargs)
+        self.fail_at = set(fail_at)
+        self.requests = []
+
+    def cat_file(self, path, start=None, end=None, **kwargs):
+        """Read a byte range, failing if requested."""
+        self.requests.append(start)
+        if start in self.fail_at:
+            raise ConnectionError(f"Simulated failure at offset {start}")
+        return super().cat_file(path, start=start, end=end, **kwargs)
+
+
+@pytest.fixture
+def remote_object(tmp_path: Path) -> Path:
+    """A file that's not evenly divisible into chunks."""
+    path = tmp_path / "remote" / "pudl.sqlite"
+    path.parent.mkdir()
+    path.write_bytes(os.urandom(5 * CHUNK_SIZE + 123))
+    return path
+
+
+def test_download_to_cache(remote_object: Path, pudl_intake_cache: Path):
+    """Downloaded objects end up where simplecache will find them."""
+    url = f"simplecache::file://{remote_object}"
+    progress = []
+    dest = download_to_cache(
+        url,
+        chunk_size=CHUNK_SIZE,
+        max_workers=3,
+        progress=lambda done, total: progress.append((done, total)),
+    )
+    assert dest == pudl_intake_cache / cached_filename(url)
+    assert dest.read_bytes() == remote_object.read_bytes()
+    assert progress[-1] == (remote_object.stat().st_size,) * 2
+    # simplecache uses the downloaded copy rather than fetching it again:
+    remote_object.unlink()
+    with fsspec.open(url, simplecache={"cache_storage": str(pudl_intake_cache)}) as f:
+        assert f.read() == dest.read_bytes()
+
+
+def test_resume_interrupted_download(remote_object: Path, tmp_path: Path):
+    """Only the ranges that failed are fetched again when a download is retried."""
+    dest = tmp_path / "cache" / "pudl.sqlite"
+    partial_dir = tmp_path / "cache" / PARTIAL_DIR_NAME
+    flaky = FlakyFileSystem(fail_at=[2 * CHUNK_SIZE, 4 * CHUNK_SIZE])
+    with pytest.raises(ConnectionError):
+        RangeDownloader(
+            flaky, str(remote_object), dest, partial_dir, chunk_size=CHUNK_SIZE
+        ).run()
+    assert not dest.exists()
+
+    retry = FlakyFileSystem()
+    RangeDownloader(
+        retry, str(remote_object), dest, partial_dir, chunk_size=CHUNK_SIZE
+    ).run()
+    assert sorted(retry.requests) == [2 * CHUNK_SIZE, 4 * CHUNK_SIZE]
+    assert dest.read_bytes() == remote_object.read_bytes()
+    assert not list(partial_dir.glob("*.part"))
+
+
+def test_resume_refetches_corrupted_ranges(remote_object: Path, tmp_path: Path):
+    """Completed ranges that were lost before a retry are fetched again."""
+    dest = tmp_path / "cache" / "pudl.sqlite"
+    partial_dir = tmp_path / "cache" / PARTIAL_DIR_NAME
+    with pytest.raises(ConnectionError):
+        RangeDownloader(
+            FlakyFileSystem(fail_at=[4 * CHUNK_SIZE]),
+            str(remote_object),
+            dest,
+            partial_dir,
+            chunk_size=CHUNK_SIZE,
+        ).run()
+    # Simulate a crash that lost a range which had already been checkpointed.
+    with open(partial_dir / "pudl.sqlite.part", "r+b") as f:
+        f.seek(CHUNK_SIZE)
+        f.write(bytes(CHUNK_SIZE))
+
+    retry = FlakyFileSystem()
+    downloader = RangeDownloader(
+        retry, str(remote_object), dest, partial_dir, chunk_size=CHUNK_SIZE
+    )
+    downloader.run()
+    assert sorted(retry.requests) == [CHUNK_SIZE, 4 * CHUNK_SIZE]
+    assert dest.read_bytes() == remote_object.read_bytes()
+    assert downloader.checksum == file_checksum(remote_object, CHUNK_SIZE)
+
+
+def test_changed_object_restarts_download(remote_object: Path, tmp_path: Path):
+    """A checkpoint for a different version of the object is discarded."""
+    dest = tmp_path / "cache" / "pudl.sqlite"
+    partial_dir = tmp_path / "cache" / PARTIAL_DIR_NAME
+    with pytest.raises(ConnectionError):
+        RangeDownloader(
+            FlakyFileSystem(fail_at=[0]),
+            str(remote_object),
+            dest,
+            partial_dir,
+            chunk_size=CHUNK_SIZE,
+        ).run()
+    remote_object.write_bytes(os.urandom(2 * CHUNK_SIZE))
+
+    retry = FlakyFileSystem()
+    RangeDownloader(
+        retry, str(remote_object), dest, partial_dir, chunk_size=CHUNK_SIZE
+    ).run()
+    assert sorted(retry.requests) == [0, CHUNK_SIZE]
+    assert dest.read_bytes() == remote_object.read_bytes()
+
+
+def test_reuse_identical_objects(remote_object: Path, pudl_intake_cache: Path):
+    """Objects identical to one cached for another version are linked, not fetched."""
+    old = f"simplecache::file://{remote_object}"
+    new_object = remote_object.parent.parent / "v2" / remote_object.name
+    new_object.parent.mkdir()
+    new_object.write_bytes(remote_object.read_bytes())
+    stat = remote_object.stat()
+    os.utime(new_object, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    first = download_to_cache(old, chunk_size=CHUNK_SIZE)
+
+    progress = []
+    new = f"simplecache::file://{new_object}"
+    second = download_to_cache(new, progress=lambda *args: progress.append(args))
+    assert second != first
+    assert second.stat().st_ino == first.stat().st_ino
+    assert progress == []
+    sizes = {entry.url: entry.size for entry in CacheManager().entries()}
+    assert sizes == {
+        f"file://{remote_object}": stat.st_size // 2,
+        f"file://{new_object}": stat.st_size // 2,
+    }
+
+    changed = remote_object.parent.parent / "v3" / remote_object.name
+    changed.parent.mkdir()
+    changed.write_bytes(os.urandom(stat.st_size))
+    os.utime(changed, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    third = download_to_cache(f"simplecache::file://{changed}", chunk_size=CHUNK_SIZE)
+    assert third.read_bytes() == changed.read_bytes()
+    assert third.stat().st_nlink == 1
+
+
+def test_corrupted_objects(
+    remote_object: Path, pudl_intake_cache: Path, capsys: pytest.CaptureFixture
+):
+    """Corrupted objects are detected, quarantined and downloaded again."""
+    url = f"simplecache::file://{remote_object}"
+    dest = download_to_cache(url, chunk_size=CHUNK_SIZE)
+    manager = CacheManager()
+    checksum = file_checksum(remote_object, CHUNK_SIZE)
+    assert manager.checksums() == {f"file://{remote_object}": checksum}
+    assert main(["cache", "checksums"]) == 0
+    assert checksum in capsys.readouterr().out
+    assert manager.verify() == []
+
+    # Corruption that leaves the size and modification time alone is only found by
+    # verifying the checksums.
+    stat = dest.stat()
+    with open(dest, "r+b") as f:
+        f.write(bytes(10))
+    os.utime(dest, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert download_to_cache(url).read_bytes() != remote_object.read_bytes()
+    assert main(["cache", "verify"]) == 1
+    assert (pudl_intake_cache / QUARANTINE_DIR_NAME / dest.name).is_file()
+    assert not dest.exists()
+    assert download_to_cache(url).read_bytes() == remote_object.read_bytes()
+
+    # A truncated file is caught by the cheap check on the hot path.
+    instrumentation.reset()
+    with open(dest, "r+b") as f:
+        f.truncate(CHUNK_SIZE)
+    with instrumentation.source("pudl"):
+        assert download_to_cache(url).read_bytes() == remote_object.read_bytes()
+    assert instrumentation.stats()["pudl"]["cache_misses"]["data"] == 1
+    assert manager.verify() == []
+    manager.purge_superseded()
+    assert not (pudl_intake_cache / QUARANTINE_DIR_NAME).exists()
@@ -0,0 +1,36 @@
+"""Unit tests for the pudl_catalog.dtypes module."""
+import logging
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from pudl_catalog.dtypes import arrow_to_pandas, compact_dtypes, memory_per_row
+from tests.unit.conftest import make_epacems_df
+
+logger = logging.getLogger(__name__)
+
+
+def test_arrow_and_pandas_conversions_agree():
+    """Compacting in Arrow and in pandas produce the same dtypes and values."""
+    df = make_epacems_df(2020, "CO")
+    from_arrow = arrow_to_pandas(pa.Table.from_pandas(df), "compact")
+    pd.testing.assert_frame_equal(
+        from_arrow, compact_dtypes(df), check_categorical=False
+    )
+    assert memory_per_row(from_arrow)["total"] < memory_per_row(df)["total"]
+
+
+def test_downcasts_are_lossless():
+    """Values that don't fit in the downcast type raise an error instead."""
+    df = pd.DataFrame({"year": [2020, 40000]})
+    with pytest.raises(ValueError, match="year"):
+        compact_dtypes(df)
+    with pytest.raises(pa.ArrowInvalid):
+        arrow_to_pandas(pa.Table.from_pandas(df), "compact")
+
+
+def test_unknown_profile():
+    """Only the known profiles can be used."""
+    with pytest.raises(ValueError, match="Unknown dtype profile"):
+        arrow_to_pandas(pa.table({"x": [1]}), "tiny")
@@ -0,0 +1,148 @@
+"""Unit tests for the pudl_catalog.footers module."""
+import datetime
+import decimal
+import logging
+from pathlib import Path
+
+import fsspec
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from pudl_catalog import footers
+from pudl_catalog.download import download_to_cache
+from pudl_catalog.footers import (
+    FooterCache,
+    ParquetFooter,
+    object_etag,
+    row_group_may_match,
+)
+from pudl_catalog.helpers import epacems_filter
+from pudl_catalog.sources import EpaCemsSource
+
+logger = logging.getLogger(__name__)
+
+
+def test_footer_cache_round_trip(epacems_partitioned: Path, tmp_path: Path):
+    """Footers and statistics survive being stored and retrieved."""
+    url = str(epacems_partitioned / "epacems-2020-ID.parquet")
+    cache = FooterCache(tmp_path / "footers.sqlite", catalog_version="vtest")
+    assert cache.lookup(url) is None
+    footer = cache.get(url)
+    stored = cache.lookup(url)
+    assert stored.row_groups == footer.row_groups
+    assert stored.metadata.num_rows == footer.num_rows == 96
+    (start, _) = stored.row_groups[0]["statistics"]["operating_datetime_utc"]
+    assert start == pd.Timestamp("2020-01-01", tz="UTC")
+    # A different ETag means the stored footer is stale:
+    assert cache.lookup(url, etag="not-the-etag") is None
+    # Footers are stored separately for each catalog version:
+    assert FooterCache(cache.path, catalog_version="vother").lookup(url) is None
+
+
+def test_non_ns_statistics(tmp_path: Path):
+    """Statistics of coarse timestamps, dates, decimals and bytes can be stored."""
+    hours = pd.date_range("2020-01-01", periods=48, freq="H", tz="UTC")
+    table = pa.table(
+        {
+            "plant_id_eia": pa.array([1] * 24 + [2] * 24, pa.int32()),
+            "operating_datetime_utc": pa.array(hours, pa.timestamp("ms", tz="UTC")),
+            "report_date": pa.array(hours.date, pa.date32()),
+            "price": pa.array(
+                [decimal.Decimal(f"{i}.25") for i in range(48)], pa.decimal128(5, 2)
+            ),
+            "raw": pa.array([b"ab"] * 48, pa.binary()),
+            "year": pa.array([2020] * 48, pa.int32()),
+            "state": pa.array(["ID"] * 48),
+        }
+    )
+    path = tmp_path / "hourly_emissions_epacems" / "epacems-2020-ID.parquet"
+    path.parent.mkdir()
+    pq.write_table(table, path, row_group_size=24)
+
+    cache = FooterCache(tmp_path / "footers.sqlite", catalog_version="vtest")
+    cache.get(str(path))
+    stats = cache.lookup(str(path)).row_groups[1]["statistics"]
+    start = datetime.datetime(2020, 1, 2, tzinfo=datetime.timezone.utc)
+    assert stats["operating_datetime_utc"] == [start, hours[-1].to_pydatetime()]
+    assert stats["report_date"] == [datetime.date(2020, 1, 2)] * 2
+    assert stats["price"] == [decimal.Decimal("24.25"), decimal.Decimal("47.25")]
+    assert stats["raw"] == [b"ab", b"ab"]
+
+    src = EpaCemsSource(
+        urlpath=f"{path.parent}/*.parquet",
+        partition_manifest=False,
+        split_row_groups=True,
+        start="2020-01-02",
+    )
+    assert src.to_dask().npartitions == 1
+    df = src.read()
+    assert len(df) == 24
+    assert set(df.plant_id_eia) == {2}
+
+
+@pytest.mark.parametrize(
+    "filters,expected",
+    [
+        (None, True),
+        (epacems_filter(years=[2020]), True),
+        (epacems_filter(years=[2019, 2021]), False),
+        (epacems_filter(min_year=2021), False),
+        (epacems_filter(plant_ids=[5], states=["ID"]), True),
+        ([[("year", "=", 2019)], [("plant_id_eia", "<", 20)]], True),
+    ],
+)
+def test_row_group_may_match(filters, expected):
+    """Row groups are only skipped if their statistics rule out every conjunction."""
+    stats = {"year": (2020, 2020), "plant_id_eia": (3, 10)}
+    assert row_group_may_match(stats, filters) is expected
+
+
+def test_source_reuses_footers(
+    epacems_partitioned: Path, monkeypatch: pytest.MonkeyPatch
+):
+    """Once stored, footers are not read from the Parquet files again."""
+
+    def make_source():
+        return EpaCemsSource(
+            urlpath=f"{epacems_partitioned}/*.parquet",
+            partition_manifest=False,
+            split_row_groups=True,
+            filters=epacems_filter(years=[2020], states=["ID"]),
+        )
+
+    src = make_source()
+    df = src.read()
+    assert set(zip(df.year, df.state)) == {(2020, "ID")}
+    assert src.to_dask().npartitions == 1
+
+    def no_footer_reads(*args, **kwargs):
+        raise AssertionError("Footer should have been read from the cache.")
+
+    monkeypatch.setattr(ParquetFooter, "from_file", no_footer_reads)
+    pd.testing.assert_frame_equal(make_source().read(), df)
+
+
+def test_footers_of_downloaded_files(
+    epacems_partitioned: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    """Footers of files that have been downloaded are read from the local copy."""
+    remote = epacems_partitioned / "epacems-2020-CO.parquet"
+    url = f"file://{remote}"
+    cache = FooterCache(tmp_path / "footers.sqlite", catalog_version="vtest")
+    download_to_cache(f"simplecache::{url}")
+
+    def no_remote_reads(*args, **kwargs):
+        raise AssertionError("The footer should have been read from the local copy.")
+
+    monkeypatch.setattr(footers, "url_to_fs", no_remote_reads)
+    footer = cache.get(f"simplecache::{url}")
+    assert footer.metadata.num_rows == pq.ParquetFile(remote).metadata.num_rows
+    # Stored under the remote URL, with the ETag the object had when downloaded.
+    etag = object_etag(fsspec.filesystem("file"), str(remote))
+    assert cache.lookup(url, etag=etag) is not None
+
+    other = f"simplecache::file://{epacems_partitioned}/epacems-2020-ID.parquet"
+    with pytest.raises(AssertionError, match="local copy"):
+        cache.get(other)
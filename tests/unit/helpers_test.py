@@ -1,9 +1,17 @@
 """Unit tests for the pudl_catalog.helpers module."""
 import logging
+from datetime import date
 
+import pandas as pd
+import pyarrow as pa
 import pytest
 
-from pudl_catalog.helpers import year_state_filter
+from pudl_catalog.helpers import (
+    epacems_filter,
+    filters_to_expression,
+    filters_to_sql,
+    year_state_filter,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -20,3 +28,71 @@ logger = logging.getLogger(__name__)
 def test_year_state_filter(years, states, expected_filter):
     """Test the generation of DNF pushdown filters for Parquet files."""
     assert year_state_filter(years=years, states=states) == expected_filter
+
+
+@pytest.mark.parametrize(
+    "years,states",
+    [
+        ([2019, 2020], ["ID", "co"]),
+        (range(1995, 2021), None),
+    ],
+)
+def test_year_state_filter_is_compact(years, states):
+    """Multiple years and states are selected using a single conjunction."""
+    filters = year_state_filter(years=years, states=states)
+    assert len(filters) == 1
+    assert len(filters[0]) == (1 if states is None else 2)
+
+
+def test_epacems_filter():
+    """Ranges, plant IDs and datetime windows are all combined in one conjunction."""
+    (conjunction,) = epacems_filter(
+        min_year=2015,
+        max_year=2020,
+        plant_ids=[3, 3, 10],
+        start="2020-06-01",
+        end=pd.Timestamp("2020-06-01 06:00", tz="US/Mountain"),
+    )
+    assert conjunction == [
+        ("year", ">=", 2015),
+        ("year", "<=", 2020),
+        ("plant_id_eia", "in", {3, 10}),
+        ("operating_datetime_utc", ">=", pd.Timestamp("2020-06-01", tz="UTC")),
+        ("operating_datetime_utc", "<", pd.Timestamp("2020-06-01 12:00", tz="UTC")),
+    ]
+    assert epacems_filter() is None
+
+
+def test_filters_to_expression():
+    """Filters and the equivalent expression select the same rows."""
+    df = pd.DataFrame(
+        {"year": [2019, 2019, 2020, 2021], "state": ["ID", "CO", "ID", "ID"]}
+    )
+    filters = [
+        [("year", "in", {2019, 2020}), ("state", "=", "ID")],
+        [("year", ">", 2020)],
+    ]
+    table = pa.Table.from_pandas(df).filter(filters_to_expression(filters))
+    assert table.to_pydict() == {"year": [2019, 2020, 2021], "state": ["ID"] * 3}
+    assert filters_to_expression(None) is None
+
+
+def test_filters_to_sql():
+    """DNF filters are converted into a parameterized SQL where clause."""
+    sql, params = filters_to_sql(
+        [
+            [("state", "=", "CO"), ("operating_datetime_utc", "<", "2020-01-01")],
+            [
+                ("plant_id_eia", "not in", {3, 1}),
+                ("report_date", ">=", date(2020, 1, 1)),
+            ],
+        ]
+    )
+    assert sql == (
+        '(("state" = ? AND "operating_datetime_utc" < ?) OR '
+        '("plant_id_eia" NOT IN (?, ?) AND "report_date" >= ?))'
+    )
+    assert params == ["CO", "2020-01-01", 1, 3, "2020-01-01"]
+    _, params = filters_to_sql(epacems_filter(start="2020-01-01T06:00-06:00"))
+    assert params == ["2020-01-01 12:00:00"]
+    assert filters_to_sql(None) == (None, [])
@@ -0,0 +1,57 @@
+"""Check that importing pudl_catalog stays cheap and free of side effects."""
+import json
+import logging
+import re
+import subprocess
+import sys
+
+import pudl_catalog
+
+logger = logging.getLogger(__name__)
+
+# Generous upper bound on the cumulative time spent importing pudl_catalog. Eagerly
+# importing intake and opening the catalog took several hundred milliseconds.
+MAX_IMPORT_MICROSECONDS = 150_000
+
+HEAVY_MODULES = ["intake", "pkg_resources", "pandas", "pyarrow", "dask", "fsspec"]
+
+
+def _import_in_subprocess() -> dict:
+    """Import pudl_catalog in a clean interpreter and report what happened."""
+    code = (
+        "import json, os, sys; env = dict(os.environ); import pudl_catalog; "
+        "print(json.dumps({'modules': sorted(sys.modules), "
+        "'env_changed': env != dict(os.environ)}))"
+    )
+    env = {"PATH": "", "HOME": "/nonexistent"}
+    result = subprocess.run(  # nosec: B603
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    )
+    report = json.loads(result.stdout)
+    match = re.search(
+        r"import time:\s+\d+ \|\s+(\d+) \| pudl_catalog$", result.stderr, re.MULTILINE
+    )
+    report["cumulative_us"] = int(match.group(1))
+    return report
+
+
+def test_import_is_lazy():
+    """Importing the package doesn't import heavy dependencies or touch the env."""
+    report = _import_in_subprocess()
+    logger.info(f"Importing pudl_catalog took {report['cumulative_us']} us")
+    assert not [mod for mod in HEAVY_MODULES if mod in report["modules"]]
+    assert not report["env_changed"]
+    assert report["cumulative_us"] < MAX_IMPORT_MICROSECONDS
+
+
+def test_lazy_attributes(monkeypatch):
+    """The catalog and version are still available when they're asked for."""
+    monkeypatch.delenv("PUDL_INTAKE_PATH", raising=False)
+    assert isinstance(pudl_catalog.__version__, str)
+    assert "hourly_emissions_epacems" in list(pudl_catalog.pudl_cat)
+    assert pudl_catalog.pudl_cat is pudl_catalog.pudl_cat
+    assert "pudl_cat" in dir(pudl_catalog)
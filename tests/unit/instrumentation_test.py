@@ -0,0 +1,112 @@
+"""Unit tests for the pudl_catalog.instrumentation module."""
+import logging
+import threading
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from pudl_catalog import instrumentation
+from pudl_catalog.sources import EpaCemsSource, SQLiteCatalog
+
+logger = logging.getLogger(__name__)
+
+
+def test_attribution_to_sources():
+    """I/O is attributed to the current source, which threads don't inherit."""
+    instrumentation.record_request(10)
+    with instrumentation.source("a"):
+        instrumentation.record_request(100)
+        with instrumentation.source("b"):
+            instrumentation.record_cache("data", hit=True)
+        thread = threading.Thread(target=instrumentation.record_request, args=(1,))
+        thread.start()
+        thread.join()
+        instrumentation.record_cache("data", hit=False)
+    stats = instrumentation.stats()
+    assert stats["a"]["bytes_transferred"] == 100
+    assert stats["a"]["cache_misses"] == {"data": 1}
+    assert stats["b"]["cache_hits"] == {"data": 1}
+    assert stats[instrumentation.UNATTRIBUTED]["requests"] == 2
+    assert stats[instrumentation.UNATTRIBUTED]["bytes_transferred"] == 11
+
+
+def test_phase_timing_survives_errors():
+    """Phases are timed even if they raise an exception."""
+    with pytest.raises(ValueError):
+        with instrumentation.phase("read", source="a"):
+            raise ValueError()
+    assert instrumentation.stats()["a"]["calls"] == {"read": 1}
+    assert instrumentation.stats()["a"]["seconds"]["read"] >= 0
+
+
+def test_prometheus_format(tmp_path: Path):
+    """Statistics are rendered with one labelled sample per source and cache."""
+    with instrumentation.source('odd "name"'):
+        instrumentation.record_request(5)
+        instrumentation.record_cache("footers", hit=True)
+    text = instrumentation.to_prometheus()
+    assert "# TYPE pudl_catalog_requests_total counter" in text
+    assert 'pudl_catalog_requests_total{source="odd \\"name\\""} 1' in text
+    assert (
+        'pudl_catalog_cache_hits_total{source="odd \\"name\\"",cache="footers"} 1'
+        in text
+    )
+    path = tmp_path / "pudl_catalog.prom"
+    instrumentation.write_prometheus(path)
+    assert path.read_text() == text
+
+
+def test_log_stats(caplog: pytest.LogCaptureFixture):
+    """Logged summaries carry the full statistics for structured logging."""
+    instrumentation.record_request(5, source="a")
+    with caplog.at_level(logging.INFO, logger="pudl_catalog.instrumentation"):
+        instrumentation.log_stats()
+    (record,) = caplog.records
+    assert record.pudl_source == "a"
+    assert record.pudl_stats["bytes_transferred"] == 5
+
+
+def test_epacems_cold_and_warm_reads(epacems_partitioned: Path, pudl_intake_cache):
+    """Reading cached EPA CEMS data records transfers, footers and cache lookups."""
+
+    def read():
+        source = EpaCemsSource(
+            urlpath=f"simplecache::file://{epacems_partitioned}/*.parquet",
+            years=[2020],
+            states=["CO"],
+            partition_manifest=False,
+            storage_options={"simplecache": {"cache_storage": str(pudl_intake_cache)}},
+        )
+        source.name = "epacems"
+        source.to_dask().compute()
+        return instrumentation.stats()["epacems"]
+
+    cold = read()
+    assert cold["cache_misses"] == {"data": 1, "content": 1, "footers": 1}
+    assert cold["bytes_transferred"] > 0
+    assert set(cold["seconds"]) == {"listing", "footers", "transfer", "read"}
+
+    instrumentation.reset()
+    warm = read()
+    assert warm["cache_hits"] == {"data": 1, "footers": 1}
+    assert "transfer" not in warm["seconds"]
+    assert warm["bytes_transferred"] == 0
+
+
+def test_sqlite_attribution(tmp_path: Path, pudl_intake_cache: Path):
+    """SQLite I/O is attributed to the database and to each table."""
+    db_path = tmp_path / "pudl.sqlite"
+    pd.DataFrame({"plant_id_eia": [1, 2]}).to_sql(
+        "plants_entity_eia", f"sqlite:///{db_path}", index=False
+    )
+    cat = SQLiteCatalog(
+        urlpath=f"file://{db_path}",
+        storage_options={"simplecache": {"cache_storage": str(pudl_intake_cache)}},
+    )
+    cat.plants_entity_eia.read()
+    stats = instrumentation.stats()
+    assert stats["pudl"]["cache_misses"] == {"data": 1, "content": 1}
+    assert stats["pudl"]["calls"] == {"transfer": 1, "listing": 1}
+    assert stats["pudl.plants_entity_eia"]["cache_hits"]["data"] > 0
+    assert stats["pudl.plants_entity_eia"]["calls"]["read"] > 0
@@ -0,0 +1,109 @@
+"""Unit tests for the pudl_catalog.local_sqlite module."""
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from pudl_catalog.cache import CacheManager
+from pudl_catalog.local_sqlite import index_path, pool_for
+from pudl_catalog.sources import SQLiteCatalog, SQLiteTableSource
+
+logger = logging.getLogger(__name__)
+
+
+def test_pooled_connections(pudl_db: Path):
+    """Connections are tuned for reading, and reused by concurrent readers."""
+    pool = pool_for(pudl_db, immutable=True)
+    assert pool_for(pudl_db, immutable=True) is pool
+    with pool.connection() as conn:
+        assert conn.execute("PRAGMA query_only").fetchone() == (1,)
+        assert conn.execute("PRAGMA mmap_size").fetchone()[0] > 0
+        assert conn.execute("PRAGMA temp_store").fetchone() == (2,)
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM generators_eia860")
+
+    def read(plant_id: int) -> pd.DataFrame:
+        return SQLiteTableSource(
+            str(pudl_db),
+            "generators_eia860",
+            filters=[("plant_id_eia", "==", plant_id)],
+        ).read()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        dfs = list(executor.map(read, range(20)))
+    assert [set(df.plant_id_eia) for df in dfs] == [{i} for i in range(20)]
+    opened = pool_for(pudl_db).opened
+    assert 0 < opened <= 4
+    SQLiteCatalog(str(pudl_db)).generators_eia860.read()
+    assert pool_for(pudl_db).opened == opened
+
+
+def test_index_columns(pudl_db: Path, pudl_intake_cache: Path):
+    """Filtered columns are indexed in a sidecar, which is used to find the rows."""
+    filters = [
+        [("plant_id_eia", "in", [1, 3]), ("capacity_mw", ">", 100)],
+        [("report_date", "==", "2012-01-01")],
+    ]
+    expected = SQLiteTableSource(
+        str(pudl_db), "generators_eia860", filters=filters
+    ).read()
+    src = SQLiteTableSource(
+        str(pudl_db),
+        "generators_eia860",
+        filters=filters,
+        index_columns=["plant_id_eia", "report_date", "utility_id_eia"],
+    )
+    sql, _ = src._select()
+    assert "rowid IN (SELECT" in sql
+    pd.testing.assert_frame_equal(src.read(), expected)
+    pd.testing.assert_frame_equal(
+        src.to_dask().compute().reset_index(drop=True), expected
+    )
+
+    sidecar = index_path(str(pudl_db))
+    conn = sqlite3.connect(sidecar)
+    indexes = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' "
+        "AND tbl_name = 'generators_eia860' ORDER BY name"
+    ).fetchall()
+    conn.close()
+    assert indexes == [
+        ("generators_eia860.plant_id_eia",),
+        ("generators_eia860.report_date",),
+    ]
+
+    unindexed = SQLiteTableSource(
+        str(pudl_db),
+        "generators_eia860",
+        filters=[("capacity_mw", ">", 100)],
+        index_columns=["plant_id_eia"],
+    )
+    assert "rowid IN" not in unindexed._select()[0]
+
+    CacheManager().purge_superseded()
+    assert sidecar.exists()
+
+
+def test_stale_indexes(pudl_db: Path, pudl_intake_cache: Path):
+    """Indexes of a local database are rebuilt when the database is modified."""
+    kwargs = {
+        "urlpath": str(pudl_db),
+        "table": "generators_eia860",
+        "filters": [("plant_id_eia", "==", 1)],
+        "index_columns": ["plant_id_eia"],
+    }
+    assert len(SQLiteTableSource(**kwargs).read()) == 25
+    conn = sqlite3.connect(pudl_db)
+    with conn:
+        conn.execute("DELETE FROM generators_eia860 WHERE capacity_mw > 300")
+        conn.execute("INSERT INTO generators_eia860 VALUES (1, 'NEW', NULL, 1.0, NULL)")
+    conn.close()
+    sidecar = index_path(str(pudl_db))
+    os.utime(pudl_db, (sidecar.stat().st_atime + 10, sidecar.stat().st_mtime + 10))
+    df = SQLiteTableSource(**kwargs).read()
+    assert set(df.generator_id) >= {"NEW"}
+    assert len(df) == 10 + 1
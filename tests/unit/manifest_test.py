@@ -0,0 +1,118 @@
+"""Unit tests for the pudl_catalog.manifest module."""
+import logging
+from pathlib import Path
+
+import pytest
+from fsspec.implementations.local import LocalFileSystem
+
+from pudl_catalog import CATALOG_VERSION, manifest
+from pudl_catalog.cli import main
+from pudl_catalog.helpers import year_state_filter
+from pudl_catalog.manifest import (
+    DEFAULT_MANIFEST_PATH,
+    PartitionManifest,
+    build_partition_manifest,
+    load_partition_manifest,
+    partition_matches_filters,
+)
+from pudl_catalog.sources import EpaCemsSource
+
+logger = logging.getLogger(__name__)
+
+
+def test_default_manifest_matches_catalog_version():
+    """The distributed manifest, if any, must describe the current catalog version."""
+    if not DEFAULT_MANIFEST_PATH.is_file():
+        assert load_partition_manifest(CATALOG_VERSION) is None
+    else:
+        assert load_partition_manifest(CATALOG_VERSION) is not None
+
+
+def test_mismatched_manifest_version_is_ignored(
+    epacems_partitioned: Path, tmp_path: Path
+):
+    """A manifest for some other version of the catalog must not be used."""
+    path = tmp_path / "manifest.yaml"
+    build_partition_manifest(str(epacems_partitioned), "v1900.01.01").to_yaml(path)
+    assert load_partition_manifest("v1900.01.01", path=path) is not None
+    assert load_partition_manifest(CATALOG_VERSION, path=path) is None
+
+
+def test_manifest_cli(
+    epacems_partitioned: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture,
+):
+    """The distributed manifest is generated from a listing of the published files."""
+    path = tmp_path / "epacems_partitions.yaml"
+    monkeypatch.setattr(manifest, "DEFAULT_MANIFEST_PATH", path)
+    assert load_partition_manifest(CATALOG_VERSION) is None
+    assert main(["manifest", "--urlpath", str(epacems_partitioned)]) == 0
+    assert "Wrote 4 partitions" in capsys.readouterr().out
+    assert path.read_text().startswith("# Manifest of the year-state partitioned")
+    assert load_partition_manifest(CATALOG_VERSION).select(
+        years=[2020], states=["id"]
+    ) == ["epacems-2020-ID.parquet"]
+    (tmp_path / "empty").mkdir()
+    assert main(["manifest", "--urlpath", str(tmp_path / "empty")]) == 1
+
+
+@pytest.mark.parametrize(
+    "filters,expected",
+    [
+        (None, True),
+        ([("year", "=", 2020)], True),
+        ([("year", "=", 2019)], False),
+        ([[("year", "=", 2019)], [("state", "in", ["ID", "CO"])]], True),
+        ([("year", ">=", 2015), ("state", "!=", "ID")], False),
+        ([("year", "<", 2021), ("gross_load_mw", ">", 100)], True),
+    ],
+)
+def test_partition_matches_filters(filters, expected):
+    """Only the year and state predicates are used to match a partition."""
+    assert partition_matches_filters(2020, "ID", filters) is expected
+
+
+def test_build_and_round_trip(epacems_partitioned: Path, tmp_path: Path):
+    """Build a manifest by listing files, and write it out and read it back in."""
+    manifest = build_partition_manifest(str(epacems_partitioned), "vtest")
+    assert len(manifest) == 4
+    manifest.partitions.pop((2019, "ID"))
+    manifest.to_yaml(tmp_path / "manifest.yaml")
+    roundtrip = PartitionManifest.from_yaml(tmp_path / "manifest.yaml")
+    assert roundtrip.partitions == manifest.partitions
+    assert roundtrip.select(
+        filters=year_state_filter(years=[2019], states=["CO", "ID"])
+    ) == ["epacems-2019-CO.parquet"]
+
+
+@pytest.mark.parametrize("footer_cache", [True, False])
+def test_distributed_manifest_avoids_listing(
+    epacems_partitioned: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    footer_cache: bool,
+):
+    """With a distributed manifest, a year-state read never lists the remote files."""
+    path = tmp_path / "epacems_partitions.yaml"
+    build_partition_manifest(str(epacems_partitioned), CATALOG_VERSION).to_yaml(path)
+    monkeypatch.setattr(manifest, "DEFAULT_MANIFEST_PATH", path)
+
+    def no_listing(self, *args, **kwargs):
+        raise AssertionError("The remote files should not be listed.")
+
+    monkeypatch.setattr(LocalFileSystem, "glob", no_listing)
+    monkeypatch.setattr(LocalFileSystem, "ls", no_listing)
+    monkeypatch.setattr(LocalFileSystem, "find", no_listing)
+    src = EpaCemsSource(
+        urlpath=f"file://{epacems_partitioned}/*.parquet",
+        years=[2020],
+        states=["CO"],
+        footer_cache=footer_cache,
+    )
+    assert src.selected_urlpaths() == [
+        f"file://{epacems_partitioned}/epacems-2020-CO.parquet"
+    ]
+    df = src.read()
+    assert set(zip(df.year, df.state)) == {(2020, "CO")}
@@ -0,0 +1,159 @@
+"""Unit tests for the pudl_catalog.materialize module."""
+import logging
+import os
+import sqlite3
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from pudl_catalog.cache import TABLES_DIR_NAME, CacheManager
+from pudl_catalog.materialize import (
+    materialized_path,
+    sorted_path,
+    write_parquet,
+    write_sorted,
+)
+from pudl_catalog.sources import SQLiteCatalog, SQLiteTableSource
+from tests.unit.conftest import make_epacems_df
+
+logger = logging.getLogger(__name__)
+
+
+def test_write_parquet_row_groups(tmp_path: Path):
+    """Row groups have the requested size, regardless of the size of the batches."""
+    batches = [
+        pa.RecordBatch.from_pydict({"x": list(range(i, i + 100))})
+        for i in range(0, 300, 100)
+    ]
+    path = write_parquet(
+        batches, pa.schema([("x", pa.int64())]), tmp_path / "x.pq", 120
+    )
+    metadata = pq.read_metadata(path)
+    assert [metadata.row_group(i).num_rows for i in range(3)] == [120, 120, 60]
+    assert pq.read_table(path).column("x").to_pylist() == list(range(300))
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_materialized_reads(
+    pudl_db: Path, pudl_intake_cache: Path, monkeypatch: pytest.MonkeyPatch
+):
+    """Tables are converted once, then read from Parquet with pushdown."""
+    kwargs = {
+        "columns": ["plant_id_eia", "capacity_mw", "report_date"],
+        "filters": [
+            ("plant_id_eia", "in", {3, 4}),
+            ("report_date", ">=", date(2015, 1, 1)),
+        ],
+    }
+    expected = SQLiteTableSource(str(pudl_db), "generators_eia860", **kwargs).read()
+
+    src = SQLiteTableSource(
+        str(pudl_db), "generators_eia860", materialize=True, **kwargs
+    )
+    pd.testing.assert_frame_equal(src.read(), expected)
+    path = materialized_path(str(pudl_db), "generators_eia860")
+    assert pq.read_schema(path).types[:4] == [
+        pa.int64(),
+        pa.string(),
+        pa.date32(),
+        pa.float64(),
+    ]
+
+    def no_sqlite(self):
+        raise AssertionError("The database shouldn't be read once it's converted.")
+
+    monkeypatch.setattr(SQLiteTableSource, "_connect", no_sqlite)
+    src = SQLiteTableSource(
+        str(pudl_db), "generators_eia860", materialize=True, chunksize=10, **kwargs
+    )
+    assert sum(len(chunk) for chunk in src.read_chunked()) == len(expected)
+    pd.testing.assert_frame_equal(
+        src.to_dask().compute().reset_index(drop=True), expected
+    )
+
+
+def test_materialized_empty_table(pudl_db: Path, pudl_intake_cache: Path):
+    """Tables with no rows are converted to Parquet files with no row groups."""
+    conn = sqlite3.connect(pudl_db)
+    with conn:
+        conn.execute("DELETE FROM generators_eia860")
+    conn.close()
+    expected = SQLiteTableSource(str(pudl_db), "generators_eia860").read()
+    assert expected.empty
+
+    src = SQLiteTableSource(str(pudl_db), "generators_eia860", materialize=True)
+    assert src.discover()["npartitions"] == 0
+    assert pq.ParquetFile(src._parquet_path).num_row_groups == 0
+    pd.testing.assert_frame_equal(src.read(), expected)
+    pd.testing.assert_frame_equal(src._get_partition(0), expected)
+    pd.testing.assert_frame_equal(src.to_dask().compute(), expected)
+
+
+def test_materialized_stale(pudl_db: Path, pudl_intake_cache: Path):
+    """Local tables are converted again when the database is modified."""
+    SQLiteCatalog(str(pudl_db), materialize=True).generators_eia860.read()
+    path = materialized_path(str(pudl_db), "generators_eia860")
+    conn = sqlite3.connect(pudl_db)
+    with conn:
+        conn.execute("DELETE FROM generators_eia860 WHERE plant_id_eia > 0")
+    conn.close()
+    os.utime(pudl_db, (path.stat().st_atime + 10, path.stat().st_mtime + 10))
+    df = SQLiteCatalog(str(pudl_db), materialize=True).generators_eia860.read()
+    assert len(df) == 25
+
+
+def test_purge_superseded_tables(pudl_db: Path, pudl_intake_cache: Path):
+    """Tables converted for other catalog versions are removed."""
+    SQLiteTableSource(str(pudl_db), "generators_eia860", materialize=True).read()
+    old = materialized_path(str(pudl_db), "generators_eia860", catalog_version="vold")
+    old.parent.mkdir(parents=True)
+    old.write_bytes(b"")
+    CacheManager().purge_superseded()
+    assert not old.exists()
+    assert len(list((pudl_intake_cache / TABLES_DIR_NAME).iterdir())) == 1
+
+
+def test_write_sorted(tmp_path: Path, pudl_intake_cache: Path):
+    """Sorted copies have row groups covering short periods, and are purged later."""
+    original = tmp_path / "epacems-2020-CO.parquet"
+    make_epacems_df(2020, "CO", n_plants=4).to_parquet(original, index=False)
+    path = write_sorted(original, sorted_path(str(original)), row_group_size=40)
+    pf = pq.ParquetFile(path)
+    assert pf.num_row_groups == 5
+    stats = pf.metadata.row_group(0).column(2).statistics
+    assert stats.max - stats.min == pd.Timedelta(hours=9)
+    df = pf.read().to_pandas()
+    assert len(df) == 4 * 48
+    assert list(df.plant_id_eia[:5]) == [0, 1, 2, 3, 0]
+
+    old = sorted_path(str(original), catalog_version="vold")
+    old.parent.mkdir(parents=True)
+    old.write_bytes(b"")
+    CacheManager().purge_superseded()
+    assert not old.exists()
+    assert path.exists()
+
+
+def test_write_sorted_in_periods(tmp_path: Path):
+    """Files that don't fit in memory are sorted a period at a time, with the same result."""
+    original = tmp_path / "epacems-2020-CO.parquet"
+    df = make_epacems_df(2020, "CO", n_plants=4)
+    df.loc[5, "operating_datetime_utc"] = pd.NaT
+    df.to_parquet(original, index=False, row_group_size=48)
+    in_memory = write_sorted(original, tmp_path / "in_memory.parquet")
+    in_periods = write_sorted(
+        original,
+        tmp_path / "sorted" / "in_periods.parquet",
+        row_group_size=40,
+        max_rows_in_memory=50,
+    )
+    assert pq.ParquetFile(in_periods).num_row_groups == 5
+    assert pq.read_table(in_periods).equals(pq.read_table(in_memory))
+    assert pd.isna(
+        pq.read_table(in_periods).to_pandas().operating_datetime_utc.iloc[-1]
+    )
+    assert [p.name for p in in_periods.parent.iterdir()] == ["in_periods.parquet"]
@@ -0,0 +1,112 @@
+"""Unit tests for the pudl_catalog.plant_index module."""
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import pudl_catalog
+from pudl_catalog import instrumentation
+from pudl_catalog.cache import PLANT_INDEX_DB_NAME, CacheManager
+from pudl_catalog.plant_index import PlantIndex, uses_index
+from pudl_catalog.sources import EpaCemsSource
+from tests.unit.conftest import make_epacems_df
+
+logger = logging.getLogger(__name__)
+
+STATES = ["CO", "ID", "TX"]
+
+
+@pytest.fixture
+def epacems_monolithic(tmp_path: Path) -> Path:
+    """A single EPA CEMS file with one row group per state.
+
+    Each state has different plants, but their ranges overlap, so the row group
+    statistics can't tell the states apart.
+    """
+    dfs = []
+    for i, state in enumerate(STATES):
+        df = make_epacems_df(2020, state, n_plants=3)
+        df["plant_id_eia"] = df.plant_id_eia * len(STATES) + i
+        df["emissions_unit_id_epa"] = df.plant_id_eia.astype(str) + "A"
+        dfs.append(df)
+    path = tmp_path / "hourly_emissions_epacems.parquet"
+    pq.write_table(
+        pa.Table.from_pandas(pd.concat(dfs, ignore_index=True), preserve_index=False),
+        path,
+        row_group_size=len(dfs[0]),
+    )
+    return path
+
+
+def test_uses_index():
+    """Only filters that constrain plants or units in every conjunction use the index."""
+    assert uses_index([("plant_id_eia", "in", [1, 2])])
+    assert uses_index([[("state", "==", "CO"), ("emissions_unit_id_epa", "==", "1A")]])
+    assert not uses_index([[("plant_id_eia", "==", 1)], [("state", "==", "CO")]])
+    assert not uses_index(None)
+
+
+def test_row_groups(epacems_monolithic: Path, pudl_intake_cache: Path):
+    """Only row groups containing the selected plants and units are returned."""
+    index = PlantIndex(pudl_intake_cache / PLANT_INDEX_DB_NAME, catalog_version="v1")
+    url = str(epacems_monolithic)
+    assert index.row_groups(url, [("plant_id_eia", "in", [3, 5])]) == {0, 2}
+    assert index.row_groups(url, [("plant_id_eia", "==", np.int64(4))]) == {1}
+    assert index.row_groups(url, [("plant_id_eia", "==", 9)]) == set()
+    assert index.row_groups(url, [("emissions_unit_id_epa", "==", "8A")]) == {2}
+    assert index.row_groups(url, [("state", "==", "CO")]) is None
+    stats = instrumentation.stats()[instrumentation.UNATTRIBUTED]
+    assert stats["cache_misses"] == {"index": 1}
+    assert stats["cache_hits"] == {"index": 4}
+
+    other = PlantIndex(pudl_intake_cache / PLANT_INDEX_DB_NAME, catalog_version="v2")
+    assert other.indexed_columns(url) is None
+
+
+def test_missing_columns(epacems_partitioned: Path, pudl_intake_cache: Path):
+    """Columns that aren't in the data are ignored."""
+    index = PlantIndex(pudl_intake_cache / PLANT_INDEX_DB_NAME, catalog_version="v1")
+    url = str(epacems_partitioned / "epacems-2020-CO.parquet")
+    assert index.row_groups(url, [("emissions_unit_id_epa", "==", "1A")]) is None
+    assert index.indexed_columns(url) == ["plant_id_eia"]
+    assert index.row_groups(url, [("plant_id_eia", "==", 1)]) == {0}
+
+
+@pytest.mark.parametrize("cached", [True, False])
+def test_source_reads_matching_row_groups(
+    epacems_monolithic: Path, pudl_intake_cache: Path, cached: bool
+):
+    """The EPA CEMS source only reads row groups containing the selected plants."""
+    prefix = "simplecache::file://" if cached else ""
+    kwargs = {
+        "urlpath": f"{prefix}{epacems_monolithic}",
+        "filters": [("plant_id_eia", "in", [3, 5])],
+        "partition_manifest": False,
+        "storage_options": {"simplecache": {"cache_storage": str(pudl_intake_cache)}},
+    }
+    src = EpaCemsSource(**kwargs)
+    pieces, num_rows, _, _ = src._row_group_plan()
+    assert pieces == [(kwargs["urlpath"], [0, 2])]
+    assert num_rows == 2 * 3 * 48
+    df = src.read()
+    assert set(zip(df.plant_id_eia, df.state)) == {(3, "CO"), (5, "TX")}
+
+    unindexed = EpaCemsSource(plant_index=False, **kwargs)
+    assert unindexed._row_group_plan()[0] == [(kwargs["urlpath"], [0, 1, 2])]
+    pd.testing.assert_frame_equal(unindexed.read(), df)
+
+
+def test_purge_superseded(epacems_monolithic: Path, pudl_intake_cache: Path):
+    """Index entries from other catalog versions are purged along with their data."""
+    path = pudl_intake_cache / PLANT_INDEX_DB_NAME
+    old = PlantIndex(path, catalog_version="vold")
+    new = PlantIndex(path, catalog_version=pudl_catalog.CATALOG_VERSION)
+    old.build(str(epacems_monolithic))
+    new.build(str(epacems_monolithic))
+    CacheManager().purge_superseded()
+    assert old.indexed_columns(str(epacems_monolithic)) is None
+    assert new.row_groups(str(epacems_monolithic), [("plant_id_eia", "==", 0)]) == {0}
@@ -0,0 +1,121 @@
+"""Unit tests for the pudl_catalog.prefetch module."""
+import asyncio
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+import intake
+import pytest
+
+from pudl_catalog.cache import FOOTER_DB_NAME, cached_filename
+from pudl_catalog.cli import main
+from pudl_catalog.download import DownloadCancelled
+from pudl_catalog.prefetch import plan_prefetch, prefetch, prefetch_async
+
+logger = logging.getLogger(__name__)
+
+CATALOG_TEMPLATE = """
+sources:
+  hourly_emissions_epacems_partitioned:
+    driver: pudl_catalog.sources.EpaCemsSource
+    args:
+      urlpath: "simplecache::file://{epacems}/*.parquet"
+      partition_manifest: false
+      storage_options:
+        simplecache:
+          cache_storage: "{cache}"
+  pudl:
+    driver: pudl_catalog.sources.SQLiteCatalog
+    args:
+      urlpath: "file://{pudl}"
+      storage_options:
+        simplecache:
+          cache_storage: "{cache}"
+"""
+
+
+@pytest.fixture
+def catalog_path(
+    epacems_partitioned: Path, pudl_intake_cache: Path, tmp_path: Path
+) -> Path:
+    """A catalog of remote-looking EPA CEMS and SQLite data."""
+    pudl = tmp_path / "pudl.sqlite"
+    sqlite3.connect(pudl).close()
+    path = tmp_path / "catalog.yaml"
+    path.write_text(
+        CATALOG_TEMPLATE.format(
+            epacems=epacems_partitioned, pudl=pudl, cache=pudl_intake_cache
+        )
+    )
+    return path
+
+
+def test_prefetch_selected_partitions(catalog_path: Path, pudl_intake_cache: Path):
+    """Only the selected partitions are fetched, along with their footers."""
+    catalog = intake.open_catalog(catalog_path)
+    sources = ["hourly_emissions_epacems_partitioned", "pudl"]
+    targets = plan_prefetch(sources, years=[2020], states=["CO"], catalog=catalog)
+    assert [Path(t.urlpath).name for t in targets] == [
+        "epacems-2020-CO.parquet",
+        "pudl.sqlite",
+    ]
+
+    progress = []
+    results = prefetch(
+        sources,
+        years=[2020],
+        states=["CO"],
+        catalog=catalog,
+        progress=lambda url, done, total: progress.append((url, done, total)),
+    )
+    assert [result.error for result in results] == [None, None]
+    assert not any(result.already_cached for result in results)
+    for result in results:
+        assert result.path == pudl_intake_cache / cached_filename(result.target.urlpath)
+        size = result.path.stat().st_size
+        assert (result.target.urlpath, size, size) in progress
+    assert (pudl_intake_cache / FOOTER_DB_NAME).is_file()
+
+    results = prefetch(sources, years=[2020], states=["CO"], catalog=catalog)
+    assert all(result.already_cached for result in results)
+
+
+def test_prefetch_cancelled(catalog_path: Path, pudl_intake_cache: Path):
+    """Nothing is fetched once prefetching has been cancelled."""
+    cancel = threading.Event()
+    cancel.set()
+    results = prefetch(
+        ["hourly_emissions_epacems_partitioned"],
+        catalog=intake.open_catalog(catalog_path),
+        cancel=cancel,
+    )
+    assert len(results) == 4
+    assert all(isinstance(result.error, DownloadCancelled) for result in results)
+    assert not [p for p in pudl_intake_cache.glob("*") if p.is_file()]
+
+
+def test_prefetch_async(catalog_path: Path):
+    """Prefetching can be awaited from asyncio code."""
+    results = asyncio.run(
+        prefetch_async(
+            ["hourly_emissions_epacems_partitioned"],
+            states=["ID"],
+            catalog=intake.open_catalog(catalog_path),
+        )
+    )
+    assert sorted(Path(r.target.urlpath).name for r in results) == [
+        "epacems-2019-ID.parquet",
+        "epacems-2020-ID.parquet",
+    ]
+
+
+def test_prefetch_cli(catalog_path: Path, capsys: pytest.CaptureFixture):
+    """The cache can be warmed from the command line."""
+    args = ["prefetch", "--catalog", str(catalog_path)]
+    assert main(args + ["hourly_emissions_epacems_partitioned", "--years", "2019"]) == 0
+    assert (
+        "Prefetched 2 of 2 objects (0 were already cached)" in capsys.readouterr().out
+    )
+    with pytest.raises(KeyError, match="nonexistent"):
+        main(args + ["nonexistent"])
@@ -0,0 +1,95 @@
+"""Unit tests for the pudl_catalog.query module."""
+import logging
+from pathlib import Path
+
+import intake
+import pandas as pd
+import pytest
+
+import pudl_catalog
+from benchmarks import synthetic
+from pudl_catalog.materialize import materialized_path
+
+duckdb = pytest.importorskip("duckdb")
+
+from pudl_catalog.query import QueryEngine, query  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def catalog(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> object:
+    """The PUDL catalog, pointed at synthetic data."""
+    synthetic.write_fixture(
+        tmp_path, years=[2019, 2020], states=["CO", "ID"], n_plants=3
+    )
+    monkeypatch.setenv("PUDL_INTAKE_PATH", f"file://{tmp_path}")
+    return intake.open_catalog(pudl_catalog._pudl_catalog_path)
+
+
+def test_join_epacems_and_pudl(catalog: object, tmp_path: Path):
+    """EPA CEMS data can be joined to PUDL tables without loading either in pandas."""
+    manifest = tmp_path / synthetic.MANIFEST_NAME
+    with QueryEngine(catalog=catalog, threads=2) as engine:
+        views = engine.register(
+            "hourly_emissions_epacems_partitioned",
+            years=[2020],
+            states=["CO"],
+            view="epacems",
+            partition_manifest=manifest,
+        )
+        assert views == ["epacems"]
+        assert engine.register("pudl", tables=["plants_entity_eia"]) == [
+            "pudl.plants_entity_eia"
+        ]
+        df = engine.to_pandas(
+            "SELECT e.plant_id_eia, p.state, SUM(e.gross_load_mw) AS gross_load_mw "
+            "FROM epacems e JOIN pudl.plants_entity_eia p USING (plant_id_eia) "
+            "WHERE e.operating_datetime_utc < ? "
+            "GROUP BY 1, 2 ORDER BY 1",
+            [pd.Timestamp("2020-01-02", tz="UTC")],
+        )
+        table = engine.to_arrow("SELECT DISTINCT year, state FROM epacems")
+        relation = engine.sql(
+            "SELECT year FROM epacems WHERE state = ? LIMIT 1", ["CO"]
+        )
+        assert isinstance(relation, duckdb.DuckDBPyRelation)
+        assert relation.fetchall() == [(2020,)]
+
+    hourly = catalog.hourly_emissions_epacems_partitioned(
+        years=[2020], states=["CO"], partition_manifest=manifest
+    ).read()
+    hourly = hourly[
+        hourly.operating_datetime_utc < pd.Timestamp("2020-01-02", tz="UTC")
+    ]
+    plants = catalog.pudl.plants_entity_eia.read()
+    expected = (
+        hourly.merge(plants, on="plant_id_eia")
+        .groupby(["plant_id_eia", "state_y"], as_index=False)
+        .gross_load_mw.sum()
+        .rename(columns={"state_y": "state"})
+    )
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+    assert table.to_pylist() == [{"year": 2020, "state": "CO"}]
+    assert materialized_path(
+        catalog.pudl.urlpath, "plants_entity_eia", catalog.pudl.storage_options
+    ).exists()
+
+
+def test_query(catalog: object, tmp_path: Path):
+    """Single queries can be run without managing an engine."""
+    table = query(
+        "SELECT COUNT(*) AS num_rows FROM monthly",
+        sources={
+            "monthly_emissions_epacems": {
+                "years": [2019],
+                "view": "monthly",
+                "partition_manifest": tmp_path / synthetic.MANIFEST_NAME,
+            }
+        },
+        catalog=catalog,
+        output="arrow",
+    )
+    assert table.to_pylist() == [{"num_rows": 2 * 2 * 3 * 12}]
+    with pytest.raises(KeyError, match="nonexistent"):
+        query("SELECT 1", sources={"nonexistent": {}}, catalog=catalog)
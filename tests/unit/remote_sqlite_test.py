@@ -0,0 +1,69 @@
+"""Unit tests for the pudl_catalog.remote_sqlite module."""
+import logging
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from pudl_catalog.sources import SQLiteCatalog
+
+pytest.importorskip("apsw")
+
+from pudl_catalog.remote_sqlite import block_cache, connect  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+N_ROWS = 20_000
+
+
+@pytest.fixture
+def remote_db(tmp_path: Path) -> str:
+    """A SQLite database with an indexed table that spans many blocks."""
+    path = tmp_path / "remote" / "pudl.sqlite"
+    path.parent.mkdir()
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(
+            "CREATE TABLE plants (plant_id_eia INTEGER PRIMARY KEY, plant_name TEXT)"
+        )
+        conn.executemany(
+            "INSERT INTO plants VALUES (?, ?)",
+            ((i, f"Plant number {i:06d} " + "x" * 40) for i in range(N_ROWS)),
+        )
+        conn.execute("CREATE TABLE utilities (utility_id_eia INTEGER, name TEXT)")
+        conn.execute("INSERT INTO utilities VALUES (1, 'A utility')")
+    conn.close()
+    return f"file://{path}"
+
+
+def test_point_query_fetches_few_blocks(remote_db: str):
+    """Looking up a single row by primary key should only read a few blocks."""
+    conn = connect(remote_db, block_size=4096)
+    row = (
+        conn.cursor()
+        .execute("SELECT plant_name FROM plants WHERE plant_id_eia = ?", (12345,))
+        .fetchone()
+    )
+    assert row[0].startswith("Plant number 012345")
+    blocks = block_cache(remote_db)
+    total_blocks = blocks.size // blocks.block_size
+    assert 0 < blocks.remote_requests < 10 < total_blocks
+
+
+def test_blocks_are_reused(remote_db: str):
+    """Blocks fetched once should be served from the local cache afterwards."""
+    query = "SELECT COUNT(*) FROM plants"
+    assert connect(remote_db).cursor().execute(query).fetchone()[0] == N_ROWS
+    requests = block_cache(remote_db).remote_requests
+    assert connect(remote_db).cursor().execute(query).fetchone()[0] == N_ROWS
+    assert block_cache(remote_db).remote_requests == requests
+
+
+def test_catalog_range_requests(remote_db: str, pudl_intake_cache: Path):
+    """The catalog should read tables in place without downloading the database."""
+    cat = SQLiteCatalog(remote_db, range_requests=True)
+    assert sorted(cat) == ["plants", "utilities"]
+    df = cat.utilities.read()
+    assert df.to_dict("records") == [{"utility_id_eia": 1, "name": "A utility"}]
+    assert not list(pudl_intake_cache.glob("*.sqlite"))
+    assert not [p for p in pudl_intake_cache.iterdir() if p.is_file()]
@@ -0,0 +1,94 @@
+"""Unit tests for the pudl_catalog.results module."""
+import logging
+import os
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from pudl_catalog import instrumentation
+from pudl_catalog.cache import RESULTS_DIR_NAME, CacheManager
+from pudl_catalog.results import ResultCache, result_key
+from pudl_catalog.sources import EpaCemsSource
+
+logger = logging.getLogger(__name__)
+
+
+def test_memory_mapped_results(tmp_path: Path):
+    """Stored results are memory-mapped rather than read into memory."""
+    cache = ResultCache(tmp_path)
+    table = pa.table({"x": list(range(100_000))})
+    assert cache.get("a") is None
+    path = cache.put("a", table)
+    assert path.parent.parent == tmp_path
+    allocated = pa.total_allocated_bytes()
+    result = cache.get("a")
+    assert pa.total_allocated_bytes() == allocated
+    assert result.equals(table)
+
+
+def test_eviction(tmp_path: Path):
+    """The least recently used results are evicted when the budget is exceeded."""
+    table = pa.table({"x": list(range(1000))})
+    cache = ResultCache(tmp_path, max_bytes=int(table.nbytes * 2.5))
+    for i, key in enumerate("abc"):
+        path = cache.put(key, table)
+        os.utime(path, (i, i))
+        if key == "b":
+            # Using a result makes it the most recently used.
+            assert cache.get("a") is not None
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache.put("big", pa.table({"x": list(range(10_000))})) is None
+
+
+def test_source_result_cache(epacems_partitioned: Path, pudl_intake_cache: Path):
+    """Identical selections are read once, whatever order the filters are in."""
+    kwargs = {
+        "urlpath": f"simplecache::file://{epacems_partitioned}/*.parquet",
+        "partition_manifest": False,
+        "result_cache": True,
+        "columns": ["plant_id_eia", "state", "gross_load_mw"],
+        "storage_options": {"simplecache": {"cache_storage": str(pudl_intake_cache)}},
+    }
+    first = EpaCemsSource(
+        filters=[("state", "in", ["ID", "CO"]), ("year", "==", 2020)], **kwargs
+    )
+    df = first.read()
+    assert set(df.state) == {"CO", "ID"}
+
+    second = EpaCemsSource(
+        filters=[("year", "=", 2020), ("state", "in", {"CO", "ID"})], **kwargs
+    )
+    assert result_key(second._result_key_fields()) == result_key(
+        first._result_key_fields()
+    )
+
+    def no_read(self):
+        raise AssertionError("The result should have been memoized.")
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(EpaCemsSource, "_read_arrow", no_read)
+        pd.testing.assert_frame_equal(second.read(), df)
+    stats = instrumentation.stats()["epacems_parquet"]
+    assert stats["cache_misses"]["results"] == 1
+    assert stats["cache_hits"]["results"] == 1
+
+    lower_case = EpaCemsSource(states=["id", "co", "CO"], years=[2020], **kwargs)
+    upper_case = EpaCemsSource(states=["CO", "ID"], years=[2020], **kwargs)
+    assert result_key(lower_case._result_key_fields()) == result_key(
+        upper_case._result_key_fields()
+    )
+
+    narrower = EpaCemsSource(
+        filters=[("year", "==", 2020)], **{**kwargs, "columns": ["plant_id_eia"]}
+    )
+    assert list(narrower.read().columns) == ["plant_id_eia"]
+
+    old = ResultCache(pudl_intake_cache / RESULTS_DIR_NAME, catalog_version="vold")
+    old.put("a", pa.table({"x": [1]}))
+    CacheManager().purge_superseded()
+    assert not old.path.exists()
+    assert len(list((pudl_intake_cache / RESULTS_DIR_NAME).glob("*/*.arrow"))) == 2
@@ -0,0 +1,143 @@
+"""Unit tests for the pudl_catalog.rollups module."""
+import logging
+from pathlib import Path
+
+import intake
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import pudl_catalog
+from benchmarks import synthetic
+from pudl_catalog.cache import ROLLUPS_DIR_NAME, CacheManager
+from pudl_catalog.rollups import rollup_path, rollup_table, write_rollup
+from pudl_catalog.sources import EpaCemsRollupSource
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def hourly() -> pa.Table:
+    """Two days of hourly data for two units at each of two plants."""
+    df = synthetic.synthetic_epacems(2020, "CO", n_plants=2)
+    df = df[df.operating_datetime_utc < pd.Timestamp("2020-01-03", tz="UTC")]
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def test_rollup_table(hourly: pa.Table):
+    """Totals match grouping the hourly data with pandas."""
+    df = hourly.to_pandas()
+    expected = (
+        df.assign(period_start_utc=df.operating_datetime_utc.dt.floor("D"))
+        .groupby(["plant_id_eia", "emissions_unit_id_epa", "period_start_utc"])
+        .agg(co2_mass_tons=("co2_mass_tons", "sum"), num_hours=("year", "size"))
+        .reset_index()
+    )
+    daily = rollup_table(hourly, "daily", "unit").to_pandas()
+    assert list(daily.columns[:5]) == [
+        "year",
+        "state",
+        "plant_id_eia",
+        "emissions_unit_id_epa",
+        "period_start_utc",
+    ]
+    assert daily.co2_mass_tons.dtype == "float64"
+    pd.testing.assert_frame_equal(
+        daily[expected.columns].sort_values(list(expected.columns[:3])),
+        expected,
+        check_dtype=False,
+    )
+    plants = rollup_table(hourly, "annual", "plant").to_pandas()
+    assert len(plants) == 2
+    assert plants.num_hours.sum() == hourly.num_rows
+
+
+def test_unknown_rollup(hourly: pa.Table):
+    """Unsupported frequencies and levels are caught right away."""
+    with pytest.raises(ValueError, match="monthly"):
+        rollup_table(hourly, "weekly", "unit")
+    with pytest.raises(ValueError, match="plant"):
+        EpaCemsRollupSource(urlpath="x.parquet", level="state")
+
+
+def test_write_rollup_combines_row_groups(hourly: pa.Table, tmp_path: Path):
+    """Groups spanning several row groups are added up."""
+    pq.write_table(hourly, tmp_path / "hourly.parquet", row_group_size=50)
+    path = write_rollup(
+        tmp_path / "hourly.parquet", tmp_path / "monthly.parquet", "monthly", "unit"
+    )
+    monthly = pq.read_table(path).to_pandas()
+    expected = rollup_table(hourly, "monthly", "unit").to_pandas()
+    pd.testing.assert_frame_equal(monthly, expected)
+
+
+def test_dictionary_encoded_keys(hourly: pa.Table, tmp_path: Path):
+    """Keys like state may be dictionary encoded, as in the published data."""
+    state = hourly.schema.get_field_index("state")
+    encoded = hourly.set_column(
+        state, "state", hourly.column("state").dictionary_encode()
+    )
+    pq.write_table(encoded, tmp_path / "hourly.parquet", row_group_size=50)
+    path = write_rollup(
+        tmp_path / "hourly.parquet", tmp_path / "daily.parquet", "daily", "unit"
+    )
+    expected = rollup_table(hourly, "daily", "unit").to_pandas()
+    pd.testing.assert_frame_equal(pq.read_table(path).to_pandas(), expected)
+
+
+def test_rollup_source(
+    epacems_partitioned: Path, pudl_intake_cache: Path, tmp_path: Path
+):
+    """Totals are computed once per file, and filtered like the hourly data."""
+    kwargs = {
+        "urlpath": f"simplecache::file://{epacems_partitioned}/*.parquet",
+        "freq": "daily",
+        "level": "plant",
+        "years": [2020],
+        "partition_manifest": False,
+        "storage_options": {"simplecache": {"cache_storage": str(pudl_intake_cache)}},
+    }
+    src = EpaCemsRollupSource(filters=[("plant_id_eia", "==", 1)], **kwargs)
+    df = src.read()
+    assert set(zip(df.state, df.year)) == {("CO", 2020), ("ID", 2020)}
+    assert set(df.num_hours) == {24}
+    assert set(df.gross_load_mw) == {24.0}
+    pd.testing.assert_frame_equal(
+        src.to_dask().compute().reset_index(drop=True), df, check_categorical=False
+    )
+
+    paths = sorted((pudl_intake_cache / ROLLUPS_DIR_NAME).glob("*/*.parquet"))
+    assert len(paths) == 2
+    mtimes = [path.stat().st_mtime_ns for path in paths]
+    compact = EpaCemsRollupSource(dtype_profile="compact", **kwargs).read()
+    assert compact.state.dtype == "category"
+    assert [path.stat().st_mtime_ns for path in paths] == mtimes
+
+    nothing = EpaCemsRollupSource(**{**kwargs, "years": [1995]})
+    with pytest.raises(ValueError, match="None of the EPA CEMS files"):
+        nothing.to_dask()
+    unmatched = EpaCemsRollupSource(filters=[("plant_id_eia", "==", 99)], **kwargs)
+    assert len(unmatched.to_dask().compute()) == 0
+    assert unmatched.discover()["npartitions"] == 2
+
+    old = rollup_path(
+        kwargs["urlpath"], "daily", "plant", kwargs["storage_options"], "vold"
+    )
+    old.parent.mkdir(parents=True)
+    old.write_bytes(b"")
+    CacheManager().purge_superseded()
+    assert not old.exists()
+    assert all(path.exists() for path in paths)
+
+
+def test_catalog_rollups(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """The catalog offers monthly totals computed from the partitioned data."""
+    synthetic.write_fixture(tmp_path, years=[2020], states=["ID"], n_plants=1)
+    monkeypatch.setenv("PUDL_INTAKE_PATH", f"file://{tmp_path}")
+    cat = intake.open_catalog(pudl_catalog._pudl_catalog_path)
+    df = cat.monthly_emissions_epacems(
+        partition_manifest=tmp_path / synthetic.MANIFEST_NAME
+    ).read()
+    assert len(df) == 2 * 12
+    assert df.num_hours.sum() == 2 * 8784
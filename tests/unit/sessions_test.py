@@ -0,0 +1,121 @@
+"""Unit tests for the pudl_catalog.sessions module."""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import fsspec
+import pytest
+
+from pudl_catalog import sessions
+from pudl_catalog.cache import SIDECAR_PREFIX
+from pudl_catalog.sources import EpaCemsSource
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture(autouse=True)
+def fresh_sessions():
+    """Start each test without any sessions, using the default limits."""
+    sessions.configure()
+    yield
+    sessions.configure()
+
+
+def test_shared_across_threads(tmp_path: Path):
+    """Every thread gets the same filesystem, unlike with fsspec's instance cache."""
+
+    def get_fs(_):
+        return (
+            sessions.url_to_fs(f"memory://{tmp_path}/x")[0],
+            fsspec.filesystem("memory", auto_mkdir=False),
+        )
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        shared, per_thread = zip(*executor.map(get_fs, range(8)))
+    assert len({id(fs) for fs in shared}) == 1
+    assert len({id(fs) for fs in per_thread}) > 1
+    assert sessions.url_to_fs("memory://x", {"skip": 1})[0] is not shared[0]
+    assert sessions.url_to_fs(f"memory://{tmp_path}/y")[1] == f"{tmp_path}/y"
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="Requires os.fork().")
+def test_new_sessions_after_fork():
+    """A forked process doesn't reuse the sessions of its parent."""
+    parent = sessions.session("memory")
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        try:
+            child = sessions.session("memory")
+            fresh = child is not parent and child.fs is not parent.fs
+            os.write(write_fd, b"1" if fresh else b"0")
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    with os.fdopen(read_fd, "rb") as result:
+        assert result.read() == b"1"
+    assert sessions.session("memory") is parent
+
+
+def test_limits(monkeypatch: pytest.MonkeyPatch):
+    """The connection pool size and the number of concurrent requests are limited."""
+    created = {}
+
+    def filesystem(protocol, **kwargs):
+        created[protocol] = kwargs
+        return object()
+
+    monkeypatch.setenv("PUDL_INTAKE_MAX_CONNECTIONS", "16")
+    monkeypatch.setattr(sessions.fsspec, "filesystem", filesystem)
+    sessions.session("s3", {"anon": True})
+    assert created["s3"] == {
+        "anon": True,
+        "skip_instance_cache": True,
+        "config_kwargs": {"max_pool_connections": 16},
+    }
+    monkeypatch.undo()
+
+    sessions.configure(max_concurrent_requests=2)
+    fs, _ = sessions.url_to_fs("memory://x")
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def request(_):
+        with sessions.request_slot(fs):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(request, range(16)))
+    assert peak[0] == 2
+
+
+def test_dask_uses_shared_session(epacems_partitioned: Path, pudl_intake_cache: Path):
+    """Dask reads cached URLs through the shared session too."""
+    storage_options = {"simplecache": {"cache_storage": str(pudl_intake_cache)}}
+    urlpath = f"simplecache::file://{epacems_partitioned}/*.parquet"
+    fs, path = sessions.chained_url_to_fs(urlpath, storage_options)
+    assert fs.fs is sessions.url_to_fs("/")[0]
+    assert path == f"{epacems_partitioned}/*.parquet"
+    df = EpaCemsSource(
+        urlpath=urlpath,
+        years=[2020],
+        footer_cache=False,
+        partition_manifest=False,
+        storage_options=storage_options,
+    ).read()
+    assert set(df.year) == {2020}
+    cached = [
+        path
+        for path in pudl_intake_cache.iterdir()
+        if path.is_file() and not path.name.startswith(SIDECAR_PREFIX)
+    ]
+    # Dask reads the footer of every file, so they've all been cached.
+    assert len(cached) == 4
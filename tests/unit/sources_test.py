@@ -0,0 +1,446 @@
+"""Unit tests for the pudl_catalog.sources module."""
+import functools
+import logging
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from benchmarks import synthetic
+from pudl_catalog import CATALOG_VERSION, instrumentation, sources
+from pudl_catalog.cache import NotCachedError, cached_filename
+from pudl_catalog.helpers import year_state_filter
+from pudl_catalog.manifest import build_partition_manifest
+from pudl_catalog.materialize import write_sorted
+from pudl_catalog.sources import (
+    EpaCemsSource,
+    SQLiteCatalog,
+    SQLiteTableSource,
+    coalesce_row_groups,
+)
+from tests.unit.conftest import make_epacems_df
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def manifest_path(epacems_partitioned: Path, tmp_path: Path) -> Path:
+    """Write a partition manifest describing the test dataset."""
+    path = tmp_path / "manifest.yaml"
+    build_partition_manifest(str(epacems_partitioned), CATALOG_VERSION).to_yaml(path)
+    return path
+
+
+def test_manifest_selects_files(epacems_partitioned: Path, manifest_path: Path):
+    """Years and states are resolved to an explicit list of files."""
+    src = EpaCemsSource(
+        urlpath=f"{epacems_partitioned}/*.parquet",
+        years=[2020],
+        states=["ID"],
+        partition_manifest=str(manifest_path),
+        engine="pyarrow",
+        split_row_groups=True,
+        index=False,
+    )
+    urlpaths, _ = src._resolve_urlpaths()
+    assert urlpaths == [f"{epacems_partitioned}/epacems-2020-ID.parquet"]
+    df = src.read()
+    assert set(df.year) == {2020}
+    assert set(df.state) == {"ID"}
+
+
+def test_manifest_uses_filters(epacems_partitioned: Path, manifest_path: Path):
+    """Year and state filters also prune the partitions that are read."""
+    src = EpaCemsSource(
+        urlpath=f"{epacems_partitioned}/*.parquet",
+        partition_manifest=str(manifest_path),
+        filters=year_state_filter(years=[2019, 2020], states=["CO"]),
+    )
+    urlpaths, _ = src._resolve_urlpaths()
+    assert [Path(p).name for p in urlpaths] == [
+        "epacems-2019-CO.parquet",
+        "epacems-2020-CO.parquet",
+    ]
+    assert set(src.read().state) == {"CO"}
+
+
+def test_no_matching_partitions(epacems_partitioned: Path, manifest_path: Path):
+    """Asking for data that isn't in the manifest is an error."""
+    src = EpaCemsSource(
+        urlpath=f"{epacems_partitioned}/*.parquet",
+        years=[1776],
+        partition_manifest=str(manifest_path),
+    )
+    with pytest.raises(ValueError):
+        src.to_dask()
+
+
+def test_years_states_without_manifest(epacems_partitioned: Path):
+    """Without a manifest, years and states are turned into filters."""
+    src = EpaCemsSource(
+        urlpath=f"{epacems_partitioned}/*.parquet",
+        years=[2019],
+        states=["ID"],
+        partition_manifest=False,
+    )
+    df = src.read()
+    assert set(zip(df.year, df.state)) == {(2019, "ID")}
+
+
+def test_sqlite_catalog_downloads_to_cache(tmp_path: Path, pudl_intake_cache: Path):
+    """Remote SQLite databases are downloaded into the cache before they're opened."""
+    db_path = tmp_path / "pudl.sqlite"
+    pd.DataFrame({"plant_id_eia": [1, 2], "plant_name_eia": ["a", "b"]}).to_sql(
+        "plants_entity_eia", f"sqlite:///{db_path}", index=False
+    )
+    urlpath = f"file://{db_path}"
+    cat = SQLiteCatalog(
+        urlpath=urlpath,
+        storage_options={"simplecache": {"cache_storage": str(pudl_intake_cache)}},
+    )
+    assert list(cat) == ["plants_entity_eia"]
+    assert (pudl_intake_cache / cached_filename(urlpath)).is_file()
+    assert cat.plants_entity_eia.read().shape == (2, 2)
+
+
+@pytest.fixture
+def fuel_receipts_db(tmp_path: Path) -> Path:
+    """A SQLite database with a table containing several declared column types."""
+    db_path = tmp_path / "pudl.sqlite"
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute(
+            "CREATE TABLE fuel_receipts_costs_eia923 ("
+            "plant_id_eia INTEGER, report_date DATE, energy_source_code TEXT, "
+            "fuel_cost_per_mmbtu REAL, primary_transportation_mode_code TEXT, "
+            "mine_id_pudl INTEGER, natural_gas_transport_code BOOLEAN)"
+        )
+        conn.executemany(
+            "INSERT INTO fuel_receipts_costs_eia923 VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                (i % 7, f"2020-{i % 12 + 1:02d}-01", "BIT", i / 10, "RR", None, i % 2)
+                for i in range(250)
+            ),
+        )
+    conn.close()
+    return db_path
+
+
+def test_sqlite_table_read_chunked(fuel_receipts_db: Path):
+    """Tables can be streamed in chunks with a bounded number of rows."""
+    src = SQLiteTableSource(
+        str(fuel_receipts_db), "fuel_receipts_costs_eia923", chunksize=100
+    )
+    chunks = list(src.read_chunked())
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), src.read())
+
+
+def test_sqlite_table_arrow_types(fuel_receipts_db: Path):
+    """Record batches are typed using the declared column types."""
+    src = SQLiteTableSource(str(fuel_receipts_db), "fuel_receipts_costs_eia923")
+    batch = next(src.read_batches())
+    assert batch.schema.types == [
+        pa.int64(),
+        pa.date32(),
+        pa.string(),
+        pa.float64(),
+        pa.string(),
+        pa.int64(),
+        pa.bool_(),
+    ]
+    df = src.read()
+    assert df.report_date.dtype == "datetime64[ns]"
+    assert df.natural_gas_transport_code.dtype == bool
+
+
+def test_sqlite_table_projection_and_where(fuel_receipts_db: Path):
+    """Only the requested columns and rows are read."""
+    src = SQLiteTableSource(
+        str(fuel_receipts_db),
+        "fuel_receipts_costs_eia923",
+        columns=["plant_id_eia", "fuel_cost_per_mmbtu"],
+        where="plant_id_eia = ? AND fuel_cost_per_mmbtu < ?",
+        params=[3, 10],
+    )
+    df = src.read()
+    assert list(df.columns) == ["plant_id_eia", "fuel_cost_per_mmbtu"]
+    assert set(df.plant_id_eia) == {3}
+    assert df.fuel_cost_per_mmbtu.max() < 10
+    assert len(df) == 14
+
+
+def test_sqlite_table_to_dask(fuel_receipts_db: Path):
+    """Dask dataframes are partitioned by ranges of rowid."""
+    src = SQLiteTableSource(
+        str(fuel_receipts_db),
+        "fuel_receipts_costs_eia923",
+        where="plant_id_eia > ?",
+        params=[0],
+        rows_per_partition=60,
+    )
+    ddf = src.to_dask()
+    assert ddf.npartitions == 5
+    assert src.discover()["npartitions"] == 5
+    pd.testing.assert_frame_equal(ddf.compute().reset_index(drop=True), src.read())
+
+
+def test_sqlite_catalog_sql_kwargs(fuel_receipts_db: Path):
+    """Catalog entries are streaming table sources configured by sql_kwargs."""
+    cat = SQLiteCatalog(str(fuel_receipts_db), sql_kwargs={"chunksize": 200})
+    src = cat.fuel_receipts_costs_eia923.get()
+    assert isinstance(src, SQLiteTableSource)
+    assert [len(chunk) for chunk in src.read_chunked()] == [200, 50]
+
+
+@pytest.mark.parametrize("footer_cache", [True, False])
+def test_compact_dtype_profile(epacems_partitioned: Path, footer_cache: bool):
+    """The compact profile uses narrower dtypes without changing any values."""
+    kwargs = {
+        "urlpath": f"{epacems_partitioned}/*.parquet",
+        "columns": ["plant_id_eia", "unitid", "year", "state"],
+        "footer_cache": footer_cache,
+        "partition_manifest": False,
+        "engine": "pyarrow",
+    }
+    default = EpaCemsSource(**kwargs).read()
+    compact = EpaCemsSource(dtype_profile="compact", **kwargs).read()
+    assert list(compact.columns) == kwargs["columns"]
+    assert compact.state.dtype == "category"
+    assert compact.year.dtype == "int16"
+    assert compact.unitid.dtype == pd.StringDtype("pyarrow")
+    assert compact.memory_usage(deep=True).sum() < default.memory_usage(deep=True).sum()
+    pd.testing.assert_frame_equal(compact.astype(default.dtypes), default)
+
+
+def test_unknown_dtype_profile(epacems_partitioned: Path):
+    """Misspelled dtype profiles are caught right away."""
+    with pytest.raises(ValueError, match="compact"):
+        EpaCemsSource(urlpath=str(epacems_partitioned), dtype_profile="small")
+
+
+@pytest.mark.parametrize("cached", [True, False])
+@pytest.mark.parametrize("dtype_profile", ["default", "compact"])
+def test_arrow_read_matches_dask(
+    epacems_partitioned: Path,
+    pudl_intake_cache: Path,
+    cached: bool,
+    dtype_profile: str,
+):
+    """Small selections are read without dask, with the same results."""
+    prefix = "simplecache::file://" if cached else ""
+    kwargs = {
+        "urlpath": f"{prefix}{epacems_partitioned}/*.parquet",
+        "years": [2020],
+        "states": ["CO", "ID"],
+        "columns": ["plant_id_eia", "state", "gross_load_mw"],
+        "filters": [("plant_id_eia", "==", 1)],
+        "dtype_profile": dtype_profile,
+        "partition_manifest": False,
+        "storage_options": {"simplecache": {"cache_storage": str(pudl_intake_cache)}},
+    }
+    src = EpaCemsSource(arrow_max_rows=1000, **kwargs)
+    assert src._use_arrow_read()
+    table = src.to_arrow()
+    assert table.column_names == kwargs["columns"]
+    df = src.read()
+    assert isinstance(df.index, pd.RangeIndex)
+    assert set(zip(df.plant_id_eia, df.state)) == {(1, "CO"), (1, "ID")}
+
+    dask_src = EpaCemsSource(**kwargs)
+    assert not dask_src._use_arrow_read()
+    expected = dask_src.to_dask().compute()
+    pd.testing.assert_frame_equal(
+        df, expected.reset_index(drop=True), check_categorical=False
+    )
+    pd.testing.assert_frame_equal(dask_src.read(), expected)
+
+
+@pytest.mark.parametrize("dtype_profile", ["default", "compact"])
+def test_read_defaults_to_dask(tmp_path: Path, dtype_profile: str):
+    """By default read() uses dask, and the Arrow path only changes the index."""
+    synthetic.write_fixture(tmp_path, years=[2019, 2020], states=["CO"], n_plants=2)
+    kwargs = {
+        "urlpath": f"{tmp_path}/hourly_emissions_epacems/*.parquet",
+        "filters": [("plant_id_eia", ">", 0)],
+        "dtype_profile": dtype_profile,
+        "partition_manifest": False,
+    }
+    src = EpaCemsSource(**kwargs)
+    assert not src._use_arrow_read()
+    df = src.read()
+    expected = EpaCemsSource(**kwargs).to_dask().compute()
+    pd.testing.assert_frame_equal(df, expected)
+    assert not df.index.is_unique
+
+    arrow_df = EpaCemsSource(arrow_max_rows=len(df), **kwargs).read()
+    assert list(arrow_df.columns) == list(expected.columns)
+    assert arrow_df.dtypes.equals(expected.dtypes)
+    pd.testing.assert_frame_equal(arrow_df, expected.reset_index(drop=True))
+
+
+def test_large_selection_uses_dask(epacems_partitioned: Path):
+    """Selections larger than arrow_max_rows are read using dask."""
+    src = EpaCemsSource(
+        urlpath=f"{epacems_partitioned}/*.parquet",
+        partition_manifest=False,
+        arrow_max_rows=10,
+    )
+    assert not src._use_arrow_read()
+    assert len(src.read()) == len(src.to_arrow())
+
+
+def test_time_range(epacems_partitioned: Path, manifest_path: Path):
+    """Start and end times select partitions by year, and rows by time."""
+    src = EpaCemsSource(
+        urlpath=f"{epacems_partitioned}/*.parquet",
+        start="2020-01-02 12:00",
+        end=pd.Timestamp("2020-01-02 08:00", tz="America/Denver"),
+        partition_manifest=manifest_path,
+    )
+    assert [Path(url).name for url in src.selected_urlpaths()] == [
+        "epacems-2020-CO.parquet",
+        "epacems-2020-ID.parquet",
+    ]
+    df = src.read()
+    assert len(df) == 3 * 2 * 2
+    assert df.operating_datetime_utc.min() == pd.Timestamp("2020-01-02 12:00Z")
+    assert df.operating_datetime_utc.max() == pd.Timestamp("2020-01-02 14:00Z")
+
+
+def test_sort_by_time(
+    epacems_partitioned: Path,
+    pudl_intake_cache: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Sorted copies of the files let row groups outside of the time range be skipped."""
+    monkeypatch.setattr(
+        sources, "write_sorted", functools.partial(write_sorted, row_group_size=24)
+    )
+    kwargs = {
+        "urlpath": f"simplecache::file://{epacems_partitioned}/*.parquet",
+        "years": [2020],
+        "start": "2020-01-01 12:00",
+        "end": "2020-01-01 18:00",
+        "partition_manifest": False,
+        "storage_options": {"simplecache": {"cache_storage": str(pudl_intake_cache)}},
+    }
+    src = EpaCemsSource(sort_by_time=True, **kwargs)
+    pieces = src._row_group_plan()[0]
+    assert [row_groups for _, row_groups in pieces] == [[1], [1]]
+    assert all(
+        Path(url).parent.parent.name == "pudl_catalog_sorted" for url, _ in pieces
+    )
+    df = src.read()
+    expected = EpaCemsSource(**kwargs).read()
+    pd.testing.assert_frame_equal(
+        df.sort_values(["state", "plant_id_eia", "operating_datetime_utc"]).reset_index(
+            drop=True
+        ),
+        expected.sort_values(
+            ["state", "plant_id_eia", "operating_datetime_utc"]
+        ).reset_index(drop=True),
+    )
+
+    with pytest.raises(ValueError, match="sort_by_time requires footer_cache"):
+        EpaCemsSource(sort_by_time=True, footer_cache=False, **kwargs)
+    with pytest.raises(ValueError, match="sort_by_time requires footer_cache"):
+        EpaCemsSource(sort_by_time=True, index="plant_id_eia", **kwargs)
+
+
+def test_coalesce_row_groups():
+    """Row groups are combined up to the target size, across files."""
+    pieces = [("a", [0, 1, 2]), ("b", [0, 3])]
+    sizes = [[40, 40, 40], [100, 10]]
+    assert coalesce_row_groups(pieces, sizes, target=100) == [
+        [("a", [0, 1])],
+        [("a", [2])],
+        [("b", [0])],
+        [("b", [3])],
+    ]
+    assert coalesce_row_groups(pieces, sizes, target=1000) == [pieces]
+    assert coalesce_row_groups([], [], target=100) == []
+
+
+@pytest.mark.parametrize("footer_cache", [True, False])
+def test_partition_size(tmp_path: Path, footer_cache: bool):
+    """Small row groups are coalesced into partitions of about the requested size."""
+    path = tmp_path / "epacems"
+    path.mkdir()
+    for state in ["CO", "ID", "TX"]:
+        pq.write_table(
+            pa.Table.from_pandas(
+                make_epacems_df(2020, state, n_plants=4), preserve_index=False
+            ),
+            path / f"epacems-2020-{state}.parquet",
+            row_group_size=48,
+        )
+    kwargs = {
+        "urlpath": f"{path}/*.parquet",
+        "columns": ["plant_id_eia", "state", "gross_load_mw"],
+        "filters": [("plant_id_eia", "!=", 2)],
+        "split_row_groups": True,
+        "footer_cache": footer_cache,
+        "partition_manifest": False,
+        "engine": "pyarrow",
+    }
+    per_row_group = EpaCemsSource(**kwargs).to_dask()
+    assert per_row_group.npartitions == 9
+    ddf = EpaCemsSource(partition_size="4KiB", **kwargs).to_dask()
+    assert 1 < ddf.npartitions < 9
+    pd.testing.assert_frame_equal(
+        ddf.compute().reset_index(drop=True),
+        per_row_group.compute().reset_index(drop=True),
+    )
+
+
+def test_offline(
+    epacems_partitioned: Path,
+    manifest_path: Path,
+    tmp_path: Path,
+    pudl_intake_cache: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """In offline mode sources are read from the cache, without any remote requests."""
+    db_path = tmp_path / "pudl.sqlite"
+    pd.DataFrame({"plant_id_eia": [1, 2]}).to_sql(
+        "plants_entity_eia", f"sqlite:///{db_path}", index=False
+    )
+    storage_options = {"simplecache": {"cache_storage": str(pudl_intake_cache)}}
+    kwargs = {
+        "urlpath": f"simplecache::file://{epacems_partitioned}/*.parquet",
+        "years": [2020],
+        "columns": ["plant_id_eia", "state", "gross_load_mw"],
+        "filters": [("plant_id_eia", "==", 1)],
+        "partition_manifest": False,
+        "storage_options": storage_options,
+    }
+    expected = EpaCemsSource(**kwargs).read()
+    SQLiteCatalog(f"file://{db_path}", storage_options=storage_options)
+
+    # Make the "remote" data unreachable.
+    epacems_partitioned.rename(tmp_path / "unreachable")
+    db_path.rename(tmp_path / "unreachable.sqlite")
+    monkeypatch.setenv("PUDL_INTAKE_OFFLINE", "1")
+    instrumentation.reset()
+    pd.testing.assert_frame_equal(EpaCemsSource(**kwargs).read(), expected)
+    dask_df = EpaCemsSource(footer_cache=False, **kwargs).read()
+    assert set(dask_df.state) == set(expected.state)
+    cat = SQLiteCatalog(
+        f"file://{db_path}", storage_options=storage_options, range_requests=True
+    )
+    assert cat.plants_entity_eia.read().shape == (2, 1)
+    assert all(s["requests"] == 0 for s in instrumentation.stats().values())
+
+    # Objects that haven't been cached are reported immediately.
+    with pytest.raises(NotCachedError, match="epacems-2019-"):
+        EpaCemsSource(
+            **{**kwargs, "years": [2019], "partition_manifest": manifest_path}
+        ).read()
+    with pytest.raises(NotCachedError, match="No cached objects match"):
+        EpaCemsSource(**{**kwargs, "urlpath": f"{kwargs['urlpath']}.gz"}).read()
+    with pytest.raises(NotCachedError):
+        SQLiteCatalog("s3://bucket/pudl.sqlite", storage_options=storage_options)